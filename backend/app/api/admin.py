@@ -2,8 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
-from ..schemas.schemas import UserResponse, UpdateUserRoleRequest
+from ..schemas.schemas import UserResponse, UpdateUserRoleRequest, ReanalysisRunCreate, ReanalysisRunResponse
 from ..repositories.user_repo import UserRepository
+from ..services.reanalysis_service import ReanalysisService
 from ..models.models import User
 from .auth import require_admin
 
@@ -29,4 +30,43 @@ def get_all_users(
 ):
     """Получение списка всех пользователей"""
     repo = UserRepository(db)
-    return repo.get_all()
\ No newline at end of file
+    return repo.get_all()
+
+@router.post("/reanalysis", response_model=ReanalysisRunResponse)
+def start_reanalysis(
+    run: ReanalysisRunCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Поставить все сохранённые фото в очередь повторного анализа (после выкладки новых весов)"""
+    service = ReanalysisService(db)
+    return service.start_run(current_user.id, run.model_version)
+
+@router.get("/reanalysis", response_model=List[ReanalysisRunResponse])
+def get_reanalysis_runs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Последние запуски с прогрессом"""
+    service = ReanalysisService(db)
+    return service.get_runs()
+
+@router.get("/reanalysis/{run_id}", response_model=ReanalysisRunResponse)
+def get_reanalysis_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Прогресс запуска"""
+    service = ReanalysisService(db)
+    return service.get_run(run_id)
+
+@router.post("/reanalysis/{run_id}/retry", response_model=ReanalysisRunResponse)
+def retry_reanalysis_run(
+    run_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Вернуть в очередь задачи, исчерпавшие попытки"""
+    service = ReanalysisService(db)
+    return service.retry_failed(run_id)
@@ -19,6 +19,11 @@ def require_admin_or_contractor(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return current_user
 
+def require_inspector(current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.ADMIN, UserRole.INSPECTOR]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return current_user
+
 @router.post("/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     """Регистрация пользователя"""
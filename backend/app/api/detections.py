@@ -0,0 +1,39 @@
+from datetime import datetime
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..database import get_db
+from ..core.security import get_current_user
+from ..models.models import User, ProblemType
+from ..schemas.schemas import DetectionResponse, DetectionStatsResponse
+from ..services.detection_service import DetectionService
+
+router = APIRouter(prefix="/api/detections", tags=["detections"])
+
+@router.get("", response_model=List[DetectionResponse])
+def get_detections(
+    type: Optional[ProblemType] = Query(None),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = Query(None, description="Начало периода (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Конец периода, не включая"),
+    problem_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Сохранённые детекции, например: ?type=pothole&min_confidence=0.7&since=2024-05-01"""
+    service = DetectionService(db)
+    return service.get_detections(type, min_confidence, since, until, problem_id, limit, offset)
+
+@router.get("/stats", response_model=List[DetectionStatsResponse])
+def get_detection_stats(
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Кол-во дефектов по типам за период"""
+    service = DetectionService(db)
+    return service.get_stats(min_confidence, since, until)
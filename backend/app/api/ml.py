@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..services.ml_service import ml_service
+from ..services.video_service import VideoIngestService
 from ..core.security import get_current_user
+from ..database import get_async_db
 from ..models.models import User
-from ..schemas.schemas import ImageAnalysisResponse
+from ..schemas.schemas import ImageAnalysisResponse, InferenceMetricsResponse, ProblemCreate
+from .auth import require_admin, require_inspector
 
 router = APIRouter(prefix="/api", tags=["ml"])
 
@@ -16,7 +22,33 @@ async def analyze_image(
         raise HTTPException(status_code=400, detail="Файл должен быть изображением")
     try:
         return await ml_service.analyze_image(file)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Ошибка анализа изображения: {e}")
         raise HTTPException(status_code=500, detail=f"Ошибка обработки изображения: {str(e)}")
-        
+
+@router.post("/analyze-video")
+async def analyze_video(
+    files: List[UploadFile] = File(...),
+    address: str = Form(...),
+    description: Optional[str] = Form(None),
+    lat: Optional[float] = Form(None),
+    lon: Optional[float] = Form(None),
+    track: Optional[str] = Form(None),
+    frame_interval: float = Form(1.0),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(require_inspector)
+):
+    """Видео с регистратора (один файл video/*) или серия фото (frame_interval сек. между ними).
+    track - GPS-трек JSON [{"t": сек., "lat": .., "lon": ..}]: кадры отбираются по расстоянию,
+    у каждой проблемы свои координаты. Ответ - NDJSON-поток событий problem/progress/done/error"""
+    problem_data = ProblemCreate(address=address, description=description, lat=lat, lon=lon)
+    service = VideoIngestService(db)
+    await service.prepare(files, problem_data, track, frame_interval)
+    return StreamingResponse(service.stream(current_user), media_type="application/x-ndjson")
+
+@router.get("/ml-metrics", response_model=InferenceMetricsResponse)
+def get_ml_metrics(current_user: User = Depends(require_admin)):
+    """Метрики батчинга инференса: глубина очереди, размеры батчей"""
+    return ml_service.get_metrics()
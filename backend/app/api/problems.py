@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, File, Form, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Query, File, Form, UploadFile, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Optional
-from ..database import get_db
-from ..schemas.schemas import ProblemCreate, ProblemResponse, PaginatedProblemResponse
+from typing import List, Optional, Literal
+from ..database import get_db, get_async_db
+from ..schemas.schemas import ProblemCreate, ProblemResponse, PaginatedProblemResponse, NearbyProblemResponse, ClusterTileResponse, ProblemFromPhotoResponse, ProblemImportResponse, BulkStatusUpdateRequest, BulkStatusUpdateResponse
 from ..core.security import get_current_user
 from ..models.models import User, ProblemStatus, ProblemType, UserRole
-from ..services.problem_service import ProblemService
-from ..services.image_service import ImageService
+from ..services.problem_service import ProblemService, AsyncProblemService
+from ..services.image_service import ImageService, AsyncImageService
+from ..services.cluster_service import ClusterService
+from ..services.import_export_service import ProblemImportService, ProblemExportService, EXPORT_MEDIA_TYPES
 from .auth import require_admin_or_contractor, get_current_user
 
 router = APIRouter(prefix="/problems", tags=["problems"])
@@ -27,17 +31,82 @@ async def create_problem_with_image(
     description: Optional[str] = Form(None),
     type: ProblemType = Form(...),
     photo: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    lat: Optional[float] = Form(None),
+    lon: Optional[float] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Создать проблему с фото"""
-    problem_data = ProblemCreate(address=address, description=description, type=type)
-    service = ProblemService(db)
-    problem = service.create_problem(problem_data, current_user)
-    image_service = ImageService(db)
+    problem_data = ProblemCreate(address=address, description=description, type=type, lat=lat, lon=lon)
+    service = AsyncProblemService(db)
+    problem = await service.create_problem(problem_data, current_user)
+    image_service = AsyncImageService(db)
     await image_service.upload_image(problem.id, photo, current_user.id)
-    
-    return problem
+
+    return await service.get_problem(problem.id)
+
+@router.post("/analyze-and-create", response_model=ProblemFromPhotoResponse)
+async def analyze_and_create_problem(
+    address: str = Form(...),
+    description: Optional[str] = Form(None),
+    type: Optional[ProblemType] = Form(None),
+    photo: UploadFile = File(...),
+    lat: Optional[float] = Form(None),
+    lon: Optional[float] = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Создать проблему по фото: анализ моделью и загрузка одним запросом.
+    Без type тип проблемы определяется по найденным дефектам"""
+    problem_data = ProblemCreate(
+        address=address, description=description, type=type or ProblemType.OTHER, lat=lat, lon=lon
+    )
+    service = AsyncProblemService(db)
+    return await service.create_from_photo(problem_data, photo, current_user, detect_type=type is None)
+
+@router.post("/import", response_model=ProblemImportResponse)
+def import_problems(
+    file: UploadFile = File(...),
+    format: Optional[Literal["ndjson", "csv"]] = Query(None, description="По умолчанию - по расширению файла"),
+    skip_invalid: bool = Query(False, description="Загрузить корректные строки, даже если есть ошибочные"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin_or_contractor)
+):
+    """Массовый импорт проблем из NDJSON/CSV одной транзакцией.
+    Поля строки - как у POST /problems, плюс status. Без skip_invalid любая ошибка - 422 и ничего не загружается"""
+    service = ProblemImportService(db)
+    return service.import_file(file, format, current_user, skip_invalid)
+
+@router.get("/export")
+def export_problems(
+    format: Literal["ndjson", "csv", "geojson"] = Query("ndjson"),
+    status: Optional[ProblemStatus] = Query(None),
+    type: Optional[ProblemType] = Query(None),
+    is_from_inspector: Optional[bool] = Query(None),
+    search: Optional[str] = Query(None),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin_or_contractor)
+):
+    """Потоковая выгрузка проблем (фильтры - как у списка)"""
+    service = ProblemExportService(db)
+    content = service.export(format, status, type, is_from_inspector, search, bbox)
+    return StreamingResponse(
+        content,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="problems.{format}"'}
+    )
+
+@router.put("/status", response_model=BulkStatusUpdateResponse)
+def bulk_update_status(
+    request: BulkStatusUpdateRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_admin_or_contractor)
+):
+    """Статусы многих проблем за один запрос (for admin/contractor). Недопустимые переходы
+    и ненайденные id не мешают остальным - результат по каждому id"""
+    service = ProblemService(db)
+    return service.bulk_update_status(request.items)
 
 @router.put("/{problem_id}", response_model=ProblemResponse)
 def update_problem(
@@ -57,7 +126,9 @@ def update_problem(
         problem_id=problem_id,
         address=problem.address,
         description=problem.description,
-        type=problem.type
+        type=problem.type,
+        lat=problem.lat,
+        lon=problem.lon
     )
     
     return updated_problem
@@ -65,11 +136,12 @@ def update_problem(
 @router.put("/{problem_id}/status", response_model=ProblemResponse)
 def update_problem_status(
     problem_id: int,
-    status: str,
+    status: ProblemStatus,
     db: Session = Depends(get_db),
     user: User = Depends(require_admin_or_contractor)
 ):
-    """Обновить статус проблемы (for admin/contractor)"""
+    """Обновить статус проблемы (for admin/contractor). Недопустимый переход
+    (например, из closed) - 409, правила те же, что у PUT /problems/status"""
     service = ProblemService(db)
     problem = service.update_status(problem_id, status)
     if not problem:
@@ -83,10 +155,17 @@ def get_problems(
     type: Optional[ProblemType] = Query(None, description="Фильтр по типу"),
     is_from_inspector: Optional[bool] = Query(None, description="Только от инспекторов"),
     search: Optional[str] = Query(None, description="Поиск по адресу или описанию"),
-    sort_by: str = Query("created_at", description="Поле для сортировки"),
+    sort_by: str = Query("created_at", description="Поле для сортировки (relevance - по релевантности поиска)"),
     sort_order: str = Query("desc", description="Направление сортировки (asc/desc)"),
     page: int = Query(1, ge=1, description="Номер страницы"),
-    limit: int = Query(10, ge=1, le=100, description="Элементов на странице")
+    limit: int = Query(10, ge=1, le=100, description="Элементов на странице"),
+    pagination: Literal["page", "cursor"] = Query("page", description="Режим пагинации: по номеру страницы или по курсору"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущего ответа (включает режим курсора)"),
+    total_mode: Literal["exact", "approx", "none"] = Query("exact", description="Подсчёт total: точный, оценка или без подсчёта"),
+    bbox: Optional[str] = Query(None, description="Область карты: min_lon,min_lat,max_lon,max_lat"),
+    lat: Optional[float] = Query(None, ge=-90, le=90, description="Широта центра (для radius_km)"),
+    lon: Optional[float] = Query(None, ge=-180, le=180, description="Долгота центра (для radius_km)"),
+    radius_km: Optional[float] = Query(None, gt=0, le=500, description="Радиус поиска в км")
 ):
     """Получить список всех проблем (с фильтрацией, сортировкой, пагинацией)"""
     service = ProblemService(db)
@@ -98,9 +177,46 @@ def get_problems(
         sort_by=sort_by,
         sort_order=sort_order,
         page=page,
-        limit=limit
+        limit=limit,
+        cursor=cursor,
+        use_cursor=(pagination == "cursor"),
+        total_mode=total_mode,
+        bbox=bbox,
+        lat=lat,
+        lon=lon,
+        radius_km=radius_km
     )
 
+@router.get("/nearest", response_model=List[NearbyProblemResponse])
+def get_nearest_problems(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    limit: int = Query(10, ge=1, le=100, description="Сколько ближайших проблем вернуть"),
+    max_radius_km: float = Query(50, gt=0, le=500, description="Максимальный радиус поиска"),
+    db: Session = Depends(get_db)
+):
+    """Ближайшие к точке проблемы (по возрастанию расстояния)"""
+    service = ProblemService(db)
+    return service.get_nearest_problems(lat, lon, limit, max_radius_km)
+
+@router.get("/tiles/{z}/{x}/{y}", response_model=ClusterTileResponse)
+def get_problem_clusters(
+    request: Request,
+    z: int = Path(..., ge=0, le=22),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    db: Session = Depends(get_db)
+):
+    """Кластеры проблем в тайле z/x/y с разбивкой по типу и статусу.
+    Отдаёт ETag: при совпадении If-None-Match возвращается 304 без тела"""
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=400, detail="Тайл вне сетки для данного зума")
+    etag, body = ClusterService(db).get_tile(z, x, y).render()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/{problem_id}", response_model=ProblemResponse)
 def get_problem(problem_id: int, db: Session = Depends(get_db)):
     """Получить проблему по ID"""
@@ -113,12 +229,13 @@ def get_problem(problem_id: int, db: Session = Depends(get_db)):
 @router.get("/{problem_id}/images")
 def get_problem_images(
     problem_id: int,
+    size: Optional[int] = Query(None, ge=16, le=4096, description="Нужный размер в px (большая сторона): вернётся самый лёгкий подходящий вариант"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Получить все изображения проблемы"""
     service = ImageService(db)
-    return service.get_images_for_problem(problem_id)
+    return service.get_images_for_problem(problem_id, size)
 
 @router.delete("/{problem_id}")
 def delete_problem(
@@ -0,0 +1,117 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .config import ADDRESS_INDEX_MAX_GEOCODED
+
+MAX_WORD_KEYS = 6 # по скольким словам адреса искать ("ул. Тверская, 1" находится и по "тверская")
+
+def normalize_address(address: str) -> str:
+    return " ".join(re.findall(r"\w+", address.lower().replace("ё", "е")))
+
+class AddressIndex:
+    """Префиксный индекс адресов в памяти: отсортированный массив ключей + bisect.
+    Ключ - адрес, начиная с каждого из первых MAX_WORD_KEYS слов.
+    Наполняется адресами проблем из БД (хранятся всегда) и ответами геокодера
+    (не больше max_geocoded, лишние вытесняются по LRU)."""
+    def __init__(self, max_geocoded: int = ADDRESS_INDEX_MAX_GEOCODED):
+        self.max_geocoded = max_geocoded
+        self._keys: List[Tuple[str, str]] = [] # (ключ, нормализованный адрес)
+        self._suggestions: Dict[str, Dict[str, Any]] = {}
+        self._geocoded: "OrderedDict[str, None]" = OrderedDict() # адреса, известные только от геокодера
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _word_keys(normalized: str) -> List[str]:
+        words = normalized.split(" ")
+        return [" ".join(words[i:]) for i in range(min(len(words), MAX_WORD_KEYS))]
+
+    def _suggestion(self, address: str, lat: Optional[float], lon: Optional[float],
+                    display: Optional[str] = None, subtitle: str = "") -> Dict[str, Any]:
+        # тот же формат, что у подсказок геокодера
+        return {"address": address, "display": display or address, "subtitle": subtitle, "lat": lat, "lon": lon}
+
+    def add(self, address: str, lat: Optional[float] = None, lon: Optional[float] = None,
+            display: Optional[str] = None, subtitle: str = "", geocoded: bool = False):
+        normalized = normalize_address(address or "")
+        if not normalized:
+            return
+        with self._lock:
+            existing = self._suggestions.get(normalized)
+            if existing is not None:
+                if not geocoded:
+                    self._geocoded.pop(normalized, None) # стал адресом проблемы - больше не вытесняется
+                elif normalized in self._geocoded:
+                    self._geocoded.move_to_end(normalized)
+                if existing["lat"] is None and lat is not None: # адрес из БД без координат
+                    existing["lat"], existing["lon"] = lat, lon
+                return
+            self._suggestions[normalized] = self._suggestion(address, lat, lon, display, subtitle)
+            for key in self._word_keys(normalized):
+                insort(self._keys, (key, normalized))
+            if geocoded:
+                self._geocoded[normalized] = None
+                while len(self._geocoded) > self.max_geocoded:
+                    self._remove(self._geocoded.popitem(last=False)[0])
+
+    def _remove(self, normalized: str):
+        del self._suggestions[normalized]
+        for key in self._word_keys(normalized):
+            i = bisect_left(self._keys, (key, normalized))
+            if i < len(self._keys) and self._keys[i] == (key, normalized):
+                del self._keys[i]
+
+    def add_suggestions(self, suggestions: Iterable[Dict[str, Any]]):
+        """Результаты геокодера"""
+        for s in suggestions:
+            self.add(s.get("address", ""), s.get("lat"), s.get("lon"), s.get("display"), s.get("subtitle", ""),
+                     geocoded=True)
+
+    def load(self, rows: Iterable[Tuple[str, Optional[float], Optional[float]]]):
+        """Полная загрузка (address, lat, lon): одна сортировка вместо вставок по одному"""
+        suggestions: Dict[str, Dict[str, Any]] = {}
+        for address, lat, lon in rows:
+            normalized = normalize_address(address or "")
+            if normalized and (normalized not in suggestions or suggestions[normalized]["lat"] is None):
+                suggestions[normalized] = self._suggestion(address, lat, lon)
+        keys = sorted(
+            (key, normalized) for normalized in suggestions for key in self._word_keys(normalized)
+        )
+        stored = set(suggestions)
+        with self._lock:
+            for normalized, suggestion in self._suggestions.items(): # добавленные во время загрузки
+                if normalized not in suggestions:
+                    suggestions[normalized] = suggestion
+                    for key in self._word_keys(normalized):
+                        insort(keys, (key, normalized))
+            self._geocoded = OrderedDict((n, None) for n in self._geocoded if n not in stored)
+            self._keys, self._suggestions = keys, suggestions
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        prefix = normalize_address(query)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            i = bisect_left(self._keys, (prefix, ""))
+            while i < len(self._keys) and len(results) < limit:
+                key, normalized = self._keys[i]
+                if not key.startswith(prefix):
+                    break
+                if normalized not in seen:
+                    seen.add(normalized)
+                    results.append(dict(self._suggestions[normalized]))
+                    if normalized in self._geocoded:
+                        self._geocoded.move_to_end(normalized)
+                i += 1
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._keys, self._suggestions, self._geocoded = [], {}, OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+address_index = AddressIndex() # глобальный экземпляр
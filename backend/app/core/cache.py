@@ -0,0 +1,121 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+_MISSING = object()
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с временем жизни записей"""
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not _MISSING: # протухла
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class SQLiteCacheStore:
+    """Персистентный уровень кэша в файле SQLite (значения - JSON)"""
+    def __init__(self, path: str, table: str = "cache"):
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value FROM {self.table} WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set(self, key: str, value: Any, ttl: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def close(self):
+        self._conn.close()
+
+class RedisCacheStore:
+    """Персистентный уровень кэша в Redis (или совместимом: KeyDB, Valkey)"""
+    def __init__(self, url: str, prefix: str = "cache:"):
+        try:
+            from redis import asyncio as redis # необязательная зависимость
+        except ImportError as e:
+            raise RuntimeError("Для кэша в Redis установите пакет redis") from e
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self._client.set(self.prefix + key, json.dumps(value, ensure_ascii=False), ex=max(int(ttl), 1))
+
+    async def close(self):
+        await self._client.close()
+
+def create_cache_store(url: str, namespace: str):
+    """Персистентный уровень по URL из конфига; None - кэш только в памяти"""
+    if not url:
+        return None
+    try:
+        if url.startswith("sqlite:///"):
+            return SQLiteCacheStore(url[len("sqlite:///"):], table=namespace)
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RedisCacheStore(url, prefix=f"{namespace}:")
+        print(f"Неизвестный адрес кэша: {url}")
+    except Exception as e:
+        print(f"Персистентный кэш недоступен, работаем только с памятью: {e}")
+    return None
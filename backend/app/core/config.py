@@ -12,4 +12,58 @@ BASE_DIR = Path("/app")
 if not MODEL_PATH:
     MODEL_PATH = str(BASE_DIR / "ml_module" / "roadguard_models" / "v2" / "weights" / "best.pt")
 
-YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY", "")
\ No newline at end of file
+YANDEX_MAPS_API_KEY = os.getenv("YANDEX_MAPS_API_KEY", "")
+YANDEX_GEOCODE_URL = os.getenv("YANDEX_GEOCODE_URL", "https://geocode-maps.yandex.ru/1.x/")
+GEOCODE_TIMEOUT = float(os.getenv("GEOCODE_TIMEOUT", "5"))
+GEOCODE_POOL_SIZE = int(os.getenv("GEOCODE_POOL_SIZE", "20")) # соединений к геокодеру
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "5000")) # запросов в памяти, 0 - без кэша
+GEOCODE_CACHE_TTL = int(os.getenv("GEOCODE_CACHE_TTL", "86400")) # секунд
+ADDRESS_SUGGEST_LIMIT = int(os.getenv("ADDRESS_SUGGEST_LIMIT", "5"))
+ADDRESS_INDEX_MIN_HITS = int(os.getenv("ADDRESS_INDEX_MIN_HITS", "3")) # столько совпадений в локальном индексе - без геокодера
+ADDRESS_INDEX_MAX_GEOCODED = int(os.getenv("ADDRESS_INDEX_MAX_GEOCODED", "10000")) # адресов из ответов геокодера в индексе (LRU)
+GEOCODE_CACHE_URL = os.getenv("GEOCODE_CACHE_URL", "") # redis://host:6379/0 или sqlite:///path.db, пусто - только память
+
+ML_CONFIDENCE = float(os.getenv("ML_CONFIDENCE", "0.3")) # порог уверенности детектора
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "8")) # макс. изображений в одном predict
+ML_BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "10")) # окно сбора батча
+ML_EXECUTOR = os.getenv("ML_EXECUTOR", "thread") # thread | process
+ML_INFERENCE_WORKERS = int(os.getenv("ML_INFERENCE_WORKERS", "1")) # параллельных батчей (потоков/процессов)
+ML_MAX_QUEUE_SIZE = int(os.getenv("ML_MAX_QUEUE_SIZE", "64")) # при переполнении отвечаем 503
+ML_RETRY_AFTER_SECONDS = int(os.getenv("ML_RETRY_AFTER_SECONDS", "2"))
+ML_BACKEND = os.getenv("ML_BACKEND", "pytorch") # pytorch | onnx | openvino | torchscript (см. services/inference_backends.py)
+ML_IMAGE_SIZE = int(os.getenv("ML_IMAGE_SIZE", "640")) # размер входа модели (и экспорта)
+ML_SLICED = os.getenv("ML_SLICED", "false").lower() == "true" # фото высокого разрешения - по тайлам (services/sliced_inference.py)
+ML_TILE_SIZE = int(os.getenv("ML_TILE_SIZE", "640"))
+ML_TILE_OVERLAP = float(os.getenv("ML_TILE_OVERLAP", "0.2")) # доля стороны тайла
+ML_SLICE_MIN_SIDE = int(os.getenv("ML_SLICE_MIN_SIDE", "1280")) # фото меньше режутся не будут
+ML_SLICE_NMS_IOU = float(os.getenv("ML_SLICE_NMS_IOU", "0.5")) # порог NMS при слиянии рамок тайлов
+ML_SLICE_MAX_BATCH = int(os.getenv("ML_SLICE_MAX_BATCH", "16")) # макс. тайлов в одном predict (память GPU/CPU)
+ML_MODEL_VERSION = os.getenv("ML_MODEL_VERSION", "") # пусто - по размеру и дате файла весов; бэкенд и нарезка - суффиксами
+VIDEO_MAX_SIZE = int(os.getenv("VIDEO_MAX_SIZE", str(1024 * 1024 * 1024))) # байт, видео с регистратора
+VIDEO_SAMPLE_INTERVAL = float(os.getenv("VIDEO_SAMPLE_INTERVAL", "0.5")) # сек. между анализируемыми кадрами
+VIDEO_SAMPLE_DISTANCE = float(os.getenv("VIDEO_SAMPLE_DISTANCE", "5")) # м между кадрами, если передан GPS-трек
+VIDEO_HASH_DISTANCE = int(os.getenv("VIDEO_HASH_DISTANCE", "6")) # из 64 бит dHash: ближе - кадр-дубль (машина стоит)
+VIDEO_TRACK_GAP = float(os.getenv("VIDEO_TRACK_GAP", "2")) # сек. без детекции, после которых дефект считается новым
+VIDEO_TRACK_DISTANCE = float(os.getenv("VIDEO_TRACK_DISTANCE", "20")) # м: дальше - другой дефект того же типа
+VIDEO_TRACK_IOU = float(os.getenv("VIDEO_TRACK_IOU", "0.1")) # пересечение рамок на соседних кадрах - тот же дефект
+VIDEO_TRACK_SHIFT = float(os.getenv("VIDEO_TRACK_SHIFT", "1.0")) # или сдвиг центра рамки не больше стольких её диагоналей
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "1024")) # результатов в памяти, 0 - без кэша
+DETECTION_CACHE_TTL = int(os.getenv("DETECTION_CACHE_TTL", str(30 * 24 * 3600))) # секунд, для персистентного уровня
+DETECTION_CACHE_URL = os.getenv("DETECTION_CACHE_URL", "") # sqlite:///path.db или redis://..., пусто - только память
+
+IMAGE_VARIANTS_ENABLED = os.getenv("IMAGE_VARIANTS_ENABLED", "true").lower() == "true" # превью и WebP для фото
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+
+CLUSTER_CACHE_SIZE = int(os.getenv("CLUSTER_CACHE_SIZE", "2048")) # тайлов кластеров в памяти, 0 - без кэша
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", "300")) # сек.: изменения из других процессов видны не позже
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000")) # строк в одном COPY/INSERT при импорте
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "100")) # подробно сообщаем о первых N ошибочных строках
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000")) # строк за одну выборку серверного курсора
+
+REANALYSIS_BATCH_SIZE = int(os.getenv("REANALYSIS_BATCH_SIZE", "16")) # фото, которые воркер забирает за раз
+REANALYSIS_LEASE_SECONDS = int(os.getenv("REANALYSIS_LEASE_SECONDS", "600")) # задачу упавшего воркера заберёт другой
+REANALYSIS_MAX_ATTEMPTS = int(os.getenv("REANALYSIS_MAX_ATTEMPTS", "3"))
+REANALYSIS_RETRY_DELAY = int(os.getenv("REANALYSIS_RETRY_DELAY", "60")) # сек. до повтора упавшей задачи
+REANALYSIS_POLL_INTERVAL = float(os.getenv("REANALYSIS_POLL_INTERVAL", "5")) # сек. ожидания, когда очередь пуста
+REANALYSIS_DOWNLOAD_WORKERS = int(os.getenv("REANALYSIS_DOWNLOAD_WORKERS", "4")) # параллельных скачиваний из MinIO
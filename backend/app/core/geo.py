@@ -0,0 +1,112 @@
+import math
+from typing import List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_PRECISION = 9 # ~5 м, хранимая точность ячейки
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit_count, even = 0, 0, True
+    result = []
+    while len(result) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(result)
+
+def _cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки geohash (lat, lon) в градусах"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+def bbox_cells(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+               max_cells: int = 32) -> List[str]:
+    """Префиксы geohash, покрывающие прямоугольник (не больше max_cells штук)"""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lon = _cell_size(precision)
+        rows = math.floor(max_lat / cell_lat) - math.floor(min_lat / cell_lat) + 1
+        cols = math.floor(max_lon / cell_lon) - math.floor(min_lon / cell_lon) + 1
+        if rows * cols > max_cells:
+            continue
+
+        cells = set()
+        for i in range(rows):
+            lat = min(min_lat + i * cell_lat, max_lat)
+            for j in range(cols):
+                lon = min(min_lon + j * cell_lon, max_lon)
+                cells.add(encode_geohash(lat, lon, precision))
+        # углы гарантированно покрыты даже при погрешности шага
+        for lat in (min_lat, max_lat):
+            for lon in (min_lon, max_lon):
+                cells.add(encode_geohash(lat, lon, precision))
+        return sorted(cells)
+    return [] # прямоугольник больше всех ячеек первого уровня - фильтр не нужен
+
+def prefix_range(prefix: str) -> Tuple[str, Optional[str]]:
+    """Диапазон [lo, hi) строк с данным префиксом - для B-tree индекса вместо LIKE"""
+    chars = list(prefix)
+    while chars:
+        index = _BASE32.index(chars[-1])
+        if index + 1 < len(_BASE32):
+            chars[-1] = _BASE32[index + 1]
+            return prefix, "".join(chars)
+        chars.pop()
+    return prefix, None
+
+def bbox_around(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(math.degrees(radius_km / EARTH_RADIUS_KM) / cos_lat, 180.0)
+    return (
+        max(lat - dlat, -90.0), max(lon - dlon, -180.0),
+        min(lat + dlat, 90.0), min(lon + dlon, 180.0)
+    )
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    """'min_lon,min_lat,max_lon,max_lat' (порядок GeoJSON) -> (min_lat, min_lon, max_lat, max_lon)"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(","))
+    except ValueError as e:
+        raise ValueError("bbox должен иметь вид min_lon,min_lat,max_lon,max_lat") from e
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise ValueError("Некорректные границы bbox")
+    return min_lat, min_lon, max_lat, max_lon
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """Границы тайла Web Mercator (slippy map) -> (min_lat, min_lon, max_lat, max_lon)"""
+    n = 2 ** z
+    min_lon = x / n * 360.0 - 180.0
+    max_lon = (x + 1) / n * 360.0 - 180.0
+    max_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    min_lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return min_lat, min_lon, max_lat, max_lon
+
+def tile_for_point(lat: float, lon: float, z: int) -> Tuple[int, int]:
+    n = 2 ** z
+    lat = max(min(lat, 85.05112878), -85.05112878) # предел проекции Web Mercator
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def cluster_precision(z: int) -> int:
+    """Точность geohash для кластеров на зуме z: ячейка примерно в 1/8 ширины тайла"""
+    return max(1, min(GEOHASH_PRECISION, round((z + 3) * 2 / 5)))
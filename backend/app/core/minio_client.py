@@ -1,10 +1,23 @@
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 from botocore.exceptions import ClientError
+import hashlib
+import hmac
+import time
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterable, Optional, Union
+from urllib.parse import quote, urlsplit
 import os
+from .cache import TTLCache
+
+# S3 принимает части multipart от 5 МБ; в памяти одновременно не больше
+# MINIO_MULTIPART_CHUNK_SIZE * MINIO_UPLOAD_CONCURRENCY байт на загрузку
+MULTIPART_CHUNK_SIZE = int(os.getenv("MINIO_MULTIPART_CHUNK_SIZE", str(5 * 1024 * 1024)))
+UPLOAD_CONCURRENCY = int(os.getenv("MINIO_UPLOAD_CONCURRENCY", "2"))
+PRESIGN_MARGIN = int(os.getenv("MINIO_PRESIGN_MARGIN", "300")) # ссылку перестают выдавать за столько секунд до истечения
+PRESIGN_CACHE_SIZE = int(os.getenv("MINIO_PRESIGN_CACHE_SIZE", "10000"))
 
 class MinIOClient:
     def __init__(self):
@@ -12,6 +25,10 @@ class MinIOClient:
         self.access_key = os.getenv("MINIO_ROOT_USER", "minioadmin")
         self.secret_key = os.getenv("MINIO_ROOT_PASSWORD", "minioadmin")
         self.bucket_name = os.getenv("MINIO_BUCKET", "roadguard-ai")
+        self.region = 'us-east-1'
+        self._host = urlsplit(self.endpoint).netloc
+        self._signing_keys: Dict[str, bytes] = {}
+        self.url_cache = TTLCache(PRESIGN_CACHE_SIZE, 0)
 
         self.client = boto3.client(
             's3',
@@ -22,24 +39,32 @@ class MinIOClient:
                 signature_version='s3v4',
                 s3={'addressing_style': 'path'}  
             ),
-            region_name='us-east-1'
+            region_name=self.region
         )
         
-        self._ensure_bucket_exists() # проверяем и создаём бакет
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=UPLOAD_CONCURRENCY
+        )
+        self.bucket_ready = False # бакет проверяется при старте приложения, не при импорте
     
-    def _ensure_bucket_exists(self): # создает пакет если его нет
+    def ensure_bucket_exists(self) -> bool: # создает бакет если его нет (сетевой вызов)
         try:
             self.client.head_bucket(Bucket=self.bucket_name)
             print(f"Бакет {self.bucket_name} уже существует")
+            self.bucket_ready = True
         except ClientError as e:
             if e.response['Error']['Code'] == '404':
                 try:
                     self.client.create_bucket(Bucket=self.bucket_name)
                     print(f"Бакет {self.bucket_name} создан")
+                    self.bucket_ready = True
                 except ClientError as create_error:
                     print(f"Ошибка создания бакета: {create_error}")
             else:
                 print(f"Ошибка проверки бакета: {e}")
+        return self.bucket_ready
     
     def generate_file_key(self, problem_id: int, filename: str) -> str: # путь для файла
         clean_filename = "".join(c for c in filename if c.isalnum() or c in '._-')
@@ -47,33 +72,58 @@ class MinIOClient:
         unique_name = f"{uuid.uuid4()}.{ext}"
         key = f"problems/{problem_id}/{unique_name}"
         return key
+
+    def blob_file_key(self, content_hash: str) -> str:
+        """Ключ общего объекта (см. ImageBlob): одинаковые файлы - один объект.
+        Каждое поколение объекта получает свой ключ, чтобы удаление последней
+        ссылки не стёрло объект, заново загруженный в этот момент"""
+        return f"blobs/{content_hash[:2]}/{content_hash}/{uuid.uuid4().hex}"
+
+    def derived_prefix(self, file_key: str) -> str:
+        """problems/1/<uuid>.jpg -> problems/1/derived/<uuid>/ (папка производных файлов)"""
+        folder, _, filename = file_key.rpartition('/')
+        return f"{folder}/derived/{filename.rsplit('.', 1)[0]}/"
+
+    def derived_file_key(self, file_key: str, name: str, ext: str) -> str:
+        return f"{self.derived_prefix(file_key)}{name}.{ext}"
     
     def upload_file( # загружает файл в MinIO и возвращает его ключ
         self, 
-        file_content: bytes, 
-        problem_id: int, 
+        file_content: Union[bytes, BinaryIO], 
+        problem_id: Optional[int], 
         filename: str, 
         content_type: str,
-        metadata: Optional[dict] = None
+        metadata: Optional[dict] = None,
+        file_key: Optional[str] = None
     ) -> Optional[str]:
         try:
-            file_key = self.generate_file_key(problem_id, filename)
+            file_key = file_key or self.generate_file_key(problem_id, filename)
 
             if metadata is None:
                 metadata = {}
             metadata.update({
                 'original_filename': filename,
-                'problem_id': str(problem_id),
                 'uploaded_at': datetime.now().isoformat()
             })
+            if problem_id is not None: # общий объект (blobs/...) может ещё не иметь проблемы
+                metadata['problem_id'] = str(problem_id)
             
-            self.client.put_object(
-                Bucket=self.bucket_name,
-                Key=file_key,
-                Body=file_content,
-                ContentType=content_type,
-                Metadata=metadata
-            )
+            if isinstance(file_content, (bytes, bytearray)):
+                self.client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Body=file_content,
+                    ContentType=content_type,
+                    Metadata=metadata
+                )
+            else: # поток читается частями, большие файлы уходят через multipart upload
+                self.client.upload_fileobj(
+                    file_content,
+                    self.bucket_name,
+                    file_key,
+                    ExtraArgs={'ContentType': content_type, 'Metadata': metadata},
+                    Config=self.transfer_config
+                )
             print(f"Файл загружен: {file_key}")
             return file_key
         except ClientError as e:
@@ -82,15 +132,64 @@ class MinIOClient:
     
     def get_presigned_url(self, file_key: str, expires_in: int = 3600) -> Optional[str]:
         """Генерирует временную ссылку для скачивания"""
-        try:
-            url = self.client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': file_key},
-                ExpiresIn=expires_in
-            )
-            return url
-        except ClientError:
-            return None
+        return self.get_presigned_urls([file_key], expires_in)[file_key]
+
+    def get_presigned_urls(self, file_keys: Iterable[str], expires_in: int = 3600) -> Dict[str, str]:
+        """Временные ссылки для нескольких файлов за один проход.
+
+        Время подписи округляется вниз до окна (expires_in - PRESIGN_MARGIN), поэтому
+        в пределах окна для файла выдаётся одна и та же ссылка (её кэширует и браузер),
+        и у выданной ссылки всегда остаётся не меньше PRESIGN_MARGIN секунд жизни.
+        """
+        window = max(expires_in - PRESIGN_MARGIN, expires_in // 2, 1)
+        now = time.time()
+        signed_at = int(now // window) * window
+        ttl = signed_at + window - now
+
+        urls = {}
+        for file_key in file_keys:
+            cache_key = (file_key, expires_in, signed_at)
+            url = self.url_cache.get(cache_key)
+            if url is None:
+                url = self._sign_url(file_key, expires_in, signed_at)
+                self.url_cache.set(cache_key, url, ttl)
+            urls[file_key] = url
+        return urls
+
+    def _signing_key(self, date: str) -> bytes:
+        """Ключ SigV4 зависит только от даты - считаем раз в сутки"""
+        key = self._signing_keys.get(date)
+        if key is None:
+            key = ('AWS4' + self.secret_key).encode()
+            for part in (date, self.region, 's3', 'aws4_request'):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self._signing_keys = {date: key}
+        return key
+
+    def _sign_url(self, file_key: str, expires_in: int, signed_at: int) -> str:
+        """Локальная подпись GET-ссылки (AWS SigV4, query string) без обращения к boto3"""
+        moment = datetime.fromtimestamp(signed_at, tz=timezone.utc)
+        amz_date = moment.strftime('%Y%m%dT%H%M%SZ')
+        date = amz_date[:8]
+        scope = f"{date}/{self.region}/s3/aws4_request"
+        path = quote(f"/{self.bucket_name}/{file_key}", safe='/~')
+        query = '&'.join(
+            f"{name}={quote(value, safe='-_.~')}"
+            for name, value in sorted({
+                'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+                'X-Amz-Credential': f"{self.access_key}/{scope}",
+                'X-Amz-Date': amz_date,
+                'X-Amz-Expires': str(expires_in),
+                'X-Amz-SignedHeaders': 'host',
+            }.items())
+        )
+        canonical_request = f"GET\n{path}\n{query}\nhost:{self._host}\n\nhost\nUNSIGNED-PAYLOAD"
+        string_to_sign = (
+            f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+            + hashlib.sha256(canonical_request.encode()).hexdigest()
+        )
+        signature = hmac.new(self._signing_key(date), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{self.endpoint.rstrip('/')}{path}?{query}&X-Amz-Signature={signature}"
     
     def delete_file(self, file_key: str) -> bool: # из MinIO
         try:
@@ -102,6 +201,27 @@ class MinIOClient:
         except ClientError:
             return False
     
+    def delete_image_files(self, file_key: str) -> bool:
+        """Удаляет фото вместе с его производными (derived/<uuid>/...)"""
+        if not self.delete_file(file_key):
+            return False
+        prefix = self.derived_prefix(file_key)
+        try:
+            listing = self.client.list_objects_v2(Bucket=self.bucket_name, Prefix=prefix)
+            objects = [{'Key': obj['Key']} for obj in listing.get('Contents', [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket_name, Delete={'Objects': objects})
+        except ClientError as e:
+            print(f"Ошибка удаления производных файлов {prefix}: {e}")
+        return True
+
+    def download_file(self, file_key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket_name, Key=file_key)
+            return response['Body'].read()
+        except ClientError:
+            return None
+    
     def get_file_info(self, file_key: str) -> Optional[dict]:
         try:
             response = self.client.head_object(
@@ -0,0 +1,17 @@
+import base64
+import json
+
+def encode_cursor(data: dict) -> str:
+    """Непрозрачный курсор для keyset-пагинации (base64url от JSON)"""
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Некорректный курсор") from e
+    if not isinstance(data, dict):
+        raise ValueError("Некорректный курсор")
+    return data
@@ -1,14 +1,14 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 import hashlib
 import secrets
 import uuid
 from ..core.config import ALGORITHM, SECRET_KEY
-from ..database import get_db
-from ..models import models
+from ..database import get_async_db
+from ..repositories.user_repo import AsyncUserRepository
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
@@ -37,7 +37,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
 def create_refresh_token():
     return str(uuid.uuid4())
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     # Получение пользователя из токена
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,7 +52,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = await AsyncUserRepository(db).get_by_email(email)
     if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -0,0 +1,42 @@
+import asyncio
+import time
+from typing import Callable, Dict, Optional
+
+class StartupTasks:
+    """Фоновые задачи старта (модель, бакет, индекс адресов). Приложение
+    принимает запросы сразу, а /ready показывает, что уже готово"""
+    def __init__(self):
+        self.states: Dict[str, dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, name: str, func: Callable, *args):
+        """Запускает блокирующую функцию в потоке; результат False - задача не удалась"""
+        self.states[name] = {"status": "running", "started_at": time.monotonic(), "error": None}
+        self._tasks[name] = asyncio.create_task(self._run(name, func, *args))
+
+    async def _run(self, name: str, func: Callable, *args):
+        state = self.states[name]
+        try:
+            result = await asyncio.to_thread(func, *args)
+            state["status"] = "failed" if result is False else "ready"
+        except Exception as e:
+            print(f"Ошибка задачи старта {name}: {e}")
+            state["status"], state["error"] = "failed", str(e)
+        state["seconds"] = round(time.monotonic() - state.pop("started_at"), 3)
+
+    def status(self, name: str) -> Optional[str]:
+        state = self.states.get(name)
+        return state["status"] if state else None
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {name: {k: v for k, v in state.items() if k != "started_at"} for name, state in self.states.items()}
+
+    async def wait(self, timeout: Optional[float] = None):
+        if self._tasks:
+            await asyncio.wait(list(self._tasks.values()), timeout=timeout)
+
+    def clear(self):
+        self.states.clear()
+        self._tasks.clear()
+
+startup_tasks = StartupTasks() # глобальный экземпляр
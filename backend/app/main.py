@@ -1,20 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from .database import get_db, engine
+from .database import get_db, engine, SessionLocal
+from .core.address_index import address_index
+from .core.config import ADDRESS_SUGGEST_LIMIT, ADDRESS_INDEX_MIN_HITS
+from .repositories.problem_repo import ProblemRepository
 from .models import models
-from .api import auth, admin, ml, problems
-from .services.yandex_maps import YandexMapsService
+from .api import auth, admin, detections, ml, problems
+from .schema import upgrade_schema
+from .core.minio_client import minio_client
+from .core.startup import startup_tasks
+from .services.ml_service import ml_service
+from .services.yandex_maps import yandex_maps_service
+from .services.image_variants import image_variant_pool
 
-try:
-    models.Base.metadata.create_all(bind=engine)
-    print("Таблицы созданы успешно!")
-except Exception as e:
-    print(f"Ошибка создания таблиц: {e}")
+def create_tables(): # при старте приложения, а не при импорте модуля
+    try:
+        models.Base.metadata.create_all(bind=engine)
+        upgrade_schema(engine)
+        print("Таблицы созданы успешно!")
+    except Exception as e:
+        print(f"Ошибка создания таблиц: {e}")
+
+def load_address_index():
+    db = SessionLocal()
+    try:
+        address_index.load(ProblemRepository(db).get_addresses())
+        print(f"Индекс адресов загружен: {len(address_index)}")
+    except Exception as e:
+        print(f"Ошибка загрузки индекса адресов: {e}")
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(create_tables)
+    await yandex_maps_service.start()
+    # остальное - в фоне: запросы, которым не нужна модель, обслуживаются сразу
+    startup_tasks.start("address_index", load_address_index)
+    if minio_client is not None:
+        startup_tasks.start("storage", minio_client.ensure_bucket_exists)
+    startup_tasks.start("ml_model", ml_service.load)
+    yield
+    await yandex_maps_service.close()
+    await asyncio.to_thread(image_variant_pool.shutdown)
 
 app = FastAPI(
+    lifespan=lifespan,
     title="RoadGuard AI API",
     description="API для системы мониторинга дорожного покрытия",
     version="1.0.0",
@@ -33,6 +69,7 @@ app.include_router(auth.router)
 app.include_router(problems.router)
 app.include_router(admin.router)
 app.include_router(ml.router)
+app.include_router(detections.router)
 
 @app.get("/")
 def read_root():
@@ -53,11 +90,41 @@ def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "unhealthy", "database": "error", "error": str(e)}
 
+@app.get("/ready")
+def readiness_check(response: Response, ml: bool = False, db: Session = Depends(get_db)):
+    """Готовность принимать трафик (/health - только что процесс жив).
+    ml=true - ещё и модель загружена (для инстансов, обслуживающих анализ фото)"""
+    try:
+        db.execute(text("SELECT 1"))
+        database = "ready"
+    except Exception as e:
+        print(f"БД не готова: {e}")
+        database = "failed"
+
+    ready = database == "ready" and (ml_service.available or not ml)
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "database": database,
+        "ml_model": ml_service.status,
+        "storage": "ready" if minio_client is not None and minio_client.bucket_ready else "not_ready",
+        "startup": startup_tasks.snapshot()
+    }
+
 @app.get("/api/address-suggest")
 async def address_suggest(query: str):
-    """Подсказки адресов от Яндекс.Карт"""
-    service = YandexMapsService()
-    return await service.suggest_address(query)
+    """Подсказки адресов: сначала известные адреса из локального индекса, затем Яндекс.Карты"""
+    if not query or len(query) < 3:
+        return []
+    local = address_index.search(query, ADDRESS_SUGGEST_LIMIT)
+    if len(local) >= min(ADDRESS_INDEX_MIN_HITS, ADDRESS_SUGGEST_LIMIT):
+        return local
+
+    remote = await yandex_maps_service.suggest_address(query)
+    address_index.add_suggestions(remote)
+    known = {s["address"] for s in local}
+    return (local + [s for s in remote if s["address"] not in known])[:ADDRESS_SUGGEST_LIMIT]
 
 @app.get("/sitemap.xml")
 async def get_sitemap():
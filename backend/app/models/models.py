@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Enum, ForeignKey, Float, Index, select
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred, column_property
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from ..database import Base
 import enum
 
@@ -47,19 +48,21 @@ class Problem(Base):
     reporter_id = Column(Integer, nullable=False)
     is_from_inspector = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    geohash = Column(String(12), nullable=True, index=True) # B-tree индекс для bbox/радиуса (см. core/geo.py)
+    # вектор полнотекстового поиска, в PostgreSQL заполняется триггером (см. problem_search)
+    search_vector = deferred(Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True))
 
     images = relationship("ProblemImage", back_populates="problem", lazy="select")
 
-    @property
-    def images_count(self):
-        return len(self.images)
-
 class ProblemImage(Base):
     __tablename__ = "problem_images"
     
     id = Column(Integer, primary_key=True, index=True)
-    problem_id = Column(Integer, ForeignKey("problems.id", ondelete="CASCADE"), nullable=False)
-    file_key = Column(String, nullable=False, unique=True, index=True)
+    problem_id = Column(Integer, ForeignKey("problems.id", ondelete="CASCADE"), nullable=False, index=True)
+    file_key = Column(String, nullable=False, index=True) # одинаковые фото ссылаются на один объект
+    content_hash = Column(String(64), nullable=True, index=True) # SHA-256 содержимого
     original_filename = Column(String, nullable=False)
     file_size = Column(Integer, nullable=False)  # в байтах
     content_type = Column(String, nullable=False)
@@ -68,6 +71,99 @@ class ProblemImage(Base):
     
     problem = relationship("Problem", back_populates="images")
     uploader = relationship("User")
+    variants = relationship(
+        "ProblemImageVariant", back_populates="image", lazy="selectin",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+
+class ProblemImageVariant(Base):
+    """Уменьшенная копия фото (превью, средний размер, WebP), см. services/image_variants.py"""
+    __tablename__ = "problem_image_variants"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("problem_images.id", ondelete="CASCADE"), nullable=False, index=True)
+    name = Column(String(32), nullable=False) # thumb, medium, thumb_webp...
+    file_key = Column(String, nullable=False) # общий у фото с одинаковым содержимым
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+
+    image = relationship("ProblemImage", back_populates="variants")
+
+class ImageBlob(Base):
+    """Объект в MinIO, адресуемый по содержимому. ref_count - сколько записей
+    problem_images на него ссылается; объект удаляется вместе с последней"""
+    __tablename__ = "image_blobs"
+
+    content_hash = Column(String(64), primary_key=True)
+    file_key = Column(String, nullable=False, unique=True)
+    file_size = Column(Integer, nullable=False)
+    content_type = Column(String, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Detection(Base):
+    """Дефект, найденный моделью на фото проблемы (рамка в пикселях оригинала)"""
+    __tablename__ = "detections"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_id = Column(Integer, ForeignKey("problem_images.id", ondelete="CASCADE"), nullable=False, index=True)
+    problem_id = Column(Integer, ForeignKey("problems.id", ondelete="CASCADE"), nullable=False, index=True)
+    type = Column(String(32), nullable=False) # значение ProblemType
+    class_name = Column(String(16), nullable=False) # класс модели (D00, D40...)
+    confidence = Column(Float, nullable=False)
+    x1 = Column(Integer, nullable=False)
+    y1 = Column(Integer, nullable=False)
+    x2 = Column(Integer, nullable=False)
+    y2 = Column(Integer, nullable=False)
+    model_version = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    # "ямы с уверенностью > 0.7" - диапазон по одному индексу, сразу в порядке confidence
+    __table_args__ = (Index("ix_detections_type_confidence", "type", "confidence"),)
+
+    @property
+    def bbox(self):
+        return [self.x1, self.y1, self.x2, self.y2]
+
+class ReanalysisRun(Base):
+    """Повторный анализ сохранённых фото новой версией модели"""
+    __tablename__ = "reanalysis_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    model_version = Column(String(64), nullable=False) # задачи берут только воркеры с этой версией
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ReanalysisJob(Base):
+    """Задача очереди: одно фото. Воркеры забирают pending через SELECT ... FOR UPDATE SKIP LOCKED"""
+    __tablename__ = "reanalysis_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("reanalysis_runs.id", ondelete="CASCADE"), nullable=False)
+    image_id = Column(Integer, ForeignKey("problem_images.id", ondelete="CASCADE"), nullable=False)
+    status = Column(String(16), nullable=False, default="pending") # pending, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    locked_by = Column(String(128), nullable=True) # воркер (host:pid)
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    retry_at = Column(DateTime(timezone=True), nullable=True) # упавшую задачу не берём раньше этого времени
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_reanalysis_jobs_status_id", "status", "id"), # выборка очереди
+        Index("ix_reanalysis_jobs_run_status", "run_id", "status"), # прогресс запуска
+        Index("ux_reanalysis_jobs_run_image", "run_id", "image_id", unique=True),
+    )
+
+# Кол-во фото считается в SQL коррелированным подзапросом в том же SELECT,
+# без загрузки строк problem_images (и без размножения строк JOIN'ом)
+Problem.images_count = column_property(
+    select(func.count(ProblemImage.id))
+    .where(ProblemImage.problem_id == Problem.id)
+    .correlate_except(ProblemImage)
+    .scalar_subquery()
+)
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
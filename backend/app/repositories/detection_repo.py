@@ -0,0 +1,87 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from ..models.models import Detection
+
+def detection_rows(image_id: int, problem_id: int, defects: List[dict], model_version: Optional[str]) -> List[dict]:
+    """Строки detections из defects ответа модели (см. ImageAnalysisResponse)"""
+    rows = []
+    for defect in defects:
+        x1, y1, x2, y2 = defect["bbox"]
+        rows.append({
+            "image_id": image_id, "problem_id": problem_id,
+            "type": defect["type"], "class_name": defect["class_name"],
+            "confidence": defect["confidence"],
+            "x1": x1, "y1": y1, "x2": x2, "y2": y2,
+            "model_version": model_version
+        })
+    return rows
+
+class DetectionRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def bulk_create(self, image_id: int, problem_id: int, defects: List[dict],
+                    model_version: Optional[str] = None) -> int:
+        rows = detection_rows(image_id, problem_id, defects, model_version)
+        if rows: # один INSERT ... VALUES (...), (...) на все рамки
+            self.db.execute(insert(Detection).values(rows))
+            self.db.commit()
+        return len(rows)
+
+    def _filtered(self, type: Optional[str], min_confidence: Optional[float],
+                  since: Optional[datetime], until: Optional[datetime], problem_id: Optional[int]):
+        query = self.db.query(Detection)
+        if type:
+            query = query.filter(Detection.type == type)
+        if min_confidence is not None:
+            query = query.filter(Detection.confidence >= min_confidence)
+        if since:
+            query = query.filter(Detection.created_at >= since)
+        if until:
+            query = query.filter(Detection.created_at < until)
+        if problem_id is not None:
+            query = query.filter(Detection.problem_id == problem_id)
+        return query
+
+    def get_filtered(self, type: Optional[str] = None, min_confidence: Optional[float] = None,
+                     since: Optional[datetime] = None, until: Optional[datetime] = None,
+                     problem_id: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[Detection]:
+        """Самые уверенные сначала: с фильтром по типу порядок даёт индекс (type, confidence)"""
+        return (
+            self._filtered(type, min_confidence, since, until, problem_id)
+            .order_by(Detection.confidence.desc(), Detection.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+    def get_stats(self, min_confidence: Optional[float] = None, since: Optional[datetime] = None,
+                  until: Optional[datetime] = None) -> List[dict]:
+        """Кол-во дефектов по типам (GROUP BY в SQL)"""
+        query = self._filtered(None, min_confidence, since, until, None).with_entities(
+            Detection.type,
+            func.count(Detection.id),
+            func.avg(Detection.confidence),
+            func.count(func.distinct(Detection.problem_id))
+        )
+        rows = query.group_by(Detection.type).order_by(func.count(Detection.id).desc()).all()
+        return [
+            {"type": type, "count": count, "avg_confidence": float(avg), "problems": problems}
+            for type, count, avg, problems in rows
+        ]
+
+class AsyncDetectionRepository:
+    """Работа с найденными дефектами в БД (AsyncSession)"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def bulk_create(self, image_id: int, problem_id: int, defects: List[dict],
+                          model_version: Optional[str] = None) -> int:
+        rows = detection_rows(image_id, problem_id, defects, model_version)
+        if rows:
+            await self.db.execute(insert(Detection).values(rows))
+            await self.db.commit()
+        return len(rows)
@@ -1,21 +1,55 @@
-from typing import List
+from typing import List, Optional
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..models.models import ProblemImage
+from ..models.models import ProblemImage, ProblemImageVariant, ImageBlob
+
+VARIANT_FIELDS = ("name", "file_key", "width", "height", "file_size", "content_type")
+
+# Счётчик ссылок меняется одним UPDATE ... RETURNING - без гонок между воркерами
+def acquire_blob_statement(content_hash: str):
+    return (
+        update(ImageBlob)
+        .where(ImageBlob.content_hash == content_hash)
+        .values(ref_count=ImageBlob.ref_count + 1)
+        .returning(ImageBlob.file_key)
+    )
+
+def release_blob_statement(content_hash: str, file_key: str):
+    return (
+        update(ImageBlob)
+        .where(ImageBlob.content_hash == content_hash, ImageBlob.file_key == file_key)
+        .values(ref_count=ImageBlob.ref_count - 1)
+        .returning(ImageBlob.ref_count)
+    )
+
+def images_without_variants(content_hash: str, file_key: str):
+    return select(ProblemImage.id).where(
+        ProblemImage.content_hash == content_hash,
+        ProblemImage.file_key == file_key,
+        ~ProblemImage.variants.any()
+    )
 
 class ImageRepository:
     def __init__(self, db: Session):
         self.db = db
-    
+
+    def get_by_id(self, image_id: int) -> Optional[ProblemImage]:
+        return self.db.query(ProblemImage).filter(ProblemImage.id == image_id).first()
+
     def get_by_problem(self, problem_id: int) -> List[ProblemImage]: # получает изображения проблемы
         return self.db.query(ProblemImage).filter(
             ProblemImage.problem_id == problem_id
         ).all()
 
-    def create(self, problem_id: int, file_key: str, original_filename: str, 
-               file_size: int, content_type: str, uploaded_by: int) -> ProblemImage:
+    def create(self, problem_id: int, file_key: str, original_filename: str,
+               file_size: int, content_type: str, uploaded_by: int,
+               content_hash: Optional[str] = None) -> ProblemImage:
         db_image = ProblemImage(
             problem_id=problem_id,
             file_key=file_key,
+            content_hash=content_hash,
             original_filename=original_filename,
             file_size=file_size,
             content_type=content_type,
@@ -25,10 +59,169 @@ class ImageRepository:
         self.db.commit()
         self.db.refresh(db_image)
         return db_image
-    
+
+    def acquire_blob(self, content_hash: str) -> Optional[str]:
+        """+1 ссылка на уже сохранённый объект с таким содержимым; None - объекта нет"""
+        file_key = self.db.execute(acquire_blob_statement(content_hash)).scalar()
+        self.db.commit()
+        return file_key
+
+    def register_blob(self, content_hash: str, file_key: str, file_size: int, content_type: str) -> str:
+        """Первая ссылка на только что загруженный объект. Если параллельно загрузили
+        то же содержимое, используем уже записанный объект"""
+        self.db.add(ImageBlob(content_hash=content_hash, file_key=file_key,
+                              file_size=file_size, content_type=content_type, ref_count=1))
+        try:
+            self.db.commit()
+            return file_key
+        except IntegrityError:
+            self.db.rollback()
+            return self.acquire_blob(content_hash) or file_key
+
+    def release_file(self, image: ProblemImage, commit: bool = True) -> bool:
+        """-1 ссылка; True - файл больше никому не нужен и его можно удалить из MinIO.
+        commit=False - в общей транзакции с удалением записи (см. ImageService.delete_image)"""
+        if not image.content_hash:
+            return True
+        return self.release_blob(image.content_hash, image.file_key, commit)
+
+    def release_blob(self, content_hash: str, file_key: str, commit: bool = True) -> bool:
+        ref_count = self.db.execute(release_blob_statement(content_hash, file_key)).scalar()
+        if ref_count is not None and ref_count <= 0:
+            self.db.execute(delete(ImageBlob).where(
+                ImageBlob.content_hash == content_hash, ImageBlob.file_key == file_key
+            ))
+        if commit:
+            self.db.commit()
+        return ref_count is None or ref_count <= 0
+
+    def attach_variants(self, content_hash: str, file_key: str, variants: List[dict]):
+        """Варианты общего объекта - всем фото, ссылающимся на этот объект, у которых их ещё нет"""
+        if not variants:
+            return
+        image_ids = self.db.execute(images_without_variants(content_hash, file_key)).scalars().all()
+        self.db.add_all(
+            ProblemImageVariant(image_id=image_id, **fields)
+            for image_id in image_ids for fields in variants
+        )
+        self.db.commit()
+
+    def copy_variants(self, content_hash: str, file_key: str, image_id: int):
+        """Новое фото с уже известным содержимым получает готовые варианты того же объекта"""
+        source = self.db.query(ProblemImage).filter(
+            ProblemImage.content_hash == content_hash,
+            ProblemImage.file_key == file_key,
+            ProblemImage.id != image_id,
+            ProblemImage.variants.any()
+        ).first()
+        if source:
+            self.db.add_all(
+                ProblemImageVariant(image_id=image_id, **{f: getattr(v, f) for f in VARIANT_FIELDS})
+                for v in source.variants
+            )
+            self.db.commit()
+
+    def delete(self, image_id: int, commit: bool = True) -> bool:
+        result = self.db.query(ProblemImage).filter(
+            ProblemImage.id == image_id
+        ).delete(synchronize_session=False)
+        if commit:
+            self.db.commit()
+        return result > 0
+
     def delete_by_problem(self, problem_id: int) -> int: # удал все записи изображений для проблемы
         result = self.db.query(ProblemImage).filter(
             ProblemImage.problem_id == problem_id
         ).delete(synchronize_session=False)
         self.db.commit()
-        return result
\ No newline at end of file
+        return result
+
+class AsyncImageRepository:
+    """Работа с изображениями в БД (AsyncSession)"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_id(self, image_id: int) -> Optional[ProblemImage]:
+        return await self.db.get(ProblemImage, image_id)
+
+    async def get_by_problem(self, problem_id: int) -> List[ProblemImage]:
+        result = await self.db.execute(
+            select(ProblemImage).where(ProblemImage.problem_id == problem_id)
+        )
+        return result.scalars().all()
+
+    async def create(self, problem_id: int, file_key: str, original_filename: str,
+                     file_size: int, content_type: str, uploaded_by: int,
+                     content_hash: Optional[str] = None) -> ProblemImage:
+        db_image = ProblemImage(
+            problem_id=problem_id,
+            file_key=file_key,
+            content_hash=content_hash,
+            original_filename=original_filename,
+            file_size=file_size,
+            content_type=content_type,
+            uploaded_by=uploaded_by
+        )
+        self.db.add(db_image)
+        await self.db.commit()
+        await self.db.refresh(db_image)
+        return db_image
+
+    async def acquire_blob(self, content_hash: str) -> Optional[str]:
+        file_key = (await self.db.execute(acquire_blob_statement(content_hash))).scalar()
+        await self.db.commit()
+        return file_key
+
+    async def register_blob(self, content_hash: str, file_key: str, file_size: int, content_type: str) -> str:
+        self.db.add(ImageBlob(content_hash=content_hash, file_key=file_key,
+                              file_size=file_size, content_type=content_type, ref_count=1))
+        try:
+            await self.db.commit()
+            return file_key
+        except IntegrityError:
+            await self.db.rollback()
+            return await self.acquire_blob(content_hash) or file_key
+
+    async def release_file(self, image: ProblemImage, commit: bool = True) -> bool:
+        if not image.content_hash:
+            return True
+        return await self.release_blob(image.content_hash, image.file_key, commit)
+
+    async def release_blob(self, content_hash: str, file_key: str, commit: bool = True) -> bool:
+        ref_count = (await self.db.execute(release_blob_statement(content_hash, file_key))).scalar()
+        if ref_count is not None and ref_count <= 0:
+            await self.db.execute(delete(ImageBlob).where(
+                ImageBlob.content_hash == content_hash, ImageBlob.file_key == file_key
+            ))
+        if commit:
+            await self.db.commit()
+        return ref_count is None or ref_count <= 0
+
+    async def copy_variants(self, content_hash: str, file_key: str, image_id: int):
+        source = (await self.db.scalars(
+            select(ProblemImage).where(
+                ProblemImage.content_hash == content_hash,
+                ProblemImage.file_key == file_key,
+                ProblemImage.id != image_id,
+                ProblemImage.variants.any()
+            ).limit(1)
+        )).first()
+        if source:
+            self.db.add_all(
+                ProblemImageVariant(image_id=image_id, **{f: getattr(v, f) for f in VARIANT_FIELDS})
+                for v in source.variants
+            )
+            await self.db.commit()
+
+    async def delete(self, image_id: int, commit: bool = True) -> bool:
+        result = await self.db.execute(delete(ProblemImage).where(ProblemImage.id == image_id))
+        if commit:
+            await self.db.commit()
+        return result.rowcount > 0
+
+    async def delete_by_problem(self, problem_id: int) -> int:
+        result = await self.db.execute(
+            delete(ProblemImage).where(ProblemImage.problem_id == problem_id)
+        )
+        await self.db.commit()
+        return result.rowcount
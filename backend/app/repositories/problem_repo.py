@@ -1,9 +1,171 @@
-from typing import Optional
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+import asyncio
+import csv
+import enum
+import io
+import math
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, and_, select, func, delete, insert, update, text, values, column, cast, Integer, String
 from ..models.models import Problem, ProblemStatus, ProblemType, ProblemImage
 from ..schemas.schemas import ProblemCreate
 from ..core.minio_client import minio_client
+from ..core.pagination import encode_cursor, decode_cursor
+from ..core.address_index import address_index
+from ..core.geo import (
+    EARTH_RADIUS_KM, encode_geohash, bbox_cells, bbox_around, prefix_range, haversine_km
+)
+from .problem_search import ProblemSearch
+from .image_repo import ImageRepository, AsyncImageRepository
+
+SORT_COLUMNS = {
+    'created_at': Problem.created_at,
+    'type': Problem.type,
+    'status': Problem.status,
+    'address': Problem.address
+}
+
+def bbox_filter(min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    """Прямоугольник: диапазоны geohash отбирают ячейки по индексу, точные границы - lat/lon"""
+    conditions = [
+        Problem.lat.between(min_lat, max_lat),
+        Problem.lon.between(min_lon, max_lon)
+    ]
+    cells = bbox_cells(min_lat, min_lon, max_lat, max_lon)
+    if cells:
+        ranges = []
+        for cell in cells:
+            lo, hi = prefix_range(cell)
+            ranges.append(and_(Problem.geohash >= lo, Problem.geohash < hi) if hi else Problem.geohash >= lo)
+        conditions.insert(0, or_(*ranges))
+    return and_(*conditions)
+
+def squared_distance_km(lat: float, lon: float):
+    """Квадрат расстояния в км (равнопромежуточная проекция, только арифметика - работает и в SQLite)"""
+    km_per_degree = math.radians(1) * EARTH_RADIUS_KM
+    dlat = (Problem.lat - lat) * km_per_degree
+    dlon = (Problem.lon - lon) * (km_per_degree * math.cos(math.radians(lat)))
+    return dlat * dlat + dlon * dlon
+
+def radius_filter(lat: float, lon: float, radius_km: float):
+    return and_(
+        bbox_filter(*bbox_around(lat, lon, radius_km)),
+        squared_distance_km(lat, lon) <= radius_km ** 2
+    )
+
+def problem_filters(status=None, type=None, is_from_inspector=None, search=None,
+                    searcher: Optional[ProblemSearch] = None,
+                    bbox: Optional[Tuple[float, float, float, float]] = None,
+                    near: Optional[Tuple[float, float, float]] = None) -> list:
+    filters = []
+    if status:
+        filters.append(Problem.status == status)
+    if type:
+        filters.append(Problem.type == type)
+    if is_from_inspector is not None:
+        filters.append(Problem.is_from_inspector == is_from_inspector)
+    if search:
+        filters.append((searcher or ProblemSearch("")).filter(search))
+    if bbox:
+        filters.append(bbox_filter(*bbox))
+    if near:
+        filters.append(radius_filter(*near))
+    return filters
+
+def resolve_order_column(sort_by: str, search: Optional[str], searcher: ProblemSearch):
+    if sort_by == 'relevance':
+        if not search:
+            return Problem.created_at
+        return searcher.rank(search)
+    return SORT_COLUMNS.get(sort_by, Problem.created_at)
+
+def order_by_keyset(order_column, sort_order: str) -> list:
+    # id - второй ключ: порядок однозначен даже при одинаковых значениях сортировки
+    if sort_order == 'desc':
+        return [order_column.desc(), Problem.id.desc()]
+    return [order_column.asc(), Problem.id.asc()]
+
+def _cursor_value(problem: Problem, sort_by: str):
+    value = getattr(problem, sort_by if sort_by in SORT_COLUMNS else 'created_at')
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+def make_cursor(problem: Problem, sort_by: str, sort_order: str) -> str:
+    return encode_cursor({
+        "sort_by": sort_by,
+        "sort_order": sort_order,
+        "value": _cursor_value(problem, sort_by),
+        "id": problem.id
+    })
+
+# колонки массового импорта (created_at и search_vector заполняет БД)
+IMPORT_COLUMNS = ("address", "description", "type", "status", "reporter_id", "is_from_inspector", "lat", "lon", "geohash")
+EXPORT_COLUMNS = (
+    Problem.id, Problem.type, Problem.status, Problem.address, Problem.description,
+    Problem.lat, Problem.lon, Problem.reporter_id, Problem.is_from_inspector, Problem.created_at
+)
+
+def copy_value(value):
+    """Значение для COPY ... (FORMAT csv): enum - по имени, как их хранит SQLAlchemy"""
+    return value.name if isinstance(value, enum.Enum) else value
+
+def coordinates(lat: Optional[float], lon: Optional[float]) -> dict:
+    if lat is None or lon is None:
+        return {}
+    return {"lat": lat, "lon": lon, "geohash": encode_geohash(lat, lon)}
+
+def page_response(rows: list, total: Optional[int], page: int, limit: int,
+                  cursor_mode: bool, sort_by: str, sort_order: str) -> dict:
+    if cursor_mode:
+        items = rows[:limit]
+        next_cursor = make_cursor(items[-1], sort_by, sort_order) if len(rows) > limit else None
+        return {
+            "items": items,
+            "total": total,
+            "page": None,
+            "limit": limit,
+            "total_pages": None,
+            "next_cursor": next_cursor
+        }
+
+    if total is None:
+        total_pages = None
+    else:
+        total_pages = (total + limit - 1) // limit if total > 0 else 1
+
+    return {
+        "items": rows,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "total_pages": total_pages
+    }
+
+def after_cursor(order_column, sort_by: str, sort_order: str, cursor: str):
+    """Условие "строго после курсора" для пары (order_column, id)"""
+    data = decode_cursor(cursor)
+    if data.get("sort_by") != sort_by or data.get("sort_order") != sort_order:
+        raise ValueError("Курсор выдан для другой сортировки")
+    try:
+        last_id = int(data["id"])
+        value = data["value"]
+        if order_column is Problem.created_at:
+            value = datetime.fromisoformat(value)
+        elif order_column is Problem.type:
+            value = ProblemType(value)
+        elif order_column is Problem.status:
+            value = ProblemStatus(value)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+    if sort_order == 'desc':
+        return or_(order_column < value, and_(order_column == value, Problem.id < last_id))
+    return or_(order_column > value, and_(order_column == value, Problem.id > last_id))
+
 
 class ProblemRepository:
     """Работа с проблемами в БД"""
@@ -22,59 +184,53 @@ class ProblemRepository:
         sort_by: str = "created_at",
         sort_order: str = "desc",
         page: int = 1,
-        limit: int = 10
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        use_cursor: bool = False,
+        total_mode: str = "exact",
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        near: Optional[Tuple[float, float, float]] = None
     ):
-        """Получение проблем с фильтрацией, сортировкой и пагинацией"""
-        
-        query = self.db.query(Problem).options(joinedload(Problem.images))
-        
-        if status:
-            query = query.filter(Problem.status == status)
-        if type:
-            query = query.filter(Problem.type == type)
-        if is_from_inspector is not None:
-            query = query.filter(Problem.is_from_inspector == is_from_inspector)
-        
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                or_(
-                    Problem.address.ilike(search_pattern),
-                    Problem.description.ilike(search_pattern)
-                )
-            )
-        
-        total = query.count() # общее кол-во
-        
-        if sort_by == 'created_at':
-            order_column = Problem.created_at
-        elif sort_by == 'type':
-            order_column = Problem.type
-        elif sort_by == 'status':
-            order_column = Problem.status
-        elif sort_by == 'address':
-            order_column = Problem.address
-        else:
-            order_column = Problem.created_at 
-        
-        if sort_order == 'desc':
-            query = query.order_by(order_column.desc())
+        """Получение проблем с фильтрацией, сортировкой и пагинацией.
+
+        Режим курсора (use_cursor или передан cursor) работает по ключу (sort column, id)
+        без OFFSET, поэтому время ответа не растёт с глубиной страницы.
+        total_mode: exact - COUNT(*), approx - оценка из pg_class.reltuples, none - не считать.
+        bbox - (min_lat, min_lon, max_lat, max_lon), near - (lat, lon, radius_km).
+        """
+        searcher = ProblemSearch(self.db.get_bind().dialect.name)
+        filters = problem_filters(status, type, is_from_inspector, search, searcher, bbox, near)
+        order_column = resolve_order_column(sort_by, search, searcher)
+        cursor_mode = bool(cursor) or use_cursor
+        if cursor_mode and sort_by == 'relevance':
+            raise ValueError("Режим курсора не поддерживает сортировку по релевантности")
+
+        query = self.db.query(Problem).filter(*filters)
+        if cursor:
+            query = query.filter(after_cursor(order_column, sort_by, sort_order, cursor))
+        query = query.order_by(*order_by_keyset(order_column, sort_order))
+
+        total = self._count(filters, total_mode)
+
+        if cursor_mode:
+            rows = query.limit(limit + 1).all() # +1 строка: есть ли следующая страница
         else:
-            query = query.order_by(order_column.asc())
-        
-        offset = (page - 1) * limit # пагинация
-        items = query.offset(offset).limit(limit).all()
+            rows = query.offset((page - 1) * limit).limit(limit).all() # пагинация
+
+        return page_response(rows, total, page, limit, cursor_mode, sort_by, sort_order)
+
+    def _count(self, filters: list, total_mode: str) -> Optional[int]:
+        if total_mode == "none":
+            return None
+        if total_mode == "approx" and not filters and self.db.get_bind().dialect.name == "postgresql":
+            # оценка планировщика: мгновенно, но точна только после ANALYZE/autovacuum
+            estimate = self.db.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = 'problems'"
+            )).scalar()
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        return self.db.query(func.count(Problem.id)).filter(*filters).scalar()
 
-        total_pages = (total + limit - 1) // limit if total > 0 else 1
-        
-        return {
-            "items": items,
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "total_pages": total_pages
-        }
-    
     def get_by_id(self, problem_id: int):
         return self.db.query(Problem).filter(Problem.id == problem_id).first()
     
@@ -84,14 +240,62 @@ class ProblemRepository:
             description=problem_data.description,
             type=problem_data.type,
             reporter_id=reporter_id,
-            is_from_inspector=is_from_inspector
+            is_from_inspector=is_from_inspector,
+            **coordinates(problem_data.lat, problem_data.lon)
         )
         self.db.add(db_problem)
         self.db.commit()
         self.db.refresh(db_problem)
+        address_index.add(db_problem.address, db_problem.lat, db_problem.lon)
         return db_problem
 
-    def update(self, problem_id: int, address: str, description: str, type: ProblemType):
+    def bulk_insert(self, rows: List[dict]) -> List[int]:
+        """Пачка проблем (словари с ключами IMPORT_COLUMNS) без commit - транзакцию
+        завершает вызывающий. PostgreSQL - COPY (id заранее берутся из последовательности),
+        иначе - многострочный INSERT ... RETURNING. id - в порядке строк"""
+        if not rows:
+            return []
+        if self.db.get_bind().dialect.name == "postgresql":
+            return self._copy(rows)
+        return list(self.db.execute(
+            insert(Problem).returning(Problem.id, sort_by_parameter_order=True), rows
+        ).scalars())
+
+    def _copy(self, rows: List[dict]) -> List[int]:
+        ids = self.db.execute(
+            text("SELECT nextval(pg_get_serial_sequence('problems', 'id')) FROM generate_series(1, :n)"),
+            {"n": len(rows)}
+        ).scalars().all()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n") # None и пустая строка -> пустое поле -> NULL
+        for problem_id, row in zip(ids, rows):
+            writer.writerow([problem_id, *(copy_value(row[column]) for column in IMPORT_COLUMNS)])
+        buffer.seek(0)
+        cursor = self.db.connection().connection.cursor() # соединение текущей транзакции
+        cursor.copy_expert(f"COPY problems (id, {', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        return ids
+
+    def iter_for_export(self, status: Optional[ProblemStatus] = None, type: Optional[ProblemType] = None,
+                        is_from_inspector: Optional[bool] = None, search: Optional[str] = None,
+                        bbox: Optional[Tuple[float, float, float, float]] = None,
+                        batch_size: int = 1000) -> Iterator[list]:
+        """Строки EXPORT_COLUMNS пачками по batch_size. Серверный курсор (yield_per):
+        в памяти не больше одной пачки при любом размере таблицы"""
+        searcher = ProblemSearch(self.db.get_bind().dialect.name)
+        query = (
+            select(*EXPORT_COLUMNS)
+            .where(*problem_filters(status, type, is_from_inspector, search, searcher, bbox))
+            .order_by(Problem.id)
+            .execution_options(yield_per=batch_size)
+        )
+        yield from self.db.execute(query).partitions()
+
+    def get_addresses(self):
+        """(address, lat, lon) всех проблем - для префиксного индекса подсказок"""
+        return self.db.query(Problem.address, Problem.lat, Problem.lon).yield_per(1000)
+
+    def update(self, problem_id: int, address: str, description: str, type: ProblemType,
+               lat: Optional[float] = None, lon: Optional[float] = None):
         problem = self.get_by_id(problem_id)
         if not problem:
             return None
@@ -99,11 +303,33 @@ class ProblemRepository:
         problem.address = address
         problem.description = description
         problem.type = type
+        if lat is not None and lon is not None:
+            for field, value in coordinates(lat, lon).items():
+                setattr(problem, field, value)
         
         self.db.commit()
         self.db.refresh(problem)
+        address_index.add(problem.address, problem.lat, problem.lon)
         return problem
 
+    def get_nearest(self, lat: float, lon: float, limit: int = 10, max_radius_km: float = 50.0):
+        """Ближайшие проблемы: радиус растёт, пока не наберётся limit, каждая итерация - запрос по индексу"""
+        distance = squared_distance_km(lat, lon)
+        radius_km = min(0.5, max_radius_km)
+        while True:
+            rows = (
+                self.db.query(Problem)
+                .filter(radius_filter(lat, lon, radius_km))
+                .order_by(distance)
+                .limit(limit)
+                .all()
+            )
+            # всё, что за пределами радиуса, дальше найденного - результат точный
+            if len(rows) >= limit or radius_km >= max_radius_km:
+                break
+            radius_km = min(radius_km * 4, max_radius_km)
+        return [(problem, haversine_km(lat, lon, problem.lat, problem.lon)) for problem in rows]
+
     def update_status(self, problem_id: int, status: ProblemStatus):
         problem = self.get_by_id(problem_id)
         if problem:
@@ -111,6 +337,34 @@ class ProblemRepository:
             self.db.commit()
             self.db.refresh(problem)
         return problem
+
+    def get_for_status_update(self, problem_ids: List[int]) -> list:
+        """Текущий статус (и поля для кэша кластеров) одним запросом; строки
+        блокируются до конца транзакции (SELECT ... FOR UPDATE в PostgreSQL)
+        в порядке id - пересекающиеся пачки не ждут друг друга по кругу (deadlock)"""
+        return self.db.execute(
+            select(Problem.id, Problem.status, Problem.type, Problem.lat, Problem.lon, Problem.geohash)
+            .where(Problem.id.in_(problem_ids))
+            .order_by(Problem.id)
+            .with_for_update()
+        ).all()
+
+    def bulk_update_status(self, changes: Dict[int, ProblemStatus]):
+        """Статусы многих проблем без commit. PostgreSQL - один UPDATE ... FROM (VALUES ...);
+        SQLite не понимает имена колонок у VALUES - там UPDATE по первичному ключу пачкой"""
+        if not changes:
+            return
+        if self.db.get_bind().dialect.name != "postgresql":
+            self.db.execute(update(Problem), [{"id": problem_id, "status": status} for problem_id, status in changes.items()])
+            return
+        new_status = values(column("id", Integer), column("status", String), name="new_status").data(
+            [(problem_id, status.name) for problem_id, status in changes.items()] # enum хранится по имени
+        )
+        self.db.execute(
+            update(Problem)
+            .where(Problem.id == new_status.c.id)
+            .values(status=cast(new_status.c.status, Problem.status.type))
+        )
     
     def delete(self, problem_id: int):
         problem = self.get_by_id(problem_id)
@@ -125,11 +379,128 @@ class ProblemRepository:
             return False
 
         images = self.db.query(ProblemImage).filter(ProblemImage.problem_id == problem_id).all()
+        image_repo = ImageRepository(self.db)
         
         for img in images:
-            minio_client.delete_file(img.file_key)
+            if image_repo.release_file(img): # общий с другими фото объект остаётся
+                minio_client.delete_image_files(img.file_key)
         
         self.db.delete(problem) # каскадно удалятся записи в БД
         self.db.commit()
         return True
-    
\ No newline at end of file
+
+class AsyncProblemRepository:
+    """Работа с проблемами в БД (AsyncSession).
+
+    Связь images здесь не загружается (ленивая загрузка в async-сессии невозможна),
+    images_count приходит из SQL через column_property.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_all(self):
+        result = await self.db.execute(select(Problem))
+        return result.scalars().all()
+
+    async def get_filtered(
+        self,
+        status: Optional[ProblemStatus] = None,
+        type: Optional[ProblemType] = None,
+        is_from_inspector: Optional[bool] = None,
+        search: Optional[str] = None,
+        sort_by: str = "created_at",
+        sort_order: str = "desc",
+        page: int = 1,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+        use_cursor: bool = False,
+        total_mode: str = "exact",
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        near: Optional[Tuple[float, float, float]] = None
+    ):
+        """Получение проблем с фильтрацией, сортировкой и пагинацией (см. ProblemRepository)"""
+        searcher = ProblemSearch(self.db.get_bind().dialect.name)
+        filters = problem_filters(status, type, is_from_inspector, search, searcher, bbox, near)
+        order_column = resolve_order_column(sort_by, search, searcher)
+        cursor_mode = bool(cursor) or use_cursor
+        if cursor_mode and sort_by == 'relevance':
+            raise ValueError("Режим курсора не поддерживает сортировку по релевантности")
+
+        query = select(Problem).where(*filters)
+        if cursor:
+            query = query.where(after_cursor(order_column, sort_by, sort_order, cursor))
+        query = query.order_by(*order_by_keyset(order_column, sort_order))
+
+        total = await self._count(filters, total_mode)
+
+        if cursor_mode:
+            query = query.limit(limit + 1)
+        else:
+            query = query.offset((page - 1) * limit).limit(limit)
+        rows = (await self.db.execute(query)).scalars().all()
+
+        return page_response(list(rows), total, page, limit, cursor_mode, sort_by, sort_order)
+
+    async def _count(self, filters: list, total_mode: str) -> Optional[int]:
+        if total_mode == "none":
+            return None
+        if total_mode == "approx" and not filters and self.db.get_bind().dialect.name == "postgresql":
+            estimate = await self.db.scalar(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = 'problems'"
+            ))
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        return await self.db.scalar(select(func.count(Problem.id)).where(*filters))
+
+    async def get_by_id(self, problem_id: int):
+        result = await self.db.execute(
+            select(Problem)
+            .where(Problem.id == problem_id)
+            .execution_options(populate_existing=True) # images_count мог измениться в этой же сессии
+        )
+        return result.scalars().first()
+
+    async def create(self, problem_data: ProblemCreate, reporter_id: int, is_from_inspector: bool,
+                     commit: bool = True):
+        """commit=False - только flush (id уже есть), commit и индекс адресов - на вызывающем"""
+        db_problem = Problem(
+            address=problem_data.address,
+            description=problem_data.description,
+            type=problem_data.type,
+            reporter_id=reporter_id,
+            is_from_inspector=is_from_inspector,
+            **coordinates(problem_data.lat, problem_data.lon)
+        )
+        self.db.add(db_problem)
+        if not commit:
+            await self.db.flush()
+            return db_problem
+        await self.db.commit()
+        await self.db.refresh(db_problem, attribute_names=["created_at", "images_count"])
+        address_index.add(db_problem.address, db_problem.lat, db_problem.lon)
+        return db_problem
+
+    async def update_status(self, problem_id: int, status: ProblemStatus):
+        problem = await self.get_by_id(problem_id)
+        if problem:
+            problem.status = status
+            await self.db.commit()
+        return problem
+
+    async def delete(self, problem_id: int) -> bool:
+        problem = await self.get_by_id(problem_id)
+        if not problem:
+            return False
+
+        images = (await self.db.scalars(
+            select(ProblemImage).where(ProblemImage.problem_id == problem_id)
+        )).all()
+        image_repo = AsyncImageRepository(self.db)
+        for img in images: # boto3 блокирующий, выполняем в потоке
+            if await image_repo.release_file(img):
+                await asyncio.to_thread(minio_client.delete_image_files, img.file_key)
+
+        # DELETE без загрузки связей через ORM, записи фото удалит ON DELETE CASCADE
+        await self.db.execute(delete(Problem).where(Problem.id == problem_id))
+        await self.db.commit()
+        return True
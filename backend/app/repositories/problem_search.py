@@ -0,0 +1,77 @@
+from sqlalchemy import Integer, or_, func, text
+from sqlalchemy.engine import Engine
+from ..models.models import Problem
+
+SEARCH_CONFIG = "russian" # конфигурация стемминга PostgreSQL
+
+# Объекты БД для поиска. Всё идемпотентно: выполняется на каждом старте,
+# подхватывает и новые, и уже существующие базы (миграций в проекте нет).
+SEARCH_DDL = [
+    "ALTER TABLE problems ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    f"""
+    CREATE OR REPLACE FUNCTION problems_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.address, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS problems_search_vector_trigger ON problems",
+    """
+    CREATE TRIGGER problems_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF address, description ON problems
+    FOR EACH ROW EXECUTE FUNCTION problems_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_problems_search_vector ON problems USING GIN (search_vector)",
+    # заполняем вектор для строк, созданных до появления триггера
+    "UPDATE problems SET address = address WHERE search_vector IS NULL",
+]
+
+# pg_trgm: ILIKE '%q%' по адресу/описанию обслуживается индексом, а не seq scan
+TRIGRAM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_problems_address_trgm ON problems USING GIN (address gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_problems_description_trgm ON problems USING GIN (description gin_trgm_ops)",
+]
+
+def ensure_search_schema(engine: Engine):
+    """Создаёт tsvector-колонку, триггер и индексы поиска (только PostgreSQL)"""
+    if engine.dialect.name != "postgresql":
+        return
+    for statements in (SEARCH_DDL, TRIGRAM_DDL):
+        try:
+            with engine.begin() as conn:
+                for statement in statements:
+                    conn.execute(text(statement))
+        except Exception as e:
+            print(f"Ошибка настройки поиска: {e}")
+
+class ProblemSearch:
+    """Поиск проблем по адресу и описанию.
+
+    PostgreSQL: полнотекстовый поиск по search_vector (GIN) плюс подстрока через
+    ILIKE, которую ускоряют триграммные индексы; ранжирование через ts_rank.
+    Другие БД (SQLite в тестах): только ILIKE, ранг - совпадение в адресе.
+    """
+    def __init__(self, dialect_name: str):
+        self.is_postgres = dialect_name == "postgresql"
+
+    def _tsquery(self, query: str):
+        return func.websearch_to_tsquery(SEARCH_CONFIG, query)
+
+    def filter(self, query: str):
+        search_pattern = f"%{query}%"
+        substring = or_(
+            Problem.address.ilike(search_pattern),
+            Problem.description.ilike(search_pattern)
+        )
+        if not self.is_postgres:
+            return substring
+        return or_(Problem.search_vector.op("@@")(self._tsquery(query)), substring)
+
+    def rank(self, query: str):
+        if not self.is_postgres:
+            return Problem.address.ilike(f"%{query}%").cast(Integer)
+        return func.ts_rank(Problem.search_vector, self._tsquery(query))
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+from ..models.models import Detection, ProblemImage, ReanalysisJob, ReanalysisRun
+from .detection_repo import detection_rows
+
+JOB_STATUSES = ("pending", "running", "done", "failed")
+
+class ReanalysisRepository:
+    """Очередь повторного анализа в таблице reanalysis_jobs"""
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_run(self, model_version: str, created_by: Optional[int] = None) -> ReanalysisRun:
+        """Запуск и задачи на все фото - одним INSERT ... SELECT"""
+        run = ReanalysisRun(model_version=model_version, created_by=created_by)
+        self.db.add(run)
+        self.db.flush()
+        self.db.execute(
+            insert(ReanalysisJob).from_select(
+                ["run_id", "image_id", "status", "attempts"],
+                select(literal(run.id), ProblemImage.id, literal("pending"), literal(0)).order_by(ProblemImage.id)
+            )
+        )
+        self.db.commit()
+        self.db.refresh(run)
+        return run
+
+    def get_run(self, run_id: int) -> Optional[ReanalysisRun]:
+        return self.db.get(ReanalysisRun, run_id)
+
+    def get_runs(self, limit: int = 20) -> List[ReanalysisRun]:
+        return self.db.query(ReanalysisRun).order_by(ReanalysisRun.id.desc()).limit(limit).all()
+
+    def get_progress(self, run_id: int) -> Dict[str, int]:
+        rows = (
+            self.db.query(ReanalysisJob.status, func.count(ReanalysisJob.id))
+            .filter(ReanalysisJob.run_id == run_id)
+            .group_by(ReanalysisJob.status)
+            .all()
+        )
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def claim(self, worker_id: str, model_version: str, limit: int, lease_seconds: int,
+              max_attempts: int) -> List[ReanalysisJob]:
+        """Забирает до limit задач. SKIP LOCKED: параллельные воркеры не ждут друг
+        друга и не получают одни и те же строки. Задачи с истёкшей арендой
+        (воркер упал) забираются повторно, пока не исчерпаны попытки, - после
+        этого помечаются failed (фото, на котором воркер падает, не крутится вечно)"""
+        now = datetime.now(timezone.utc)
+        expired = (ReanalysisJob.status == "running") & (ReanalysisJob.locked_at < now - timedelta(seconds=lease_seconds))
+        runs = select(ReanalysisRun.id).where(ReanalysisRun.model_version == model_version)
+        self.db.execute(
+            update(ReanalysisJob)
+            .where(ReanalysisJob.run_id.in_(runs.scalar_subquery()), expired, ReanalysisJob.attempts >= max_attempts)
+            .values(status="failed", locked_by=None, locked_at=None, error="Аренда истекла, попытки исчерпаны")
+        )
+        candidates = (
+            select(ReanalysisJob.id)
+            .join(ReanalysisRun, ReanalysisRun.id == ReanalysisJob.run_id)
+            .where(
+                ReanalysisRun.model_version == model_version,
+                or_(
+                    (ReanalysisJob.status == "pending") & (or_(ReanalysisJob.retry_at.is_(None), ReanalysisJob.retry_at <= now)),
+                    expired & (ReanalysisJob.attempts < max_attempts)
+                )
+            )
+            .order_by(ReanalysisJob.id)
+            .limit(limit)
+            .with_for_update(of=ReanalysisJob, skip_locked=True)
+        )
+        job_ids = self.db.execute(
+            update(ReanalysisJob)
+            .where(ReanalysisJob.id.in_(candidates.scalar_subquery()))
+            .values(status="running", locked_by=worker_id, locked_at=now, attempts=ReanalysisJob.attempts + 1)
+            .returning(ReanalysisJob.id)
+        ).scalars().all()
+        self.db.commit()
+        if not job_ids:
+            return []
+        return self.db.query(ReanalysisJob).filter(ReanalysisJob.id.in_(job_ids)).order_by(ReanalysisJob.id).all()
+
+    def get_images(self, image_ids: List[int]) -> Dict[int, ProblemImage]:
+        images = self.db.query(ProblemImage).filter(ProblemImage.id.in_(image_ids)).all()
+        return {image.id: image for image in images}
+
+    def complete(self, worker_id: str, results: Dict[int, tuple], model_version: str) -> int:
+        """results: {job_id: (image, analysis)}. Старые детекции фото заменяются новыми
+        в одной транзакции с отметкой done - повтор задачи не создаёт дублей.
+        Задачи, которые уже забрал другой воркер (истекла аренда), не трогаем"""
+        job_ids = self.db.execute(
+            select(ReanalysisJob.id).where(
+                ReanalysisJob.id.in_(list(results)),
+                ReanalysisJob.status == "running",
+                ReanalysisJob.locked_by == worker_id
+            )
+        ).scalars().all()
+        if not job_ids:
+            return 0
+        images = [results[job_id][0] for job_id in job_ids]
+        self.db.execute(delete(Detection).where(Detection.image_id.in_([image.id for image in images])))
+        rows = []
+        for job_id in job_ids:
+            image, analysis = results[job_id]
+            rows.extend(detection_rows(image.id, image.problem_id, analysis["defects"], model_version))
+        if rows:
+            self.db.execute(insert(Detection).values(rows))
+        self.db.execute(
+            update(ReanalysisJob)
+            .where(ReanalysisJob.id.in_(job_ids))
+            .values(status="done", locked_by=None, locked_at=None, error=None)
+        )
+        self.db.commit()
+        return len(job_ids)
+
+    def fail(self, job: ReanalysisJob, error: str, max_attempts: int, retry_delay: int = 0):
+        """Ошибка: задача вернётся в очередь через retry_delay сек., пока не исчерпаны попытки"""
+        self.db.execute(
+            update(ReanalysisJob)
+            .where(ReanalysisJob.id == job.id, ReanalysisJob.locked_by == job.locked_by)
+            .values(
+                status="failed" if job.attempts >= max_attempts else "pending",
+                locked_by=None, locked_at=None, error=error[:1000],
+                retry_at=datetime.now(timezone.utc) + timedelta(seconds=retry_delay)
+            )
+        )
+        self.db.commit()
+
+    def retry_failed(self, run_id: int) -> int:
+        result = self.db.execute(
+            update(ReanalysisJob)
+            .where(ReanalysisJob.run_id == run_id, ReanalysisJob.status == "failed")
+            .values(status="pending", attempts=0, error=None, retry_at=None)
+        )
+        self.db.commit()
+        return result.rowcount
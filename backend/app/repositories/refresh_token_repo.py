@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from ..models import models
@@ -36,4 +38,39 @@ class TokenRepository:
             db_token.is_revoked = True
             self.db.commit()
         return db_token
-    
+
+class AsyncTokenRepository:
+    """Работа с refresh токенами в БД (AsyncSession)"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_for_user(self, user_id: int, token: str):
+        expires_at = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+        db_token = models.RefreshToken(
+            user_id=user_id,
+            token=token,
+            expires_at=expires_at
+        )
+
+        self.db.add(db_token)
+        await self.db.commit()
+        return db_token
+
+    async def verify(self, token: str): # проверка валидности
+        result = await self.db.execute(select(models.RefreshToken).where(
+            models.RefreshToken.token == token,
+            models.RefreshToken.is_revoked == False,
+            models.RefreshToken.expires_at > datetime.now(timezone.utc)
+        ))
+        db_token = result.scalars().first()
+        return db_token.user_id if db_token else None
+
+    async def revoke(self, token: str): # отозвать
+        result = await self.db.execute(select(models.RefreshToken).where(
+            models.RefreshToken.token == token
+        ))
+        db_token = result.scalars().first()
+        if db_token:
+            db_token.is_revoked = True
+            await self.db.commit()
+        return db_token
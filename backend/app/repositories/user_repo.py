@@ -1,3 +1,5 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models.models import User
 from ..schemas.schemas import UserCreate
@@ -36,4 +38,40 @@ class UserRepository:
             self.db.commit()
             self.db.refresh(user)
         return user
-        
\ No newline at end of file
+
+class AsyncUserRepository:
+    """Работа с пользователями в БД (AsyncSession)"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_by_email(self, email: str):
+        result = await self.db.execute(select(User).where(User.email == email))
+        return result.scalars().first()
+
+    async def get_by_id(self, user_id: int):
+        return await self.db.get(User, user_id)
+
+    async def get_all(self):
+        result = await self.db.execute(select(User))
+        return result.scalars().all()
+
+    async def create(self, user_data: UserCreate, hashed_password: str):
+        db_user = User(
+            email=user_data.email,
+            name=user_data.name,
+            hashed_password=hashed_password,
+            role=user_data.role,
+            organization=user_data.organization
+        )
+        self.db.add(db_user)
+        await self.db.commit()
+        await self.db.refresh(db_user)
+        return db_user
+
+    async def update_role(self, user_id: int, new_role):
+        user = await self.get_by_id(user_id)
+        if user:
+            user.role = new_role
+            await self.db.commit()
+            await self.db.refresh(user)
+        return user
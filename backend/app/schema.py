@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from .repositories.problem_search import ensure_search_schema
+
+# create_all создаёт только отсутствующие таблицы. Колонки и индексы, добавленные
+# в модели позже, докатываем на существующие базы здесь (идемпотентно, PostgreSQL).
+SCHEMA_UPGRADES = [
+    "CREATE INDEX IF NOT EXISTS ix_problem_images_problem_id ON problem_images (problem_id)",
+    "ALTER TABLE problems ADD COLUMN IF NOT EXISTS lat DOUBLE PRECISION",
+    "ALTER TABLE problems ADD COLUMN IF NOT EXISTS lon DOUBLE PRECISION",
+    "ALTER TABLE problems ADD COLUMN IF NOT EXISTS geohash VARCHAR(12)",
+    "CREATE INDEX IF NOT EXISTS ix_problems_geohash ON problems (geohash)",
+    "ALTER TABLE problem_images ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_problem_images_content_hash ON problem_images (content_hash)",
+    # file_key больше не уникален (дедупликация по содержимому): уникальный индекс
+    # пересоздаём обычным один раз, на следующих стартах условие уже не выполняется
+    """
+    DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'ix_problem_images_file_key'
+                   AND indexdef LIKE 'CREATE UNIQUE%') THEN
+            DROP INDEX ix_problem_images_file_key;
+            CREATE INDEX ix_problem_images_file_key ON problem_images (file_key);
+        END IF;
+    END $$
+    """,
+    "ALTER TABLE problem_image_variants DROP CONSTRAINT IF EXISTS problem_image_variants_file_key_key",
+    "CREATE INDEX IF NOT EXISTS ix_detections_type_confidence ON detections (type, confidence)",
+    "CREATE INDEX IF NOT EXISTS ix_detections_created_at ON detections (created_at)",
+    "ALTER TABLE reanalysis_jobs ADD COLUMN IF NOT EXISTS retry_at TIMESTAMP WITH TIME ZONE",
+]
+
+def upgrade_schema(engine: Engine):
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for statement in SCHEMA_UPGRADES:
+                conn.execute(text(statement))
+    ensure_search_schema(engine)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, validator, field_validator
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field, validator, field_validator, model_validator
+from typing import Dict, Optional, List
 from datetime import datetime
 from ..models.models import ProblemStatus, ProblemType, UserRole
 
@@ -7,12 +7,20 @@ class ProblemCreate(BaseModel):
     address: str
     description: Optional[str] = None
     type: ProblemType = ProblemType.POTHOLE
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
     
     @field_validator('address')
     def address_not_empty(cls, v):
         if not v or not v.strip():
             raise ValueError('Адрес не может быть пустым')
         return v.strip()
+
+    @model_validator(mode='after')
+    def coordinates_together(self):
+        if (self.lat is None) != (self.lon is None):
+            raise ValueError('Координаты lat и lon задаются вместе')
+        return self
     
 class ProblemResponse(BaseModel):
     id: int
@@ -24,10 +32,30 @@ class ProblemResponse(BaseModel):
     reporter_id: int
     is_from_inspector: bool
     images_count: int = 0
+    lat: Optional[float] = None
+    lon: Optional[float] = None
 
     class Config:
         from_attributes = True
 
+class NearbyProblemResponse(ProblemResponse):
+    distance_km: float
+
+class ProblemClusterResponse(BaseModel):
+    geohash: str
+    lat: float # центр масс точек кластера
+    lon: float
+    count: int
+    by_type: Dict[str, int]
+    by_status: Dict[str, int]
+
+class ClusterTileResponse(BaseModel):
+    z: int
+    x: int
+    y: int
+    precision: int
+    clusters: List[ProblemClusterResponse]
+
 class ProblemFilterParams(BaseModel):
     status: Optional[ProblemStatus] = None
     type: Optional[ProblemType] = None
@@ -40,7 +68,7 @@ class ProblemFilterParams(BaseModel):
     
     @validator('sort_by')
     def validate_sort_by(cls, v):
-        allowed = ['created_at', 'type', 'status', 'address']
+        allowed = ['created_at', 'type', 'status', 'address', 'relevance']
         if v not in allowed:
             raise ValueError(f'sort_by must be one of {allowed}')
         return v
@@ -67,10 +95,11 @@ class ProblemFilterParams(BaseModel):
 
 class PaginatedProblemResponse(BaseModel):
     items: List[ProblemResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # None при total_mode=none
+    page: Optional[int] = None  # None в режиме курсора
     limit: int
-    total_pages: int
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # курсор следующей страницы (режим курсора)
     
     class Config:
         from_attributes = True
@@ -121,6 +150,105 @@ class ImageAnalysisResponse(BaseModel):
     dominant_type: Optional[str] = None
     confidence: Optional[float] = None
 
+class ProblemFromPhotoResponse(BaseModel):
+    problem: ProblemResponse
+    image_id: int
+    analysis: Optional[ImageAnalysisResponse] = None # None - модель недоступна
+
+class StatusChange(BaseModel):
+    id: int
+    status: ProblemStatus
+
+class BulkStatusUpdateRequest(BaseModel):
+    items: List[StatusChange] = Field(min_length=1, max_length=1000)
+
+class StatusChangeResult(BaseModel):
+    id: int
+    result: str # updated, unchanged, not_found, invalid_transition, duplicate
+    previous_status: Optional[ProblemStatus] = None
+    status: Optional[ProblemStatus] = None # статус после запроса
+
+class BulkStatusUpdateResponse(BaseModel):
+    updated: int
+    failed: int
+    results: List[StatusChangeResult] # в порядке запроса
+
+class ProblemImportRow(ProblemCreate):
+    """Строка массового импорта (NDJSON/CSV)"""
+    status: ProblemStatus = ProblemStatus.NEW
+
+class ImportRowError(BaseModel):
+    row: int # номер строки файла (в CSV с заголовком данные начинаются со 2-й)
+    error: str
+
+class ProblemImportResponse(BaseModel):
+    imported: int
+    ids: List[int]
+    failed: int
+    errors: List[ImportRowError] # не больше IMPORT_MAX_ERRORS
+
+class TrackPoint(BaseModel):
+    """Точка GPS-трека видео: секунда от начала записи и координаты"""
+    t: float = Field(ge=0)
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+
+class DetectionResponse(BaseModel):
+    id: int
+    image_id: int
+    problem_id: int
+    type: str
+    class_name: str
+    confidence: float
+    bbox: List[int] # [x1, y1, x2, y2]
+    model_version: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class DetectionStatsResponse(BaseModel):
+    type: str
+    count: int
+    avg_confidence: float
+    problems: int # сколько разных проблем
+
+class ReanalysisRunCreate(BaseModel):
+    model_version: Optional[str] = None # по умолчанию - версия загруженной модели
+
+class ReanalysisRunResponse(BaseModel):
+    id: int
+    model_version: str
+    created_at: datetime
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+    progress: float # доля обработанных (done + failed)
+    finished: bool
+
+class InferenceMetricsResponse(BaseModel):
+    available: bool
+    status: str # not_loaded, loading, ready, unavailable
+    executor: str
+    workers: int
+    queue_depth: int
+    in_flight: int
+    batches_total: int
+    images_total: int
+    avg_batch_size: float
+    last_batch_size: int
+    max_batch_size_seen: int
+    max_batch_size: int
+    max_wait_ms: float
+    errors_total: int
+    rejected_total: int
+    model_version: str
+    cache_size: int
+    cache_hits: int
+    cache_misses: int
+
 class UpdateUserRoleRequest(BaseModel):
     user_id: int
     new_role: UserRole
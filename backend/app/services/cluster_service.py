@@ -0,0 +1,173 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..core.config import CLUSTER_CACHE_SIZE, CLUSTER_CACHE_TTL
+from ..core.geo import tile_bounds, tile_for_point, cluster_precision
+from ..models.models import Problem
+from ..repositories.problem_repo import bbox_filter
+
+class ProblemPoint(NamedTuple):
+    """То, что влияет на кластеры: положение, тип и статус проблемы"""
+    lat: float
+    lon: float
+    geohash: str
+    type: str
+    status: str
+
+def problem_point(problem: Optional[Problem]) -> Optional[ProblemPoint]:
+    if problem is None or problem.lat is None or problem.lon is None or not problem.geohash:
+        return None
+    return ProblemPoint(
+        problem.lat, problem.lon, problem.geohash,
+        getattr(problem.type, "value", problem.type),
+        getattr(problem.status, "value", problem.status)
+    )
+
+class ClusterTile:
+    """Агрегаты одного тайла: кластер = ячейка geohash с точностью для зума"""
+    def __init__(self, z: int, x: int, y: int):
+        self.z, self.x, self.y = z, x, y
+        self.precision = cluster_precision(z)
+        self.cells: Dict[str, dict] = {}
+        self.expires_at = 0.0 # выставляет ClusterCache.put
+        self._payload: Optional[Tuple[str, bytes]] = None
+
+    def add(self, cell: str, type: str, status: str, count: int, sum_lat: float, sum_lon: float):
+        data = self.cells.setdefault(cell, {"count": 0, "sum_lat": 0.0, "sum_lon": 0.0, "by_type": {}, "by_status": {}})
+        data["count"] += count
+        data["sum_lat"] += sum_lat
+        data["sum_lon"] += sum_lon
+        data["by_type"][type] = data["by_type"].get(type, 0) + count
+        data["by_status"][status] = data["by_status"].get(status, 0) + count
+        for key in ("by_type", "by_status"): # нулевые счётчики после вычитания не показываем
+            data[key] = {k: v for k, v in data[key].items() if v}
+        if data["count"] <= 0:
+            del self.cells[cell]
+        self._payload = None
+
+    def apply(self, point: ProblemPoint, delta: int):
+        self.add(point.geohash[:self.precision], point.type, point.status,
+                 delta, point.lat * delta, point.lon * delta)
+
+    def render(self) -> Tuple[str, bytes]:
+        """(ETag, JSON) - ETag зависит только от содержимого, поэтому переживает рестарт"""
+        if self._payload is None:
+            clusters = [
+                {
+                    "geohash": cell,
+                    "lat": round(data["sum_lat"] / data["count"], 6),
+                    "lon": round(data["sum_lon"] / data["count"], 6),
+                    "count": data["count"],
+                    "by_type": dict(sorted(data["by_type"].items())),
+                    "by_status": dict(sorted(data["by_status"].items()))
+                }
+                for cell, data in sorted(self.cells.items())
+            ]
+            body = json.dumps(
+                {"z": self.z, "x": self.x, "y": self.y, "precision": self.precision, "clusters": clusters},
+                ensure_ascii=False, separators=(",", ":")
+            ).encode()
+            self._payload = (f'"{hashlib.md5(body).hexdigest()}"', body)
+        return self._payload
+
+class ClusterCache:
+    """LRU-кэш посчитанных тайлов. Изменения проблем применяются к закэшированным
+    тайлам инкрементально (+1/-1 в нужной ячейке), без пересчёта в SQL.
+    Кэш свой в каждом процессе uvicorn: изменения из других процессов сюда не
+    приходят, поэтому тайл живёт не дольше ttl сек. Каждое изменение увеличивает
+    generation: тайл, который считался, пока менялись проблемы, в кэш не кладётся"""
+    def __init__(self, max_tiles: int, ttl: float):
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self.generation = 0
+        self._tiles: "OrderedDict[Tuple[int, int, int], ClusterTile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return bool(self._tiles)
+
+    def get(self, key: Tuple[int, int, int]) -> Optional[ClusterTile]:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None and tile.expires_at <= time.monotonic():
+                del self._tiles[key]
+                return None
+            if tile is not None:
+                self._tiles.move_to_end(key)
+            return tile
+
+    def put(self, tile: ClusterTile, generation: Optional[int] = None):
+        """generation - значение self.generation до начала расчёта тайла"""
+        if self.max_tiles <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return # за время расчёта были изменения, тайл мог их не увидеть
+            tile.expires_at = time.monotonic() + self.ttl
+            self._tiles[(tile.z, tile.x, tile.y)] = tile
+            self._tiles.move_to_end((tile.z, tile.x, tile.y))
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def record_change(self, before: Optional[ProblemPoint], after: Optional[ProblemPoint]):
+        """Создание (None -> точка), удаление (точка -> None) или изменение проблемы"""
+        if before == after:
+            return
+        with self._lock:
+            self.generation += 1 # и при пустом кэше: тайл может считаться прямо сейчас
+            zooms = {z for z, _, _ in self._tiles}
+            for point, delta in ((before, -1), (after, 1)):
+                if point is None:
+                    continue
+                for z in zooms:
+                    tile = self._tiles.get((z, *tile_for_point(point.lat, point.lon, z)))
+                    if tile is not None:
+                        tile.apply(point, delta)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._tiles.clear()
+
+cluster_cache = ClusterCache(CLUSTER_CACHE_SIZE, CLUSTER_CACHE_TTL) # глобальный экземпляр
+
+class ClusterService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_tile(self, z: int, x: int, y: int) -> ClusterTile:
+        tile = cluster_cache.get((z, x, y))
+        if tile is None:
+            generation = cluster_cache.generation
+            tile = self._build_tile(z, x, y)
+            cluster_cache.put(tile, generation)
+        return tile
+
+    def _build_tile(self, z: int, x: int, y: int) -> ClusterTile:
+        """Агрегация в SQL: GROUP BY (префикс geohash, тип, статус) по индексу geohash"""
+        tile = ClusterTile(z, x, y)
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y)
+        cell = func.substr(Problem.geohash, 1, tile.precision)
+        rows = (
+            self.db.query(
+                cell, Problem.type, Problem.status,
+                func.count(Problem.id), func.sum(Problem.lat), func.sum(Problem.lon)
+            )
+            # верхняя граница тайла исключается, чтобы точка попадала ровно в один тайл
+            .filter(
+                bbox_filter(min_lat, min_lon, max_lat, max_lon),
+                Problem.lat > min_lat, Problem.lon < max_lon
+            )
+            .group_by(cell, Problem.type, Problem.status)
+            .all()
+        )
+        for cell_value, type, status, count, sum_lat, sum_lon in rows:
+            tile.add(cell_value, getattr(type, "value", type), getattr(status, "value", status),
+                     count, sum_lat, sum_lon)
+        return tile
@@ -0,0 +1,76 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+from ..core.cache import TTLCache, create_cache_store
+from ..core.config import DETECTION_CACHE_SIZE, DETECTION_CACHE_TTL, DETECTION_CACHE_URL
+
+class DetectionCache:
+    """Кэш результатов детекции по содержимому изображения.
+
+    Ключ - SHA-256 байтов + версия модели + порог уверенности, поэтому смена весов
+    или порога не отдаёт старые результаты. Первый уровень - LRU в памяти,
+    второй (необязательный) - SQLite/Redis, переживает рестарт. Одновременные
+    запросы с одинаковым ключом ждут один инференс.
+    """
+    def __init__(self, max_size: int, store=None, ttl: float = DETECTION_CACHE_TTL):
+        self.memory = TTLCache(max_size, float("inf")) # вытесняется только по LRU
+        self.store = store
+        self.ttl = ttl
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def make_key(content_hash: str, model_version: str, confidence: float) -> str:
+        return f"{content_hash}:{model_version}:{confidence:g}"
+
+    async def get(self, key: str) -> Optional[dict]:
+        result = self.memory.get(key)
+        if result is None:
+            result = await self._get_stored(key)
+        return result
+
+    async def _get_stored(self, key: str) -> Optional[dict]:
+        if self.store is None:
+            return None
+        try:
+            result = await self.store.get(key)
+        except Exception as e:
+            print(f"Ошибка чтения кэша детекций: {e}")
+            return None
+        if result is not None:
+            self.memory.set(key, result)
+        return result
+
+    async def set(self, key: str, result: dict):
+        self.memory.set(key, result)
+        if self.store is not None:
+            try:
+                await self.store.set(key, result, self.ttl)
+            except Exception as e:
+                print(f"Ошибка записи кэша детекций: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        result = self.memory.get(key) # быстрый путь без создания задач
+        if result is not None:
+            return result
+
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, compute))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, key: str, compute: Callable[[], Awaitable[dict]]) -> dict:
+        result = await self._get_stored(key)
+        if result is None:
+            result = await compute()
+            await self.set(key, result)
+        return result
+
+    def get_metrics(self) -> dict:
+        return {
+            "cache_size": len(self.memory),
+            "cache_hits": self.memory.hits,
+            "cache_misses": self.memory.misses,
+        }
+
+detection_cache = DetectionCache(DETECTION_CACHE_SIZE, create_cache_store(DETECTION_CACHE_URL, "detections")) # глобальный экземпляр
@@ -0,0 +1,34 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from ..models.models import ProblemType
+from ..repositories.detection_repo import DetectionRepository
+
+class DetectionService:
+    """Аналитика по сохранённым детекциям - без повторного инференса"""
+    def __init__(self, db: Session):
+        self.detection_repo = DetectionRepository(db)
+
+    @staticmethod
+    def _check_period(since: Optional[datetime], until: Optional[datetime]):
+        if since and until and since >= until:
+            raise HTTPException(status_code=400, detail="since должен быть раньше until")
+
+    def get_detections(self, type: Optional[ProblemType], min_confidence: Optional[float],
+                       since: Optional[datetime], until: Optional[datetime],
+                       problem_id: Optional[int], limit: int, offset: int):
+        self._check_period(since, until)
+        return self.detection_repo.get_filtered(
+            type=type.value if type else None,
+            min_confidence=min_confidence,
+            since=since,
+            until=until,
+            problem_id=problem_id,
+            limit=limit,
+            offset=offset
+        )
+
+    def get_stats(self, min_confidence: Optional[float], since: Optional[datetime], until: Optional[datetime]):
+        self._check_period(since, until)
+        return self.detection_repo.get_stats(min_confidence=min_confidence, since=since, until=until)
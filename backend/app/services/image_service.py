@@ -1,45 +1,105 @@
+import asyncio
+import hashlib
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from typing import BinaryIO, Optional, Tuple
 from fastapi import UploadFile, HTTPException
 from ..core.minio_client import minio_client
-from ..repositories.image_repo import ImageRepository
-from ..repositories.problem_repo import ProblemRepository
+from ..models.models import ProblemImage
+from ..repositories.image_repo import ImageRepository, AsyncImageRepository
+from ..repositories.problem_repo import ProblemRepository, AsyncProblemRepository
+from .image_variants import image_variant_pool, pick_variant
 import magic
 
 ALLOWED_TYPES = ['image/jpeg', 'image/png', 'image/jpg', 'image/webp'] # Константы для валидации
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+SNIFF_SIZE = 2048 # байт для определения реального типа через magic
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"Файл слишком большой. Максимум {MAX_FILE_SIZE // 1024 // 1024}MB"
+    )
+
+def check_signature(head: bytes):
+    """Проверка реального типа файла через magic по первым байтам"""
+    try:
+        mime = magic.from_buffer(head, mime=True)
+    except Exception as e:
+        print(f"Ошибка определения MIME: {e}")
+        return # Если magic не сработал, доверяем content_type
+    if mime not in ALLOWED_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Файл повреждён или имеет неверный формат"
+        )
+
+def file_size(file: BinaryIO) -> Optional[int]:
+    """Размер без чтения содержимого (UploadFile лежит во временном файле); None - поток"""
+    try:
+        position = file.tell()
+        size = file.seek(0, 2)
+        file.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+class UploadStream:
+    """Файлоподобная обёртка для загрузки в хранилище: отдаёт содержимое частями,
+    проверяет сигнатуру по первым байтам и обрывает загрузку при превышении
+    MAX_FILE_SIZE. Целиком файл в памяти не держит."""
+    def __init__(self, raw: BinaryIO, max_size: int = MAX_FILE_SIZE):
+        self.raw = raw
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._head = b""
+        self._checked = False
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.max_size - self.size + 1 # больше лимита читать незачем
+        data = self.raw.read(size)
+        self.size += len(data)
+        self.sha256.update(data)
+        if self.size > self.max_size:
+            raise file_too_large()
+        if not self._checked:
+            self._head += data[:SNIFF_SIZE - len(self._head)]
+            if len(self._head) >= SNIFF_SIZE or not data:
+                check_signature(self._head)
+                self._checked = True
+        return data
+
+def hash_file(file: BinaryIO) -> Tuple[str, int]:
+    """Первый проход по временному файлу загрузки: проверки UploadStream и SHA-256.
+    Файл читается частями, после прохода указатель возвращается в начало"""
+    stream = UploadStream(file)
+    while stream.read(HASH_CHUNK_SIZE):
+        pass
+    file.seek(0)
+    return stream.sha256.hexdigest(), stream.size
 
 class ImageService:
     def __init__(self, db: Session):
+        self.db = db
         self.image_repo = ImageRepository(db)
         self.problem_repo = ProblemRepository(db)
     
-    def validate_file(self, file: UploadFile): # Проверяет файл на соответствие огран-ям
+    def validate_file(self, file: UploadFile) -> Optional[int]: # Проверяет файл на соответствие огран-ям
+        """Тип и размер до загрузки; возвращает размер, если его можно узнать без чтения.
+        Сигнатура проверяется по первым байтам уже при загрузке (UploadStream)"""
         if file.content_type not in ALLOWED_TYPES:
             raise HTTPException(
                 status_code=400,
                 detail=f"Неподдерживаемый тип файла. Разрешены: {', '.join(ALLOWED_TYPES)}"
             )
         
-        content = file.file.read(1024) # Проверка размера (читаем часть)
-        file.file.seek(0)  # возвр указатель в начало
-        
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Файл слишком большой. Максимум {MAX_FILE_SIZE // 1024 // 1024}MB"
-            )
-        
-        # Проверка реального типа файла через magic
-        try:
-            mime = magic.from_buffer(content, mime=True)
-            if mime not in ALLOWED_TYPES:
-                raise HTTPException(
-                    status_code=400,
-                    detail="Файл повреждён или имеет неверный формат"
-                )
-        except Exception as e:
-            print(f"Ошибка определения MIME: {e}")
-            # Если magic не сработал, доверяем content_type
+        size = file_size(file.file)
+        if size is not None and size > MAX_FILE_SIZE:
+            raise file_too_large()
+        return size
     
     async def upload_image(
         self,
@@ -48,45 +108,79 @@ class ImageService:
         user_id: int
     ) -> dict:
         """Загружает изображение в MinIO и сохраняет запись в БД"""
-        problem = self.problem_repo.get_by_id(problem_id)
+        problem = await self._get_problem(problem_id)
         if not problem:
             raise HTTPException(status_code=404, detail="Проблема не найдена")
 
-        self.validate_file(file)
-        
-        content = await file.read() # читает весь файл
-        
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Файл слишком большой. Максимум {MAX_FILE_SIZE // 1024 // 1024}MB"
-            )
-        
-        file_key = minio_client.upload_file( # загружает в MinIO
-            file_content=content,
-            problem_id=problem_id,
-            filename=file.filename,
-            content_type=file.content_type,
-            metadata={
-                'uploaded_by': str(user_id)
-            }
-        )
+        stored = await self.store_upload(file, user_id, problem_id)
+        return await self.attach_upload(problem_id, file, user_id, stored)
+
+    async def store_upload(
+        self,
+        file: UploadFile,
+        user_id: int,
+        problem_id: Optional[int] = None,
+        hashed: Optional[Tuple[str, int]] = None
+    ) -> dict:
+        """Проверяет файл и кладёт его в MinIO (или ссылается на уже загруженный
+        объект с тем же содержимым). hashed - уже посчитанные (SHA-256, размер)"""
+        size = self.validate_file(file)
+        content_hash = file_key = None
+        if hashed:
+            content_hash, size = hashed
+        elif size is not None: # временный файл: сначала хэш, загружаем только новое содержимое
+            content_hash, size = await asyncio.to_thread(hash_file, file.file)
+        if content_hash:
+            file_key = await self._acquire_blob(content_hash)
+        is_new = file_key is None
         
-        if not file_key:
-            raise HTTPException(
-                status_code=500,
-                detail="Ошибка загрузки файла в хранилище"
+        if is_new:
+            stream = UploadStream(file.file)
+            file_key = await asyncio.to_thread( # загружает в MinIO частями, вне event loop
+                minio_client.upload_file,
+                file_content=stream,
+                problem_id=problem_id,
+                filename=file.filename,
+                content_type=file.content_type,
+                metadata={
+                    'uploaded_by': str(user_id)
+                },
+                file_key=minio_client.blob_file_key(content_hash) if content_hash else None
             )
+            
+            if not file_key:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Ошибка загрузки файла в хранилище"
+                )
+            if content_hash:
+                registered = await self._register_blob(content_hash, file_key, size, file.content_type)
+                if registered != file_key: # то же содержимое успели загрузить параллельно - наша копия лишняя
+                    await asyncio.to_thread(minio_client.delete_file, file_key)
+                    file_key, is_new = registered, False
+            else: # поток без seek: хэш посчитан по ходу загрузки, объект не общий
+                content_hash, size = stream.sha256.hexdigest(), stream.size
+
+        return {'file_key': file_key, 'content_hash': content_hash, 'size': size, 'is_new': is_new}
+
+    async def attach_upload(self, problem_id: int, file: UploadFile, user_id: int, stored: dict) -> dict:
+        """Запись фото проблемы для уже сохранённого файла (см. store_upload)"""
+        file_key, content_hash, size = stored['file_key'], stored['content_hash'], stored['size']
         
         # запись в БД
-        db_image = self.image_repo.create(
+        db_image = await self._create_image_record(
             problem_id=problem_id,
             file_key=file_key,
             original_filename=file.filename,
-            file_size=len(content),
+            file_size=size,
             content_type=file.content_type,
-            uploaded_by=user_id
+            uploaded_by=user_id,
+            content_hash=content_hash
         )
+        if stored['is_new']:
+            image_variant_pool.submit(content_hash, problem_id, file_key) # превью и WebP в фоне
+        else:
+            await self._copy_variants(content_hash, file_key, db_image.id)
         
         url = minio_client.get_presigned_url(file_key) # временная ссылка для ответа
         
@@ -94,24 +188,68 @@ class ImageService:
             'id': db_image.id,
             'url': url,
             'filename': file.filename,
-            'size': len(content)
+            'size': size
         }
+
+    async def discard_upload(self, stored: dict):
+        """Отменяет store_upload, если фото так и не привязали к проблеме:
+        иначе ссылка на объект в MinIO остаётся навсегда"""
+        if await self._release_blob(stored['content_hash'], stored['file_key']):
+            await asyncio.to_thread(minio_client.delete_image_files, stored['file_key'])
     
-    def get_images_for_problem(self, problem_id: int) -> list:
-        """Получает все изображения проблемы с временными ссылками"""
+    async def _get_problem(self, problem_id: int):
+        return self.problem_repo.get_by_id(problem_id)
+
+    async def _create_image_record(self, **fields):
+        return self.image_repo.create(**fields)
+
+    async def _acquire_blob(self, content_hash: str):
+        return self.image_repo.acquire_blob(content_hash)
+
+    async def _register_blob(self, *args):
+        return self.image_repo.register_blob(*args)
+
+    async def _release_blob(self, content_hash: str, file_key: str) -> bool:
+        return self.image_repo.release_blob(content_hash, file_key)
+
+    async def _copy_variants(self, content_hash: str, file_key: str, image_id: int):
+        self.image_repo.copy_variants(content_hash, file_key, image_id)
+
+    def get_images_for_problem(self, problem_id: int, size: Optional[int] = None) -> list:
+        """Получает все изображения проблемы с временными ссылками.
+        size - нужный размер в px: url ведёт на самый лёгкий подходящий вариант"""
         images = self.image_repo.get_by_problem(problem_id)
+        return self._image_listing(images, size)
+
+    def _image_listing(self, images: list, size: Optional[int]) -> list:
+        if not images:
+            return []
+        keys = [img.file_key for img in images] + [v.file_key for img in images for v in img.variants]
+        urls = minio_client.get_presigned_urls(keys, expires_in=3600) # одна пачка подписей на все фото
         
         result = []
         for img in images:
-            url = minio_client.get_presigned_url(img.file_key, expires_in=3600)
+            variant = pick_variant(img, size)
             result.append({
                 'id': img.id,
-                'url': url,
+                'url': urls[(variant or img).file_key],
+                'variant': variant.name if variant else 'original',
                 'original_filename': img.original_filename,
                 'file_size': img.file_size,
                 'content_type': img.content_type,
                 'uploaded_at': img.uploaded_at.isoformat() if img.uploaded_at else None,
-                'uploaded_by': img.uploaded_by
+                'uploaded_by': img.uploaded_by,
+                'variants': [
+                    {
+                        'name': v.name,
+                        'url': urls[v.file_key],
+                        'width': v.width,
+                        'height': v.height,
+                        'file_size': v.file_size,
+                        'content_type': v.content_type
+                    }
+                    for v in img.variants
+                ]
             })
         
         return result
@@ -125,22 +263,75 @@ class ImageService:
         if image.uploaded_by != user_id and not is_admin:
             raise HTTPException(status_code=403, detail="Недостаточно прав для удаления")
         
-        if not minio_client.delete_file(image.file_key):
+        # объект удаляется только вместе с последней ссылкой на это содержимое;
+        # ссылка и запись снимаются одной транзакцией и откатываются, если хранилище не ответило
+        if not self._remove_image(image):
             raise HTTPException(status_code=500, detail="Ошибка удаления файла из хранилища")
         
-        self.image_repo.delete(image_id) # удал. запись из БД
-        
         return {"message": "Файл успешно удалён"}
+
+    def _remove_image(self, image: ProblemImage) -> bool:
+        last = self.image_repo.release_file(image, commit=False)
+        self.image_repo.delete(image.id, commit=False)
+        if last and not minio_client.delete_image_files(image.file_key):
+            self.db.rollback()
+            return False
+        self.db.commit()
+        return True
     
     def delete_all_problem_images(self, problem_id: int) -> int:
         """Удаляет все изображения проблемы (без проверки прав, для каскадного удаления)"""
         images = self.image_repo.get_by_problem(problem_id)
         count = 0
         
-        for img in images:
-            if minio_client.delete_file(img.file_key):
+        for img in images: # по фото: ошибка хранилища оставляет это фото целиком, с записью и ссылкой
+            if self._remove_image(img):
                 count += 1
+            else:
+                print(f"Не удалось удалить {img.file_key} из хранилища")
         
-        self.image_repo.delete_by_problem(problem_id)
-        
-        return count
\ No newline at end of file
+        return count
+
+class AsyncImageService(ImageService):
+    """ImageService для async эндпоинтов: обращения к БД идут через AsyncSession"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.image_repo = AsyncImageRepository(db)
+        self.problem_repo = AsyncProblemRepository(db)
+
+    async def _get_problem(self, problem_id: int):
+        return await self.problem_repo.get_by_id(problem_id)
+
+    async def _create_image_record(self, **fields):
+        return await self.image_repo.create(**fields)
+
+    async def _acquire_blob(self, content_hash: str):
+        return await self.image_repo.acquire_blob(content_hash)
+
+    async def _register_blob(self, *args):
+        return await self.image_repo.register_blob(*args)
+
+    async def _release_blob(self, content_hash: str, file_key: str) -> bool:
+        return await self.image_repo.release_blob(content_hash, file_key)
+
+    async def _copy_variants(self, content_hash: str, file_key: str, image_id: int):
+        await self.image_repo.copy_variants(content_hash, file_key, image_id)
+
+    async def get_images_for_problem(self, problem_id: int, size: Optional[int] = None) -> list:
+        images = await self.image_repo.get_by_problem(problem_id)
+        return self._image_listing(images, size)
+
+    async def delete_all_problem_images(self, problem_id: int) -> int:
+        images = await self.image_repo.get_by_problem(problem_id)
+        count = 0
+        # поля - заранее: после rollback объекты сессии истекают, а ленивой загрузки в async нет
+        for image_id, content_hash, file_key in [(img.id, img.content_hash, img.file_key) for img in images]:
+            last = not content_hash or await self.image_repo.release_blob(content_hash, file_key, commit=False)
+            await self.image_repo.delete(image_id, commit=False)
+            if last and not await asyncio.to_thread(minio_client.delete_image_files, file_key):
+                await self.db.rollback()
+                print(f"Не удалось удалить {file_key} из хранилища")
+                continue
+            await self.db.commit()
+            count += 1
+        return count
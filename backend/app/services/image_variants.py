@@ -0,0 +1,109 @@
+import io
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageOps
+from ..core.config import IMAGE_VARIANTS_ENABLED, IMAGE_VARIANT_WORKERS
+from ..core.minio_client import minio_client
+from ..database import SessionLocal
+from ..models.models import ProblemImage, ProblemImageVariant
+from ..repositories.image_repo import ImageRepository
+
+class VariantSpec(NamedTuple):
+    name: str
+    max_side: int # px по большей стороне, меньшие фото не увеличиваются
+    format: str # формат Pillow
+    content_type: str
+    ext: str
+
+VARIANT_SPECS = [
+    VariantSpec("thumb", 320, "JPEG", "image/jpeg", "jpg"),
+    VariantSpec("thumb_webp", 320, "WEBP", "image/webp", "webp"),
+    VariantSpec("medium", 1280, "JPEG", "image/jpeg", "jpg"),
+    VariantSpec("medium_webp", 1280, "WEBP", "image/webp", "webp"),
+]
+QUALITY = 82
+
+def render_variants(data: bytes) -> List[Tuple[VariantSpec, bytes, int, int]]:
+    """Все варианты фото: [(spec, содержимое, ширина, высота)]"""
+    largest = max(spec.max_side for spec in VARIANT_SPECS)
+    with Image.open(io.BytesIO(data)) as original:
+        original.draft("RGB", (largest, largest)) # JPEG декодируется сразу в уменьшенном масштабе
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    results = []
+    # от большего размера к меньшему: каждое следующее уменьшение - из предыдущего
+    for max_side in sorted({spec.max_side for spec in VARIANT_SPECS}, reverse=True):
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        for spec in VARIANT_SPECS:
+            if spec.max_side != max_side:
+                continue
+            buffer = io.BytesIO()
+            image.save(buffer, spec.format, quality=QUALITY)
+            results.append((spec, buffer.getvalue(), image.width, image.height))
+    return results
+
+def generate_variants(content_hash: str, problem_id: int, file_key: str, session_factory=SessionLocal) -> int:
+    """Задача фонового пула: скачивает оригинал, сохраняет варианты рядом
+    с ним (.../derived/<имя оригинала>/...) и записывает их в problem_image_variants
+    всем фото, ссылающимся на этот объект"""
+    data = minio_client.download_file(file_key)
+    if data is None:
+        print(f"Оригинал {file_key} не найден, производные не созданы")
+        return 0
+
+    records = []
+    for spec, content, width, height in render_variants(data):
+        variant_key = minio_client.upload_file(
+            file_content=content,
+            problem_id=problem_id,
+            filename=f"{spec.name}.{spec.ext}",
+            content_type=spec.content_type,
+            file_key=minio_client.derived_file_key(file_key, spec.name, spec.ext)
+        )
+        if variant_key:
+            records.append({
+                "name": spec.name, "file_key": variant_key, "width": width, "height": height,
+                "file_size": len(content), "content_type": spec.content_type
+            })
+
+    db = session_factory()
+    try:
+        ImageRepository(db).attach_variants(content_hash, file_key, records)
+    finally:
+        db.close()
+    return len(records)
+
+def pick_variant(image: ProblemImage, size: Optional[int]) -> Optional[ProblemImageVariant]:
+    """Самый лёгкий вариант, у которого большая сторона не меньше size; None - оригинал"""
+    if not size:
+        return None
+    fitting = [v for v in image.variants if max(v.width, v.height) >= size]
+    return min(fitting, key=lambda v: v.file_size, default=None)
+
+class ImageVariantPool:
+    """Фоновый пул генерации вариантов: загрузка фото не ждёт ресайза"""
+    def __init__(self, workers: int, enabled: bool = True):
+        self.workers = workers
+        self.enabled = enabled
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, content_hash: str, problem_id: int, file_key: str) -> Optional[Future]:
+        if not self.enabled:
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="image-variants")
+        future = self._executor.submit(generate_variants, content_hash, problem_id, file_key)
+        future.add_done_callback(self._log_error)
+        return future
+
+    @staticmethod
+    def _log_error(future: Future):
+        if future.exception() is not None:
+            print(f"Ошибка генерации вариантов фото: {future.exception()}")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+image_variant_pool = ImageVariantPool(IMAGE_VARIANT_WORKERS, IMAGE_VARIANTS_ENABLED) # глобальный экземпляр
@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from fastapi import HTTPException, UploadFile
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from ..core.address_index import address_index
+from ..core.config import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS, EXPORT_BATCH_SIZE
+from ..core.geo import parse_bbox
+from ..models.models import UserRole
+from ..repositories.problem_repo import ProblemRepository, EXPORT_COLUMNS, coordinates
+from ..schemas.schemas import ProblemImportRow
+from .cluster_service import cluster_cache
+
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "geojson": "application/geo+json"
+}
+
+def import_format(file: UploadFile, format: Optional[str]) -> str:
+    """Формат из параметра, иначе - по расширению или типу файла"""
+    if format:
+        return format
+    name = (file.filename or "").lower()
+    if name.endswith(".csv") or file.content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or file.content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    raise HTTPException(status_code=400, detail="Не удалось определить формат файла, укажите format=ndjson или csv")
+
+def read_rows(file: BinaryIO, format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Строки файла по одной: (номер строки, данные, ошибка разбора)"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if format == "csv":
+            reader = csv.DictReader(text)
+            for row in reader: # пустая ячейка - нет значения
+                yield reader.line_num, {key: value or None for key, value in row.items() if key}, None
+            return
+        for line_no, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"Неверный JSON: {e.msg}"
+                continue
+            if not isinstance(data, dict):
+                yield line_no, None, "Строка должна быть JSON-объектом"
+                continue
+            yield line_no, data, None
+    finally:
+        text.detach() # файл загрузки закрывает FastAPI
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors()
+    )
+
+def export_record(row) -> dict:
+    record = dict(zip(EXPORT_FIELDS, row))
+    record["type"], record["status"] = row.type.value, row.status.value
+    record["created_at"] = row.created_at.isoformat() if row.created_at else None
+    return record
+
+def write_ndjson(partitions) -> Iterator[str]:
+    for rows in partitions:
+        yield "".join(json.dumps(export_record(row), ensure_ascii=False) + "\n" for row in rows)
+
+def write_csv(partitions) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for rows in partitions:
+        writer.writerows(export_record(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue() # заголовок пустой выгрузки
+
+def write_geojson(partitions) -> Iterator[str]:
+    """FeatureCollection частями; проблема без координат - Feature с geometry null"""
+    yield '{"type":"FeatureCollection","features":['
+    separator = ""
+    for rows in partitions:
+        features = []
+        for row in rows:
+            properties = export_record(row)
+            lat, lon = properties.pop("lat"), properties.pop("lon")
+            geometry = {"type": "Point", "coordinates": [lon, lat]} if lat is not None and lon is not None else None
+            features.append(json.dumps(
+                {"type": "Feature", "id": properties["id"], "geometry": geometry, "properties": properties},
+                ensure_ascii=False
+            ))
+        if features:
+            yield separator + ",".join(features)
+            separator = ","
+    yield "]}"
+
+WRITERS = {"ndjson": write_ndjson, "csv": write_csv, "geojson": write_geojson}
+
+class ProblemImportService:
+    """Массовый импорт проблем от подрядчиков и партнёров. Файл читается и
+    проверяется построчно, строки пишутся пачками (COPY / INSERT ... RETURNING)
+    в одной транзакции: либо загружен весь файл, либо (при ошибках и без
+    skip_invalid) ничего"""
+    def __init__(self, db: Session):
+        self.db = db
+        self.problem_repo = ProblemRepository(db)
+
+    def import_file(self, file: UploadFile, format: Optional[str], current_user, skip_invalid: bool = False) -> dict:
+        format = import_format(file, format)
+        is_from_inspector = (current_user.role == UserRole.INSPECTOR)
+        ids: List[int] = []
+        errors, failed, batch, points = [], 0, [], []
+
+        def flush():
+            ids.extend(self.problem_repo.bulk_insert(batch))
+            points.extend((row["address"], row["lat"], row["lon"]) for row in batch)
+            batch.clear()
+
+        try:
+            for line_no, data, error in read_rows(file.file, format):
+                if error is None:
+                    try:
+                        problem = ProblemImportRow.model_validate(data)
+                    except ValidationError as e:
+                        error = validation_message(e)
+                if error:
+                    failed += 1
+                    if len(errors) < IMPORT_MAX_ERRORS:
+                        errors.append({"row": line_no, "error": error})
+                    continue
+                if failed and not skip_invalid:
+                    continue # транзакция всё равно откатится, дальше только проверяем строки
+                batch.append({
+                    "address": problem.address, "description": problem.description,
+                    "type": problem.type, "status": problem.status,
+                    "reporter_id": current_user.id, "is_from_inspector": is_from_inspector,
+                    "lat": None, "lon": None, "geohash": None,
+                    **coordinates(problem.lat, problem.lon)
+                })
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+            if failed and not skip_invalid:
+                raise HTTPException(
+                    status_code=422,
+                    detail={"message": "Файл содержит ошибки, ничего не загружено", "failed": failed, "errors": errors}
+                )
+            flush()
+            self.db.commit()
+        except UnicodeDecodeError:
+            self.db.rollback()
+            raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+        except Exception:
+            self.db.rollback()
+            raise
+
+        for address, lat, lon in points:
+            address_index.add(address, lat, lon)
+        cluster_cache.clear() # тайлы пересчитаются по запросу, дешевле чем +1 по каждой строке
+        return {"imported": len(ids), "ids": ids, "failed": failed, "errors": errors}
+
+class ProblemExportService:
+    """Потоковая выгрузка проблем: строки идут из серверного курсора пачками,
+    память не зависит от размера таблицы"""
+    def __init__(self, db: Session):
+        self.problem_repo = ProblemRepository(db)
+
+    def export(self, format: str, status=None, type=None, is_from_inspector=None,
+               search: Optional[str] = None, bbox: Optional[str] = None) -> Iterator[str]:
+        try:
+            bbox_value = parse_bbox(bbox) if bbox else None
+        except ValueError as e: # до начала ответа - обычной 400
+            raise HTTPException(status_code=400, detail=str(e))
+        partitions = self.problem_repo.iter_for_export(
+            status, type, is_from_inspector, search, bbox_value, batch_size=EXPORT_BATCH_SIZE
+        )
+        return WRITERS[format](partitions)
@@ -0,0 +1,59 @@
+# Бэкенды инференса: те же веса best.pt, экспортированные в формат, который
+# быстрее исполняется на CPU. Ultralytics сам выбирает рантайм по файлу модели
+# (onnxruntime для .onnx, OpenVINO для папки *_openvino_model, torch.jit для
+# .torchscript), поэтому predict и разбор результатов одинаковы для всех.
+# Как и inference_worker, модуль не импортирует приложение (используется в процессах пула).
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+class Backend(NamedTuple):
+    export_format: Optional[str] # format для YOLO.export, None - исходные веса
+    suffix: str # что ultralytics создаёт рядом с best.pt
+    dynamic: bool # динамические размеры входа (батч разного размера)
+
+BACKENDS: Dict[str, Backend] = {
+    "pytorch": Backend(None, ".pt", True),
+    "onnx": Backend("onnx", ".onnx", True),
+    "openvino": Backend("openvino", "_openvino_model", True), # конвертируется из ONNX
+    "torchscript": Backend("torchscript", ".torchscript", False), # trace, размер батча не фиксируется
+}
+
+def get_backend(name: str) -> Backend:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный бэкенд инференса: {name}. Доступны: {', '.join(BACKENDS)}")
+
+def exported_path(model_path: str, backend: str) -> Path:
+    """best.pt -> best.onnx / best_openvino_model / best.torchscript"""
+    path = Path(model_path)
+    spec = get_backend(backend)
+    if spec.export_format is None:
+        return path
+    return path.with_name(path.stem + spec.suffix)
+
+def is_up_to_date(model_path: str, backend: str) -> bool:
+    """Экспорт есть и сделан не раньше, чем обновились веса"""
+    target = exported_path(model_path, backend)
+    return target.exists() and os.path.getmtime(target) >= os.path.getmtime(model_path)
+
+def export_model(model_path: str, backend: str, imgsz: int = 640) -> Path:
+    """Экспортирует веса (один раз, повторно - только при новых весах)"""
+    spec = get_backend(backend)
+    if spec.export_format is None or is_up_to_date(model_path, backend):
+        return exported_path(model_path, backend)
+
+    from .inference_worker import load_model # torch/ultralytics - только здесь
+    print(f"Экспорт модели в {backend}...")
+    model = load_model(model_path)
+    model.export(format=spec.export_format, imgsz=imgsz, dynamic=spec.dynamic)
+    return exported_path(model_path, backend)
+
+def load_backend_model(model_path: str, backend: str = "pytorch", imgsz: int = 640):
+    """Модель для predict в выбранном бэкенде"""
+    if get_backend(backend).export_format is None:
+        from .inference_worker import load_model
+        return load_model(model_path)
+    from ultralytics import YOLO
+    return YOLO(str(export_model(model_path, backend, imgsz)), task="detect")
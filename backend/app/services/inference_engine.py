@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import numpy as np
+
+class InferenceQueueFullError(Exception):
+    """Очередь инференса переполнена, запрос нужно повторить позже"""
+
+class BatchInferenceEngine:
+    """Микробатчинг запросов к модели.
+
+    Копит изображения из параллельных запросов в течение окна max_wait_ms
+    (или пока не наберётся max_batch_size) и делает один predict на весь батч.
+    predict выполняется в executor (пул потоков/процессов), поэтому event loop
+    продолжает обслуживать остальные запросы. Очередь ограничена max_queue_size.
+    """
+    def __init__(
+        self,
+        predict_fn: Callable[[List[np.ndarray]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        executor: Optional[Executor] = None,
+        max_concurrent_batches: int = 1,
+        max_queue_size: int = 0
+    ):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.executor = executor
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.max_queue_size = max(0, max_queue_size) # 0 - без ограничения
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+        # метрики
+        self.batches_total = 0
+        self.images_total = 0
+        self.last_batch_size = 0
+        self.max_batch_size_seen = 0
+        self.errors_total = 0
+        self.rejected_total = 0
+        self.in_flight = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # очередь привязана к event loop, при смене цикла (тесты, reload) пересоздаём
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, image: np.ndarray) -> Any:
+        """Ставит изображение в очередь и ждёт результат его батча"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((image, future))
+        except asyncio.QueueFull:
+            self.rejected_total += 1
+            raise InferenceQueueFullError()
+        return await future
+
+    async def _collect_batch(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            # ждём свободный воркер до сбора батча: пока все заняты, батч растёт в очереди
+            await self._slots.acquire()
+            batch = await self._collect_batch()
+            # запросы, которые клиент уже отменил, в модель не отправляем
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+            task = self._loop.create_task(self._process(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, batch: List[Tuple[np.ndarray, asyncio.Future]]):
+        images = [image for image, _ in batch]
+        self.in_flight += len(batch)
+        try:
+            results = await self._loop.run_in_executor(self.executor, self.predict_fn, images)
+        except Exception as e:
+            self.errors_total += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.in_flight -= len(batch)
+            self._slots.release()
+
+        self.batches_total += 1
+        self.images_total += len(batch)
+        self.last_batch_size = len(batch)
+        self.max_batch_size_seen = max(self.max_batch_size_seen, len(batch))
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stop(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        self._worker = None
+
+    def get_metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "in_flight": self.in_flight,
+            "batches_total": self.batches_total,
+            "images_total": self.images_total,
+            "avg_batch_size": round(self.images_total / self.batches_total, 2) if self.batches_total else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size_seen": self.max_batch_size_seen,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "errors_total": self.errors_total,
+            "rejected_total": self.rejected_total
+        }
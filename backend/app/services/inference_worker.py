@@ -0,0 +1,81 @@
+# Функции, которые выполняются в потоках/процессах пула инференса.
+# Модуль намеренно не импортирует ничего из приложения, чтобы дочерний
+# процесс пула не поднимал сервисы, БД и MinIO. torch и ultralytics
+# импортируются при загрузке модели, а не при импорте модуля (быстрый старт API).
+import contextlib
+import os
+from typing import List
+import numpy as np
+
+_process_model = None # модель внутри процесса пула (загружается один раз)
+
+@contextlib.contextmanager
+def disable_weights_only_check(): # безопасная загрузка нейросети
+    import torch
+    import torch.serialization
+    from ultralytics.nn.tasks import DetectionModel
+    torch.serialization.add_safe_globals([DetectionModel])
+    original_load = torch.load
+    def custom_load(*args, **kwargs):
+        kwargs['weights_only'] = False
+        return original_load(*args, **kwargs)
+    torch.load = custom_load
+
+    try:
+        yield
+    finally:
+        torch.load = original_load
+
+def load_model(model_path: str):
+    from ultralytics import YOLO
+    with disable_weights_only_check():
+        return YOLO(str(model_path))
+
+def threads_per_worker(workers: int) -> int:
+    """Делим ядра между воркерами, чтобы intra-op потоки torch не конкурировали"""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def extract_detections(result) -> dict:
+    """Сжимает Results от YOLO до numpy-массивов (их дёшево передавать между процессами)"""
+    if result.boxes is None or len(result.boxes) == 0:
+        return {
+            "xyxy": np.zeros((0, 4), dtype=np.float32),
+            "conf": np.zeros(0, dtype=np.float32),
+            "cls": np.zeros(0, dtype=np.int64),
+            "names": dict(result.names)
+        }
+    boxes = result.boxes.cpu().numpy()
+    return {
+        "xyxy": boxes.xyxy,
+        "conf": boxes.conf,
+        "cls": boxes.cls.astype(np.int64),
+        "names": dict(result.names)
+    }
+
+def predict(model, images: List[np.ndarray], conf: float, imgsz: int = 640) -> List[dict]:
+    results = model.predict(
+        source=images,
+        conf=conf,  # Порог уверенности
+        imgsz=imgsz, # для экспортированных моделей - тот же размер, что при экспорте
+        save=False,
+        verbose=False
+    )
+    return [extract_detections(result) for result in results]
+
+def init_process_worker(model_path: str, num_threads: int, backend: str = "pytorch", imgsz: int = 640,
+                        warmup_size: int = 0):
+    """initializer для ProcessPoolExecutor: модель грузится один раз на процесс
+    и прогревается (warmup_size > 0) до первой задачи"""
+    global _process_model
+    import torch
+    from .inference_backends import load_backend_model
+    torch.set_num_threads(num_threads)
+    _process_model = load_backend_model(model_path, backend, imgsz)
+    if warmup_size:
+        predict(_process_model, [np.zeros((warmup_size, warmup_size, 3), dtype=np.uint8)], 0.5, imgsz)
+
+def predict_in_process(images: List[np.ndarray], conf: float, imgsz: int = 640, slicing=None) -> List[dict]:
+    if slicing is not None: # SliceConfig - фото большого размера по тайлам
+        from .sliced_inference import predict_sliced
+        return predict_sliced(_process_model, images, conf, imgsz, slicing)
+    return predict(_process_model, images, conf, imgsz)
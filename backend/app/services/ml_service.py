@@ -1,128 +1,295 @@
 from fastapi import HTTPException
-import os
-import torch
-import torch.serialization
-from ultralytics import YOLO
-from ultralytics.nn.tasks import DetectionModel
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import List, Optional, Tuple
 from pathlib import Path
-import contextlib
-from ..core.config import MODEL_PATH
-from ..schemas.schemas import DefectDetection
-from tempfile import NamedTemporaryFile
 import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+import numpy as np
+from ..core.config import (
+    MODEL_PATH, ML_CONFIDENCE, ML_BATCH_MAX_SIZE, ML_BATCH_MAX_WAIT_MS,
+    ML_EXECUTOR, ML_INFERENCE_WORKERS, ML_MAX_QUEUE_SIZE, ML_RETRY_AFTER_SECONDS, ML_MODEL_VERSION,
+    ML_BACKEND, ML_IMAGE_SIZE, ML_SLICED, ML_TILE_SIZE, ML_TILE_OVERLAP, ML_SLICE_MIN_SIDE, ML_SLICE_NMS_IOU,
+    ML_SLICE_MAX_BATCH
+)
+from .inference_engine import BatchInferenceEngine, InferenceQueueFullError
+from .detection_cache import detection_cache
+from .inference_backends import get_backend, export_model, load_backend_model
+from .inference_worker import (
+    predict, threads_per_worker, init_process_worker, predict_in_process
+)
+from .sliced_inference import SliceConfig, predict_sliced
+
+CLASS_TO_TYPE = { # класс модели -> ProblemType
+    'D00': 'long_crack',
+    'D10': 'transverse_crack',
+    'D20': 'alligator_crack',
+    'D40': 'pothole'
+}
+PROBLEM_TYPES = np.array(list(dict.fromkeys(CLASS_TO_TYPE.values())) + ['other'], dtype=object)
+OTHER_TYPE_ID = len(PROBLEM_TYPES) - 1
 
-@contextlib.contextmanager
-def disable_weights_only_check(): # безопасная загрузка нейросети
-    torch.serialization.add_safe_globals([DetectionModel])
-    original_load = torch.load
-    def custom_load(*args, **kwargs):
-        kwargs['weights_only'] = False
-        return original_load(*args, **kwargs)
-    torch.load = custom_load
-    
-    try:
-        yield
-    finally:
-        torch.load = original_load
+@lru_cache(maxsize=16)
+def class_tables(names: Tuple[Tuple[int, str], ...]) -> Tuple[np.ndarray, np.ndarray]:
+    """По names модели: id класса -> индекс в PROBLEM_TYPES и id класса -> имя класса.
+    Строится один раз на модель, дальше - индексация массивов"""
+    size = max(class_id for class_id, _ in names) + 1
+    type_ids = np.full(size, OTHER_TYPE_ID, dtype=np.int64)
+    class_names = np.empty(size, dtype=object)
+    type_index = {name: i for i, name in enumerate(PROBLEM_TYPES)}
+    for class_id, class_name in names:
+        class_names[class_id] = class_name
+        type_ids[class_id] = type_index[CLASS_TO_TYPE.get(class_name, 'other')]
+    return type_ids, class_names
+
+WARMUP_SIZE = 640 # сторона пустого кадра для прогревочного прохода
 
 class MLService: # для работы с нейросетью
+    """Модель грузится не при импорте, а в фоне при старте приложения (load),
+    пока API уже отвечает на остальные запросы"""
     def __init__(self):
         self.model = None
-        self.available = False
-        self._load_model() # загрузка модели при инициализации
-    
-    def _load_model(self): 
-        with disable_weights_only_check():
-            if Path(MODEL_PATH).exists():
-                self.model = YOLO(str(MODEL_PATH))
-                print(f"Модель загружена!")
-                self.available = True
-            else:
-                print("Модель не найдена")
-                self.available = False
-    
+        self.status = "not_loaded" # not_loaded -> loading -> ready | unavailable
+        self.executor_mode = ML_EXECUTOR
+        self.backend = ML_BACKEND
+        get_backend(self.backend) # опечатка в ML_BACKEND видна сразу при старте
+        self.slicing = SliceConfig(
+            ML_TILE_SIZE, ML_TILE_OVERLAP, ML_SLICE_NMS_IOU, ML_SLICE_MIN_SIDE, ML_SLICE_MAX_BATCH
+        ) if ML_SLICED else None
+        self._local = threading.local() # YOLO не потокобезопасен: у каждого потока пула своя модель
+        self._load_lock = threading.Lock()
+        self.model_version = self._model_version()
+        self.engine = self._create_engine()
+
+    @property
+    def available(self) -> bool:
+        return self.status == "ready"
+
+    def _model_version(self) -> str:
+        """Часть ключа кэша детекций: новые веса - новые результаты"""
+        path = Path(MODEL_PATH)
+        if ML_MODEL_VERSION:
+            version = ML_MODEL_VERSION
+        elif path.exists():
+            stat = path.stat()
+            version = f"{path.name}-{stat.st_size}-{int(stat.st_mtime)}"
+        else:
+            return "none"
+        # другой рантайм или нарезка на тайлы - другие результаты, не смешиваем
+        if self.backend != "pytorch":
+            version += f"-{self.backend}"
+        if self.slicing:
+            version += f"-sliced{self.slicing.tile_size}"
+        return version
+
+    def load(self):
+        """Загрузка весов и прогревочный проход (вызывается в потоке из lifespan и воркером)"""
+        with self._load_lock:
+            if self.status in ("ready", "unavailable"):
+                return
+            self.status = "loading"
+            try:
+                self._load_model()
+            except Exception as e:
+                print(f"Ошибка загрузки модели: {e}")
+                self.status = "unavailable"
+
+    def _load_model(self):
+        if not Path(MODEL_PATH).exists():
+            print("Модель не найдена")
+            self.status = "unavailable"
+            return
+
+        warmup = [np.zeros((WARMUP_SIZE, WARMUP_SIZE, 3), dtype=np.uint8)]
+        workers = max(1, ML_INFERENCE_WORKERS)
+        export_model(MODEL_PATH, self.backend, ML_IMAGE_SIZE) # один раз здесь, а не в каждом процессе пула
+        if self.executor_mode == "process":
+            # модель грузится и прогревается в initializer каждого процесса;
+            # задачи на все процессы сразу поднимают весь пул до первого запроса
+            futures = [self.engine.executor.submit(os.getpid) for _ in range(workers)]
+            for future in futures:
+                future.result()
+        else:
+            import torch # тяжёлый импорт - только при загрузке модели
+            torch.set_num_threads(threads_per_worker(workers))
+            barrier = threading.Barrier(workers) # держит поток, пока задачи не разойдутся по всем потокам пула
+
+            def warm():
+                barrier.wait()
+                model = self._thread_model()
+                # первый проход (инициализация слоёв) не достаётся пользователю
+                predict(model, warmup, ML_CONFIDENCE, ML_IMAGE_SIZE)
+                return model
+
+            futures = [self.engine.executor.submit(warm) for _ in range(workers)]
+            self.model = [future.result() for future in futures][0]
+        print(f"Модель загружена! Бэкенд: {self.backend}")
+        self.status = "ready"
+
+    def _create_engine(self) -> BatchInferenceEngine:
+        workers = max(1, ML_INFERENCE_WORKERS)
+        if self.executor_mode == "process":
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"), # fork после инициализации torch небезопасен
+                initializer=init_process_worker,
+                initargs=(str(MODEL_PATH), threads_per_worker(workers), self.backend, ML_IMAGE_SIZE, WARMUP_SIZE)
+            )
+            predict_fn = partial(predict_in_process, conf=ML_CONFIDENCE, imgsz=ML_IMAGE_SIZE, slicing=self.slicing)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+            predict_fn = self._predict_batch
+
+        return BatchInferenceEngine(
+            predict_fn,
+            max_batch_size=ML_BATCH_MAX_SIZE,
+            max_wait_ms=ML_BATCH_MAX_WAIT_MS,
+            executor=executor,
+            max_concurrent_batches=workers,
+            max_queue_size=ML_MAX_QUEUE_SIZE
+        )
+
+    def _thread_model(self):
+        """Модель потока пула; грузится и прогревается в _load_model, по одной на поток"""
+        model = getattr(self._local, "model", None)
+        if model is None:
+            model = load_backend_model(MODEL_PATH, self.backend, ML_IMAGE_SIZE)
+            self._local.model = model
+        return model
+
     def map_class_to_problem_type(self, class_name: str) -> str: # маппинг
-        mapping = {
-            'D00': 'long_crack',      
-            'D10': 'transverse_crack', 
-            'D20': 'alligator_crack', 
-            'D40': 'pothole'         
+        return CLASS_TO_TYPE.get(class_name, 'other')
+
+    def decode_image(self, content: bytes) -> np.ndarray:
+        """Декодирует байты загрузки в BGR-массив прямо в памяти (без временных файлов)"""
+        import cv2
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise HTTPException(status_code=400, detail="Не удалось декодировать изображение")
+        return image
+
+    def _predict_batch(self, images: List[np.ndarray]) -> List[dict]:
+        """Один forward pass на батч изображений (выполняется в потоке пула)"""
+        return self._predict(images)
+
+    def _predict(self, images: List[np.ndarray]) -> List[dict]:
+        if self.slicing:
+            return predict_sliced(self._thread_model(), images, ML_CONFIDENCE, ML_IMAGE_SIZE, self.slicing)
+        return predict(self._thread_model(), images, ML_CONFIDENCE, ML_IMAGE_SIZE)
+
+    def parse_result(self, detections: dict) -> dict:
+        """Преобразует детекции одного изображения в ответ API (JSON-совместимый).
+        Без цикла по рамкам: типы - индексацией таблицы, счёт типов - bincount"""
+        cls = np.asarray(detections["cls"], dtype=np.int64)
+        if len(cls) == 0:
+            return {"defects": [], "detected_types": [], "dominant_type": None, "confidence": None}
+
+        type_table, class_names = class_tables(tuple(sorted(detections["names"].items())))
+        type_ids = type_table[cls]
+        counts = np.bincount(type_ids, minlength=len(PROBLEM_TYPES))
+
+        # доминирующий тип - самый частый, при равенстве - встреченный раньше
+        first_seen = np.full(len(PROBLEM_TYPES), len(type_ids))
+        np.minimum.at(first_seen, type_ids, np.arange(len(type_ids)))
+        tied = np.flatnonzero(counts == counts.max())
+        dominant_type = PROBLEM_TYPES[tied[np.argmin(first_seen[tied])]]
+
+        confidences = np.asarray(detections["conf"]).tolist()
+        defects = [
+            {"type": problem_type, "confidence": confidence, "bbox": bbox, "class_name": class_name}
+            for problem_type, confidence, bbox, class_name in zip(
+                PROBLEM_TYPES[type_ids].tolist(),
+                confidences,
+                np.asarray(detections["xyxy"]).astype(np.int64).tolist(), # как int(): отбрасывает дробную часть
+                class_names[cls].tolist()
+            )
+        ]
+        return {
+            "defects": defects,
+            "detected_types": PROBLEM_TYPES[np.flatnonzero(counts)].tolist(),
+            "dominant_type": dominant_type,
+            "confidence": confidences[0]
         }
-        return mapping.get(class_name, 'other')
-    
+
     async def analyze_image(self, file):
-        if not self.available or self.model is None:
-            raise HTTPException(status_code=503, detail="ML сервис временно недоступен")
+        file_content = await file.read()
+        return await self.analyze_content(file_content)
+
+    async def analyze_content(self, content: bytes, content_hash: Optional[str] = None) -> dict:
+        """Анализ байтов изображения; повторный анализ тех же байтов берётся из кэша"""
+        self.ensure_ready()
+        if content_hash is None:
+            content_hash = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        key = detection_cache.make_key(content_hash, self.model_version, ML_CONFIDENCE)
+        return await detection_cache.get_or_compute(key, lambda: self._detect(content))
 
-        temp_path = None
+    async def _detect(self, content: bytes) -> dict:
+        # декодирование большого JPEG тоже не должно блокировать event loop
+        image = await asyncio.get_running_loop().run_in_executor(None, self.decode_image, content)
+
+        # изображение попадает в общий батч с параллельными запросами
+        try:
+            detections = await self.engine.submit(image)
+        except InferenceQueueFullError:
+            raise self._overloaded()
+        return self.parse_result(detections) # JSON-совместимый - годится и для SQLite/Redis уровня кэша
+
+    async def detect_frames(self, images: List[np.ndarray]) -> List[dict]:
+        """Уже декодированные кадры видео: через общую очередь движка (батчатся
+        вместе с параллельными запросами), без кэша - кадры не повторяются"""
+        self.ensure_ready()
         try:
-            # Сначала читаем содержимое файла и закрываем его
-            file_content = await file.read()
-
-            # Создаем временный файл и записываем в него содержимое
-            with NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-                temp_file.write(file_content)
-                temp_path = temp_file.name
-            
-            # Теперь можно безопасно использовать временный файл для анализа
-            results = self.model.predict(
-                source=temp_path,
-                conf=0.3,  # Порог уверенности
-                save=False,
-                verbose=False
+            detections = await asyncio.gather(*(self.engine.submit(image) for image in images))
+        except InferenceQueueFullError:
+            raise self._overloaded()
+        return [self.parse_result(item) for item in detections]
+
+    def ensure_ready(self):
+        """503, пока модель не загружена"""
+        if self.status in ("not_loaded", "loading"):
+            raise HTTPException(
+                status_code=503,
+                detail="Модель загружается, повторите запрос позже",
+                headers={"Retry-After": str(ML_RETRY_AFTER_SECONDS)}
             )
-                
-            # Обрабатываем результаты
-            defects = []
-            detected_types = set()
-
-            for result in results:
-                if result.boxes is not None:
-                    boxes = result.boxes.cpu().numpy()
-                    for box in boxes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        confidence = float(box.conf[0])
-                        class_id = int(box.cls[0])
-                        
-                        class_name = result.names[class_id]  # D00, D10, D20, D40
-                        
-                        # Маппим на наш тип
-                        problem_type = self.map_class_to_problem_type(class_name)
-
-                        defect = DefectDetection(
-                            type=problem_type,
-                            confidence=confidence,
-                            bbox=[x1, y1, x2, y2],
-                            class_name=class_name
-                        )
-                        defects.append(defect)
-                        detected_types.add(problem_type)
-                
-            dominant_type = None # доминирующий тип
-            if defects:
-                # Группируем по типам и находим самый частый
-                type_counts = {}
-                for defect in defects:
-                    type_counts[defect.type] = type_counts.get(defect.type, 0) + 1
-                
-                dominant_type = max(type_counts, key=type_counts.get)
-                
-            return {
-                "defects": defects,
-                "detected_types": list(detected_types),
-                "dominant_type": dominant_type,
-                "confidence": defects[0].confidence if defects else None
-            }
-            
-        finally:            
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    await asyncio.sleep(0.1) # небольшая задержка для гарантии освобождения файла
-                    os.unlink(temp_path) # удал. временный файл
-                except Exception as e:
-                    print(f"Ошибка при удалении временного файла: {e}")
+        if not self.available:
+            raise HTTPException(status_code=503, detail="ML сервис временно недоступен")
 
-ml_service = MLService() # глобальный экземпляр
+    def _overloaded(self) -> HTTPException:
+        return HTTPException(
+            status_code=503,
+            detail="ML сервис перегружен, повторите запрос позже",
+            headers={"Retry-After": str(ML_RETRY_AFTER_SECONDS)}
+        )
 
+    def detect_batch(self, contents: List[bytes]) -> List[Optional[dict]]:
+        """Синхронный анализ пачки фото одним predict - для фоновых воркеров, мимо
+        очереди движка, но в том же пуле (прогретые модели потоков/процессов).
+        None - фото не декодируется"""
+        if not self.available:
+            raise RuntimeError("Модель недоступна")
+        images = []
+        for content in contents:
+            try:
+                images.append(self.decode_image(content))
+            except HTTPException:
+                images.append(None)
+        decoded = [image for image in images if image is not None]
+        detections = iter(self.engine.executor.submit(self.engine.predict_fn, decoded).result() if decoded else [])
+        return [None if image is None else self.parse_result(next(detections)) for image in images]
 
+    def get_metrics(self) -> dict:
+        return {
+            "available": self.available,
+            "status": self.status,
+            "executor": self.executor_mode,
+            "workers": self.engine.max_concurrent_batches,
+            "model_version": self.model_version,
+            **self.engine.get_metrics(),
+            **detection_cache.get_metrics()
+        }
 
+ml_service = MLService() # глобальный экземпляр
@@ -1,50 +1,252 @@
+import asyncio
+import hashlib
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..models.models import ProblemType, UserRole
-from ..repositories.problem_repo import ProblemRepository
+from ..models.models import ProblemStatus, ProblemType, UserRole
+from ..repositories.problem_repo import ProblemRepository, AsyncProblemRepository
+from ..repositories.detection_repo import AsyncDetectionRepository
+from ..schemas.schemas import ProblemResponse, NearbyProblemResponse
+from ..core.address_index import address_index
+from ..core.geo import parse_bbox
+from .cluster_service import cluster_cache, problem_point
+from .image_service import AsyncImageService, MAX_FILE_SIZE, SNIFF_SIZE, check_signature, file_too_large
+from .ml_service import ml_service
+
+# допустимые смены статуса - и для одной проблемы, и при массовом обновлении
+STATUS_TRANSITIONS = {
+    ProblemStatus.NEW: {ProblemStatus.IN_PROGRESS, ProblemStatus.RESOLVED, ProblemStatus.CLOSED},
+    ProblemStatus.IN_PROGRESS: {ProblemStatus.NEW, ProblemStatus.RESOLVED, ProblemStatus.CLOSED},
+    ProblemStatus.RESOLVED: {ProblemStatus.IN_PROGRESS, ProblemStatus.CLOSED}, # ремонт не принят - снова в работу
+    ProblemStatus.CLOSED: {ProblemStatus.IN_PROGRESS}, # «Вернуть в работу»; решённой или новой закрытая не становится
+}
+
+def check_transition(previous: ProblemStatus, status: ProblemStatus):
+    if status != previous and status not in STATUS_TRANSITIONS[previous]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Недопустимая смена статуса: {previous.value} -> {status.value}"
+        )
 
 class ProblemService:
     """Бизнес-логика работы с проблемами"""
     def __init__(self, db: Session):
+        self.db = db
         self.problem_repo = ProblemRepository(db)
     
     def get_all_problems(self):
         return self.problem_repo.get_all()
     
     def get_problems_filtered(self, status, type, is_from_inspector, search, 
-                         sort_by, sort_order, page, limit):
-        return self.problem_repo.get_filtered(
-            status=status,
-            type=type,
-            is_from_inspector=is_from_inspector,
-            search=search,
-            sort_by=sort_by,
-            sort_order=sort_order,
-            page=page,
-            limit=limit
-        )
+                         sort_by, sort_order, page, limit,
+                         cursor=None, use_cursor=False, total_mode="exact",
+                         bbox=None, lat=None, lon=None, radius_km=None):
+        try:
+            near = None
+            if radius_km is not None:
+                if lat is None or lon is None:
+                    raise ValueError("Для фильтра по радиусу нужны lat и lon")
+                near = (lat, lon, radius_km)
+            return self.problem_repo.get_filtered(
+                status=status,
+                type=type,
+                is_from_inspector=is_from_inspector,
+                search=search,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                page=page,
+                limit=limit,
+                cursor=cursor,
+                use_cursor=use_cursor,
+                total_mode=total_mode,
+                bbox=parse_bbox(bbox) if bbox else None,
+                near=near
+            )
+        except ValueError as e: # битый курсор, курсор от другой сортировки, неверный bbox
+            raise HTTPException(status_code=400, detail=str(e))
 
     def get_problem(self, problem_id: int):
         return self.problem_repo.get_by_id(problem_id)
     
+    def _snapshot(self, problem_id: int):
+        """Состояние проблемы до изменения - нужно только для обновления кэша кластеров"""
+        if not cluster_cache.active:
+            return None
+        return problem_point(self.problem_repo.get_by_id(problem_id))
+
     def create_problem(self, problem_data, current_user):
         is_from_inspector = (current_user.role == UserRole.INSPECTOR)
-        return self.problem_repo.create(
+        problem = self.problem_repo.create(
             problem_data, 
             current_user.id, 
             is_from_inspector
         )
+        cluster_cache.record_change(None, problem_point(problem))
+        return problem
     
-    def update_problem(self, problem_id: int, address: str, description: str, type: ProblemType):
-        return self.problem_repo.update(
+    def update_problem(self, problem_id: int, address: str, description: str, type: ProblemType,
+                       lat: float = None, lon: float = None):
+        before = self._snapshot(problem_id)
+        problem = self.problem_repo.update(
             problem_id=problem_id,
             address=address,
             description=description,
-            type=type
-    )
+            type=type,
+            lat=lat,
+            lon=lon
+        )
+        if problem:
+            cluster_cache.record_change(before, problem_point(problem))
+        return problem
+
+    def get_nearest_problems(self, lat: float, lon: float, limit: int, max_radius_km: float):
+        return [
+            NearbyProblemResponse(
+                **ProblemResponse.model_validate(problem).model_dump(),
+                distance_km=round(distance_km, 3)
+            )
+            for problem, distance_km in self.problem_repo.get_nearest(lat, lon, limit, max_radius_km)
+        ]
 
-    def update_status(self, problem_id: int, status):
-        return self.problem_repo.update_status(problem_id, status)
+    def update_status(self, problem_id: int, status: ProblemStatus):
+        """Смена статуса по тем же правилам, что и массовая; строка заблокирована
+        от проверки до commit, параллельная смена не обойдёт правила"""
+        rows = self.problem_repo.get_for_status_update([problem_id])
+        if not rows:
+            self.db.rollback()
+            return None
+        try:
+            check_transition(rows[0].status, status)
+        except HTTPException:
+            self.db.rollback() # снимает блокировку
+            raise
+        problem = self.problem_repo.update_status(problem_id, status)
+        cluster_cache.record_change(problem_point(rows[0]), problem_point(problem))
+        return problem
     
+    def bulk_update_status(self, items) -> dict:
+        """Смена статусов пачкой (день бригады): одна выборка текущих статусов,
+        один UPDATE на все допустимые переходы и commit - вместо запросов на каждую проблему"""
+        counts = {}
+        for item in items:
+            counts[item.id] = counts.get(item.id, 0) + 1
+        current = {row.id: row for row in self.problem_repo.get_for_status_update(list(counts))}
+
+        results, changes = [], {}
+        for item in items:
+            row = current.get(item.id)
+            previous = row.status if row else None
+            if counts[item.id] > 1:
+                result = "duplicate"
+            elif row is None:
+                result = "not_found"
+            elif previous == item.status:
+                result = "unchanged"
+            elif item.status not in STATUS_TRANSITIONS[previous]:
+                result = "invalid_transition"
+            else:
+                result = "updated"
+                changes[item.id] = item.status
+            results.append({
+                "id": item.id, "result": result, "previous_status": previous,
+                "status": item.status if result == "updated" else previous
+            })
+
+        self.problem_repo.bulk_update_status(changes)
+        self.db.commit() # и снимает блокировки строк, даже если менять нечего
+        for problem_id, status in changes.items():
+            before = problem_point(current[problem_id])
+            if before:
+                cluster_cache.record_change(before, before._replace(status=status.value))
+        return {
+            "updated": len(changes),
+            "failed": sum(r["result"] in ("not_found", "invalid_transition", "duplicate") for r in results),
+            "results": results
+        }
+
     def delete_problem(self, problem_id: int):
-        return self.problem_repo.delete(problem_id)
-    
\ No newline at end of file
+        before = self._snapshot(problem_id)
+        deleted = self.problem_repo.delete(problem_id)
+        if deleted:
+            cluster_cache.record_change(before, None)
+        return deleted
+
+class AsyncProblemService:
+    """Бизнес-логика работы с проблемами для async эндпоинтов (создание по фото и видео);
+    изменение и удаление идут через синхронный ProblemService"""
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.problem_repo = AsyncProblemRepository(db)
+
+    async def get_problem(self, problem_id: int):
+        return await self.problem_repo.get_by_id(problem_id)
+
+    async def create_problem(self, problem_data, current_user):
+        is_from_inspector = (current_user.role == UserRole.INSPECTOR)
+        problem = await self.problem_repo.create(
+            problem_data,
+            current_user.id,
+            is_from_inspector
+        )
+        cluster_cache.record_change(None, problem_point(problem))
+        return problem
+
+    async def create_from_photo(self, problem_data, photo: UploadFile, current_user, detect_type: bool):
+        """Проблема по фото за один запрос: детекция и загрузка в MinIO идут
+        параллельно по одним и тем же байтам, тип (если не задан) - dominant_type
+        модели, найденные дефекты сохраняются в detections"""
+        image_service = AsyncImageService(self.db)
+        image_service.validate_file(photo)
+        content = await photo.read(MAX_FILE_SIZE + 1)
+        if len(content) > MAX_FILE_SIZE:
+            raise file_too_large()
+        check_signature(content[:SNIFF_SIZE])
+        await photo.seek(0)
+        content_hash = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+
+        analysis, stored = await asyncio.gather(
+            self._analyze(content, content_hash),
+            image_service.store_upload(photo, current_user.id, hashed=(content_hash, len(content)))
+        )
+        if detect_type:
+            dominant_type = analysis and analysis["dominant_type"]
+            problem_data = problem_data.model_copy(
+                update={"type": ProblemType(dominant_type) if dominant_type else ProblemType.OTHER}
+            )
+
+        # проблема и запись фото - одной транзакцией: проблема только flush,
+        # commit делает создание записи фото
+        problem_id = None
+        try:
+            problem = await self.problem_repo.create(
+                problem_data, current_user.id, current_user.role == UserRole.INSPECTOR, commit=False
+            )
+            problem_id = problem.id
+            image = await image_service.attach_upload(problem_id, photo, current_user.id, stored)
+        except Exception:
+            await self.db.rollback()
+            if problem_id is not None and await self.problem_repo.get_by_id(problem_id):
+                # фото уже записано (упало после commit) - удаляем проблему, ссылку на объект снимет delete
+                await self.problem_repo.delete(problem_id)
+            else:
+                await image_service.discard_upload(stored) # файл уже в MinIO, но фото не сохранено
+            raise
+        problem = await self.get_problem(problem_id)
+        address_index.add(problem.address, problem.lat, problem.lon)
+        cluster_cache.record_change(None, problem_point(problem))
+        if analysis:
+            await AsyncDetectionRepository(self.db).bulk_create(
+                image["id"], problem_id, analysis["defects"], ml_service.model_version
+            )
+        return {
+            "problem": await self.get_problem(problem_id),
+            "image_id": image["id"],
+            "analysis": analysis
+        }
+
+    async def _analyze(self, content: bytes, content_hash: str):
+        try:
+            return await ml_service.analyze_content(content, content_hash)
+        except Exception as e: # без модели проблема всё равно создаётся
+            print(f"Анализ фото не выполнен, проблема создаётся без детекций: {getattr(e, 'detail', e)}")
+            return None
@@ -0,0 +1,129 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from ..core.config import (
+    REANALYSIS_BATCH_SIZE, REANALYSIS_LEASE_SECONDS, REANALYSIS_MAX_ATTEMPTS, REANALYSIS_RETRY_DELAY,
+    REANALYSIS_POLL_INTERVAL, REANALYSIS_DOWNLOAD_WORKERS
+)
+from ..core.minio_client import minio_client
+from ..database import SessionLocal
+from ..repositories.reanalysis_repo import ReanalysisRepository
+from .ml_service import ml_service
+
+class ReanalysisService:
+    """Запуск повторного анализа и его прогресс (для админки)"""
+    def __init__(self, db: Session):
+        self.repo = ReanalysisRepository(db)
+
+    def _response(self, run) -> dict:
+        progress = self.repo.get_progress(run.id)
+        total = sum(progress.values())
+        finished = progress["done"] + progress["failed"]
+        return {
+            "id": run.id,
+            "model_version": run.model_version,
+            "created_at": run.created_at,
+            "total": total,
+            **progress,
+            "progress": round(finished / total, 4) if total else 1.0,
+            "finished": finished == total
+        }
+
+    def start_run(self, created_by: int, model_version: Optional[str] = None) -> dict:
+        run = self.repo.create_run(model_version or ml_service.model_version, created_by)
+        return self._response(run)
+
+    def get_run(self, run_id: int) -> dict:
+        run = self.repo.get_run(run_id)
+        if not run:
+            raise HTTPException(status_code=404, detail="Запуск не найден")
+        return self._response(run)
+
+    def get_runs(self) -> List[dict]:
+        return [self._response(run) for run in self.repo.get_runs()]
+
+    def retry_failed(self, run_id: int) -> dict:
+        self.get_run(run_id)
+        self.repo.retry_failed(run_id)
+        return self.get_run(run_id)
+
+class ReanalysisWorker:
+    """Воркер очереди: забирает пачку задач, скачивает фото из MinIO параллельно,
+    прогоняет пачку через модель одним predict и записывает детекции. Пока идёт
+    инференс, следующая пачка уже забирается и скачивается. Воркеров можно
+    запускать сколько угодно (python -m app.worker) - SKIP LOCKED делит очередь"""
+    def __init__(self, session_factory=SessionLocal, batch_size: int = REANALYSIS_BATCH_SIZE,
+                 worker_id: Optional[str] = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.model_version = ml_service.model_version
+        self._downloads = ThreadPoolExecutor(max_workers=REANALYSIS_DOWNLOAD_WORKERS, thread_name_prefix="reanalysis-io")
+        self._prefetch = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reanalysis-prefetch")
+
+    def _fetch(self) -> List[Tuple]:
+        """Забирает пачку и скачивает её фото: [(задача, фото, байты или None)]"""
+        db = self.session_factory()
+        try:
+            repo = ReanalysisRepository(db)
+            jobs = repo.claim(
+                self.worker_id, self.model_version, self.batch_size, REANALYSIS_LEASE_SECONDS, REANALYSIS_MAX_ATTEMPTS
+            )
+            images = repo.get_images([job.image_id for job in jobs])
+            db.expunge_all() # объекты используются после закрытия сессии
+        finally:
+            db.close()
+        contents = self._downloads.map(
+            lambda job: minio_client.download_file(images[job.image_id].file_key) if job.image_id in images else None,
+            jobs
+        )
+        return [(job, images.get(job.image_id), content) for job, content in zip(jobs, contents)]
+
+    def _process(self, batch: List[Tuple]) -> int:
+        db = self.session_factory()
+        try:
+            repo = ReanalysisRepository(db)
+            ready = [(job, image, content) for job, image, content in batch if content is not None]
+            for job, image, content in batch:
+                if content is None:
+                    repo.fail(job, "Фото не найдено в хранилище", REANALYSIS_MAX_ATTEMPTS, REANALYSIS_RETRY_DELAY)
+            try:
+                analyses = ml_service.detect_batch([content for _, _, content in ready])
+            except Exception as e:
+                print(f"Ошибка инференса пачки: {e}")
+                for job, _, _ in ready:
+                    repo.fail(job, str(e), REANALYSIS_MAX_ATTEMPTS, REANALYSIS_RETRY_DELAY)
+                return 0
+            results = {}
+            for (job, image, _), analysis in zip(ready, analyses):
+                if analysis is None:
+                    repo.fail(job, "Не удалось декодировать изображение", REANALYSIS_MAX_ATTEMPTS, REANALYSIS_RETRY_DELAY)
+                else:
+                    results[job.id] = (image, analysis)
+            return repo.complete(self.worker_id, results, self.model_version) if results else 0
+        finally:
+            db.close()
+
+    def run(self, once: bool = False) -> int:
+        """Обрабатывает очередь; once - выйти, когда задач не осталось"""
+        processed = 0
+        batch = self._fetch()
+        while True:
+            if not batch:
+                if once:
+                    return processed
+                time.sleep(REANALYSIS_POLL_INTERVAL)
+                batch = self._fetch()
+                continue
+            next_batch = self._prefetch.submit(self._fetch)
+            processed += self._process(batch)
+            print(f"Воркер {self.worker_id}: обработано {processed} фото")
+            batch = next_batch.result()
+
+    def close(self):
+        self._prefetch.shutdown(wait=True)
+        self._downloads.shutdown(wait=True)
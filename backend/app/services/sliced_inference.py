@@ -0,0 +1,91 @@
+# Нарезанный инференс для фото высокого разрешения: модель видит кадр 640px,
+# поэтому на снимке 4000px тонкие трещины (D00/D10) при уменьшении пропадают.
+# Фото режется на тайлы с перекрытием, все тайлы всех фото батча (и сами фото
+# целиком - для крупных дефектов на стыке тайлов) идут в predict пачками не больше
+# max_batch кадров (4000px фото - десятки тайлов, память ограничена), затем
+# рамки переводятся в координаты фото и сливаются NMS по классам.
+# Как и inference_worker, модуль не импортирует приложение (используется в процессах пула).
+from typing import List, NamedTuple, Tuple
+import numpy as np
+from .inference_worker import predict
+
+class SliceConfig(NamedTuple):
+    tile_size: int = 640
+    overlap: float = 0.2 # доля стороны тайла
+    iou: float = 0.5 # порог NMS при слиянии
+    min_side: int = 1280 # фото меньше этого режутся не будут
+    max_batch: int = 16 # макс. кадров в одном predict
+
+def tile_starts(length: int, tile: int, step: int) -> np.ndarray:
+    """Начала тайлов по одной оси; последний прижат к краю, чтобы не было обрезков"""
+    if length <= tile:
+        return np.zeros(1, dtype=np.int64)
+    starts = np.arange(0, length - tile, step)
+    return np.append(starts, length - tile)
+
+def tile_grid(width: int, height: int, tile: int, overlap: float) -> np.ndarray:
+    """Тайлы (x0, y0, x1, y1), покрывающие фото"""
+    step = max(1, int(tile * (1 - overlap)))
+    xs, ys = tile_starts(width, tile, step), tile_starts(height, tile, step)
+    x0, y0 = np.meshgrid(xs, ys)
+    x0, y0 = x0.ravel(), y0.ravel()
+    return np.stack([x0, y0, np.minimum(x0 + tile, width), np.minimum(y0 + tile, height)], axis=1)
+
+def nms(boxes: np.ndarray, scores: np.ndarray, classes: np.ndarray, iou: float) -> np.ndarray:
+    """NMS по классам: индексы оставленных рамок по убыванию уверенности.
+    Рамки разных классов сдвигаются так, чтобы не пересекаться, - один проход на все классы;
+    IoU лучшей рамки считается сразу со всеми оставшимися"""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    shifted = boxes + (classes.astype(boxes.dtype) * (boxes.max() + 1))[:, None]
+    x1, y1, x2, y2 = shifted.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        w = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        inter = w * h
+        order = rest[inter / np.maximum(areas[best] + areas[rest] - inter, 1e-9) <= iou]
+    return np.array(keep, dtype=np.int64)
+
+def merge_detections(parts: List[dict], offsets: np.ndarray, iou: float) -> dict:
+    """Детекции тайлов (в координатах тайла) -> детекции фото после NMS"""
+    xyxy = np.concatenate([part["xyxy"] + np.tile(offset, 2) for part, offset in zip(parts, offsets)])
+    conf = np.concatenate([part["conf"] for part in parts])
+    cls = np.concatenate([part["cls"] for part in parts])
+    keep = nms(xyxy.astype(np.float32), conf, cls, iou)
+    return {"xyxy": xyxy[keep], "conf": conf[keep], "cls": cls[keep], "names": parts[0]["names"]}
+
+def slice_images(images: List[np.ndarray], config: SliceConfig) -> Tuple[List[np.ndarray], List[np.ndarray], List[slice]]:
+    """Кадры для predict: каждое фото целиком + его тайлы. Возвращает кадры,
+    смещения кадров (x, y) по фото и срез кадров каждого фото"""
+    crops, offsets, spans = [], [], []
+    for image in images:
+        height, width = image.shape[:2]
+        start = len(crops)
+        crops.append(image)
+        image_offsets = [(0, 0)]
+        if max(width, height) >= config.min_side:
+            for x0, y0, x1, y1 in tile_grid(width, height, config.tile_size, config.overlap):
+                crops.append(image[y0:y1, x0:x1])
+                image_offsets.append((x0, y0))
+        offsets.append(np.array(image_offsets, dtype=np.float32))
+        spans.append(slice(start, len(crops)))
+    return crops, offsets, spans
+
+def predict_sliced(model, images: List[np.ndarray], conf: float, imgsz: int, config: SliceConfig) -> List[dict]:
+    """Как predict, но фото большого размера анализируются по тайлам: кадры всего батча
+    идут в predict пачками по max_batch, результаты склеиваются перед слиянием"""
+    crops, offsets, spans = slice_images(images, config)
+    step = max(1, config.max_batch)
+    detections = []
+    for start in range(0, len(crops), step):
+        detections.extend(predict(model, crops[start:start + step], conf, imgsz))
+    return [
+        merge_detections(detections[span], image_offsets, config.iou)
+        for span, image_offsets in zip(spans, offsets)
+    ]
@@ -0,0 +1,206 @@
+# Разбор видео с регистратора инспектора. Кадры читаются по одному (grab без
+# декодирования, декодируются только отобранные), отбор - по времени или по
+# пройденному расстоянию (GPS-трек), кадры-дубли (машина стоит) отсекаются
+# перцептивным хэшем. Детекции одного дефекта на подряд идущих кадрах
+# (сопоставляются по рамкам) склеиваются в трек - из трека получается одна проблема.
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from ..core.geo import haversine_km
+
+class Frame(NamedTuple):
+    index: int # номер кадра в видео
+    seconds: float
+    image: np.ndarray
+    position: Optional[Tuple[float, float]] # (lat, lon), если есть трек
+
+class VideoSource:
+    """Кадры видеофайла: по одному (номер, время), изображение - только по запросу"""
+    def __init__(self, path: str):
+        import cv2
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Не удалось открыть видео")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        import cv2
+        index = 0
+        while self.capture.grab(): # кадр читается, но не декодируется
+            msec = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+            yield index, msec / 1000 if msec > 0 or index == 0 else index / self.fps
+            index += 1
+
+    def image(self) -> Optional[np.ndarray]:
+        ok, image = self.capture.retrieve()
+        return image if ok else None
+
+    def close(self):
+        self.capture.release()
+
+class ImageSequenceSource:
+    """Серия фото (таймлапс регистратора) как видео: фото i снято через i * interval сек."""
+    def __init__(self, files: List[BinaryIO], interval: float):
+        self.files = files
+        self.interval = interval
+        self._current = None
+
+    def __iter__(self) -> Iterator[Tuple[int, float]]:
+        for index, file in enumerate(self.files):
+            self._current = file
+            yield index, index * self.interval
+
+    def image(self) -> Optional[np.ndarray]:
+        import cv2
+        self._current.seek(0)
+        return cv2.imdecode(np.frombuffer(self._current.read(), dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    def close(self):
+        pass
+
+class GpsTrack:
+    """Положение на момент кадра - линейная интерполяция между точками трека"""
+    def __init__(self, points: List[Tuple[float, float, float]]): # (сек., lat, lon)
+        self.t, self.lat, self.lon = np.array(sorted(points), dtype=np.float64).T
+
+    def position(self, seconds: float) -> Tuple[float, float]:
+        return float(np.interp(seconds, self.t, self.lat)), float(np.interp(seconds, self.t, self.lon))
+
+def distance_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return haversine_km(a[0], a[1], b[0], b[1]) * 1000
+
+def dhash(image: np.ndarray, size: int = 8) -> int:
+    """Перцептивный хэш (difference hash): знаки разности соседних пикселей
+    уменьшенного серого кадра, size * size бит. У похожих кадров хэши близки"""
+    import cv2
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), "big")
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+class FrameSampler:
+    """Отбор кадров для модели: не чаще раза в interval сек. (с треком - раз в
+    distance м) и без дублей: кадр, чей dHash отличается от последнего
+    отобранного не больше чем на hash_distance бит, пропускается"""
+    def __init__(self, interval: float, distance: Optional[float] = None, hash_distance: int = 6,
+                 track: Optional[GpsTrack] = None):
+        self.interval = interval
+        self.distance = distance if track else None
+        self.hash_distance = hash_distance
+        self.track = track
+        self.frames = self.sampled = self.duplicates = 0
+
+    def _due(self, seconds: float, position, last_seconds, last_position) -> bool:
+        if last_seconds is None:
+            return True
+        if self.distance:
+            return distance_m(position, last_position) >= self.distance
+        return seconds - last_seconds >= self.interval
+
+    def sample(self, source) -> Iterator[Frame]:
+        last_seconds = last_position = last_hash = None
+        for index, seconds in source:
+            self.frames += 1
+            position = self.track.position(seconds) if self.track else None
+            if not self._due(seconds, position, last_seconds, last_position):
+                continue
+            image = source.image()
+            if image is None:
+                continue
+            # время сдвигается и для дублей: пока машина стоит, кадры декодируются не чаще interval
+            last_seconds, last_position = seconds, position
+            frame_hash = dhash(image)
+            if last_hash is not None and hamming(frame_hash, last_hash) <= self.hash_distance:
+                self.duplicates += 1
+                continue
+            last_hash = frame_hash
+            self.sampled += 1
+            yield Frame(index, seconds, image, position)
+
+def box_iou(a: List[float], b: List[float]) -> float:
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+def centre_shift(a: List[float], b: List[float]) -> float:
+    """Смещение центра рамки b от центра a в долях диагонали a"""
+    dx = (b[0] + b[2] - a[0] - a[2]) / 2
+    dy = (b[1] + b[3] - a[1] - a[3]) / 2
+    return float(np.hypot(dx, dy) / max(np.hypot(a[2] - a[0], a[3] - a[1]), 1e-9))
+
+class DefectTrack:
+    """Один дефект на нескольких кадрах подряд; для проблемы берётся кадр
+    с самой уверенной детекцией"""
+    def __init__(self, frame: Frame, defect: dict):
+        self.type = defect["type"]
+        self.first_seen = frame.seconds
+        self.frames = 0
+        self.confidence = -1.0
+        self.update(frame, defect)
+
+    def update(self, frame: Frame, defect: dict):
+        self.frames += 1
+        self.last_seen, self.last_position = frame.seconds, frame.position
+        self.box = defect["bbox"] # рамка на последнем кадре - с ней сравниваются детекции следующего
+        if defect["confidence"] > self.confidence:
+            self.confidence, self.best, self.defects = defect["confidence"], frame, [defect]
+
+class DefectAggregator:
+    """Склейка детекций по кадрам: детекция продолжает открытый трек того же типа,
+    если её рамка пересекается с рамкой трека на прошлом кадре (IoU не меньше iou)
+    или сдвинута не больше чем на shift диагоналей рамки; перерыв - не больше gap сек.,
+    смещение машины - не больше distance м. Каждая детекция кадра - в свой трек,
+    поэтому два дефекта одного типа в кадре - две проблемы"""
+    def __init__(self, gap: float, distance: float, iou: float = 0.1, shift: float = 1.0):
+        self.gap = gap
+        self.distance = distance
+        self.iou = iou
+        self.shift = shift
+        self.open: List[DefectTrack] = []
+
+    def _ended(self, track: DefectTrack, frame: Frame) -> bool:
+        if frame.seconds - track.last_seen > self.gap:
+            return True
+        return frame.position is not None and track.last_position is not None \
+            and distance_m(frame.position, track.last_position) > self.distance
+
+    def _pairs(self, defects: List[dict]) -> List[Tuple[float, float, int, int]]:
+        """Возможные пары (трек, детекция): сначала с большим IoU, затем с меньшим сдвигом"""
+        pairs = []
+        for track_index, track in enumerate(self.open):
+            for defect_index, defect in enumerate(defects):
+                if defect["type"] != track.type:
+                    continue
+                iou = box_iou(track.box, defect["bbox"])
+                shift = centre_shift(track.box, defect["bbox"])
+                if iou >= self.iou or shift <= self.shift:
+                    pairs.append((-iou, shift, track_index, defect_index))
+        return sorted(pairs)
+
+    def add(self, frame: Frame, analysis: dict) -> List[DefectTrack]:
+        """Учитывает детекции кадра; возвращает завершившиеся треки"""
+        closed, still_open = [], []
+        for track in self.open:
+            (closed if self._ended(track, frame) else still_open).append(track)
+        self.open = still_open
+
+        defects = analysis["defects"]
+        matched_tracks, matched_defects = set(), set()
+        for _, _, track_index, defect_index in self._pairs(defects): # жадно, лучшие пары первыми
+            if track_index in matched_tracks or defect_index in matched_defects:
+                continue
+            matched_tracks.add(track_index)
+            matched_defects.add(defect_index)
+            self.open[track_index].update(frame, defects[defect_index])
+        self.open.extend(
+            DefectTrack(frame, defect) for index, defect in enumerate(defects) if index not in matched_defects
+        )
+        return closed
+
+    def finish(self) -> List[DefectTrack]:
+        closed = sorted(self.open, key=lambda track: track.first_seen)
+        self.open = []
+        return closed
@@ -0,0 +1,166 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+from itertools import islice
+from pathlib import Path
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException, UploadFile
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import Headers
+from ..core.config import (
+    ML_BATCH_MAX_SIZE, VIDEO_MAX_SIZE, VIDEO_SAMPLE_INTERVAL, VIDEO_SAMPLE_DISTANCE, VIDEO_HASH_DISTANCE,
+    VIDEO_TRACK_GAP, VIDEO_TRACK_DISTANCE, VIDEO_TRACK_IOU, VIDEO_TRACK_SHIFT
+)
+from ..models.models import ProblemType
+from ..repositories.detection_repo import AsyncDetectionRepository
+from ..schemas.schemas import ProblemCreate, TrackPoint
+from .image_service import AsyncImageService, HASH_CHUNK_SIZE
+from .ml_service import ml_service
+from .problem_service import AsyncProblemService
+from .video_sampling import (
+    DefectAggregator, DefectTrack, FrameSampler, GpsTrack, ImageSequenceSource, VideoSource
+)
+
+def parse_track(value: str) -> GpsTrack:
+    try:
+        points = TypeAdapter(List[TrackPoint]).validate_json(value)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Неверный GPS-трек: {e.errors()[0]['msg']}")
+    if not points:
+        raise HTTPException(status_code=400, detail="GPS-трек пуст")
+    return GpsTrack([(point.t, point.lat, point.lon) for point in points])
+
+def spool_video(file, suffix: str) -> str:
+    """Видео из загрузки - во временный файл (OpenCV открывает только путь), частями и с лимитом размера"""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as out:
+        size = 0
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            size += len(chunk)
+            if size > VIDEO_MAX_SIZE:
+                break
+            out.write(chunk)
+    if size > VIDEO_MAX_SIZE:
+        os.unlink(out.name)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Видео слишком большое. Максимум {VIDEO_MAX_SIZE // 1024 // 1024}MB"
+        )
+    return out.name
+
+def encode_jpeg(image) -> bytes:
+    import cv2
+    ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Не удалось закодировать кадр")
+    return buffer.tobytes()
+
+def event(data: dict) -> bytes:
+    """Строка NDJSON - клиент получает события по мере появления"""
+    return (json.dumps(data, ensure_ascii=False) + "\n").encode()
+
+class VideoIngestService:
+    """Разбор видео (или серии фото) с регистратора инспектора. Отобранные кадры
+    идут в общий батч модели, каждый найденный дефект (трек детекций) - одна
+    проблема с лучшим кадром и его детекциями. Результат - поток событий:
+    problem по мере нахождения, progress после каждого батча, done в конце"""
+    def __init__(self, db: AsyncSession):
+        self.problem_service = AsyncProblemService(db)
+        self.image_service = AsyncImageService(db)
+        self.detection_repo = AsyncDetectionRepository(db)
+        self.source = None
+        self._video_path: Optional[str] = None
+
+    async def prepare(self, files: List[UploadFile], problem_data: ProblemCreate,
+                      track: Optional[str] = None, frame_interval: float = 1.0):
+        """Проверки до начала ответа (ошибки - обычным HTTP-статусом): модель, трек, файлы"""
+        ml_service.ensure_ready()
+        self.problem_data = problem_data
+        gps = parse_track(track) if track else None
+        self.sampler = FrameSampler(VIDEO_SAMPLE_INTERVAL, VIDEO_SAMPLE_DISTANCE, VIDEO_HASH_DISTANCE, gps)
+
+        if len(files) == 1 and (files[0].content_type or "").startswith("video/"):
+            video = files[0]
+            self.name = Path(video.filename or "video").stem
+            self._video_path = await asyncio.to_thread(spool_video, video.file, Path(video.filename or "").suffix)
+            try:
+                self.source = await asyncio.to_thread(VideoSource, self._video_path)
+            except ValueError as e:
+                self.close()
+                raise HTTPException(status_code=400, detail=str(e))
+            return
+
+        if frame_interval <= 0:
+            raise HTTPException(status_code=400, detail="frame_interval должен быть больше 0")
+        for file in files: # серия фото: каждый файл - кадр
+            self.image_service.validate_file(file)
+        files = sorted(files, key=lambda file: file.filename or "")
+        self.name = Path(files[0].filename or "frames").stem
+        self.source = ImageSequenceSource([file.file for file in files], frame_interval)
+
+    async def stream(self, current_user) -> AsyncIterator[bytes]:
+        frames = self.sampler.sample(self.source)
+        take = lambda: list(islice(frames, ML_BATCH_MAX_SIZE)) # декодирование - вне event loop
+        aggregator = DefectAggregator(VIDEO_TRACK_GAP, VIDEO_TRACK_DISTANCE, VIDEO_TRACK_IOU, VIDEO_TRACK_SHIFT)
+        problems = 0
+        next_batch = asyncio.ensure_future(asyncio.to_thread(take))
+        try:
+            while batch := await next_batch:
+                next_batch = asyncio.ensure_future(asyncio.to_thread(take)) # следующие кадры - пока идёт инференс
+                analyses = await ml_service.detect_frames([frame.image for frame in batch])
+                for frame, analysis in zip(batch, analyses):
+                    for track in aggregator.add(frame, analysis):
+                        yield event(await self._create_problem(track, current_user))
+                        problems += 1
+                yield event({
+                    "event": "progress", "seconds": round(batch[-1].seconds, 3), "frames": self.sampler.frames,
+                    "sampled": self.sampler.sampled, "duplicates": self.sampler.duplicates
+                })
+            for track in aggregator.finish():
+                yield event(await self._create_problem(track, current_user))
+                problems += 1
+            yield event({
+                "event": "done", "frames": self.sampler.frames, "sampled": self.sampler.sampled,
+                "duplicates": self.sampler.duplicates, "problems": problems
+            })
+        except HTTPException as e: # заголовки уже отправлены - ошибка идёт событием
+            yield event({"event": "error", "detail": e.detail, "problems": problems})
+        except Exception as e:
+            print(f"Ошибка разбора видео: {e}")
+            yield event({"event": "error", "detail": "Ошибка обработки видео", "problems": problems})
+        finally:
+            await asyncio.gather(next_batch, return_exceptions=True) # источник не закрываем посреди чтения
+            await asyncio.to_thread(self.close)
+
+    async def _create_problem(self, track: DefectTrack, current_user) -> dict:
+        frame = track.best
+        lat, lon = frame.position or (self.problem_data.lat, self.problem_data.lon)
+        problem_data = self.problem_data.model_copy(update={
+            "type": ProblemType(track.type), "lat": lat, "lon": lon,
+            "description": self.problem_data.description or
+                f"Обнаружено на видео {self.name}: {track.first_seen:.1f}-{track.last_seen:.1f} с, кадров: {track.frames}"
+        })
+        problem = await self.problem_service.create_problem(problem_data, current_user)
+
+        content = await asyncio.to_thread(encode_jpeg, frame.image)
+        photo = UploadFile(
+            io.BytesIO(content), size=len(content), filename=f"{self.name}_{frame.seconds:.1f}s.jpg",
+            headers=Headers({"content-type": "image/jpeg"})
+        )
+        stored = await self.image_service.store_upload(photo, current_user.id, problem.id)
+        image = await self.image_service.attach_upload(problem.id, photo, current_user.id, stored)
+        await self.detection_repo.bulk_create(image["id"], problem.id, track.defects, ml_service.model_version)
+        return {
+            "event": "problem", "problem_id": problem.id, "type": track.type, "image_id": image["id"],
+            "url": image["url"], "first_seen": round(track.first_seen, 3), "last_seen": round(track.last_seen, 3),
+            "frames": track.frames, "confidence": track.confidence, "lat": lat, "lon": lon
+        }
+
+    def close(self):
+        if self.source:
+            self.source.close()
+        if self._video_path:
+            os.unlink(self._video_path)
+            self._video_path = None
@@ -1,63 +1,135 @@
 import aiohttp
-import os
-from typing import Dict, List, Any
+import asyncio
+import re
+from typing import Dict, List, Any, Optional
+from ..core.cache import TTLCache, create_cache_store
+from ..core.config import (
+    YANDEX_MAPS_API_KEY, YANDEX_GEOCODE_URL, GEOCODE_TIMEOUT, GEOCODE_POOL_SIZE,
+    GEOCODE_CACHE_SIZE, GEOCODE_CACHE_TTL, GEOCODE_CACHE_URL
+)
+
+def normalize_query(query: str) -> str:
+    """Ключ кэша: регистр, пробелы и пунктуация по краям не влияют на ответ геокодера"""
+    return re.sub(r"\s+", " ", query.lower().replace("ё", "е")).strip(" ,.;")
 
 class YandexMapsService:
-    def __init__(self):
-        self.api_key = os.getenv("YANDEX_MAPS_API_KEY", "")
-                
+    """Геокодер Яндекс.Карт. Один экземпляр на всё приложение: общая сессия
+    aiohttp с пулом соединений, кэш ответов (память + опционально Redis/SQLite)
+    и объединение одинаковых запросов, которые выполняются одновременно."""
+    def __init__(self, api_key: Optional[str] = None, geocode_url: Optional[str] = None,
+                 cache_size: int = GEOCODE_CACHE_SIZE, cache_ttl: float = GEOCODE_CACHE_TTL,
+                 store=None):
+        self.api_key = YANDEX_MAPS_API_KEY if api_key is None else api_key
+
         if not self.api_key:
             print("Ключ не найден. Проверь .env файл и docker-compose.yml")
-        
-        self.geocode_url = "https://geocode-maps.yandex.ru/1.x/"
-        
+
+        self.geocode_url = geocode_url or YANDEX_GEOCODE_URL
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.store = store
+        self.upstream_calls = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
         print(f"Яндекс.Карты сервис инициализирован (режим: геокодер)")
-    
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop: # сессия и ожидающие запросы привязаны к event loop
+            self._session, self._loop = None, loop
+            self._in_flight.clear()
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=GEOCODE_POOL_SIZE, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=GEOCODE_TIMEOUT)
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self.store is not None:
+            await self.store.close()
+
     async def suggest_address(self, query: str) -> List[Dict[str, Any]]:
         if not query or len(query) < 3:
             return []
-        
-        url = f"{self.geocode_url}?apikey={self.api_key}&geocode={query}&format=json&results=5"
-        
+
+        await self.start()
+        key = normalize_query(query)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        future = self._in_flight.get(key)
+        if future is None: # первый такой запрос - остальные ждут его результат
+            future = asyncio.ensure_future(self._load(key, query))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return list(await asyncio.shield(future))
+
+    async def _load(self, key: str, query: str) -> List[Dict[str, Any]]:
+        if self.store is not None:
+            try:
+                stored = await self.store.get(key)
+            except Exception as e:
+                print(f"Ошибка чтения кэша геокодера: {e}")
+                stored = None
+            if stored is not None:
+                self.cache.set(key, stored)
+                return stored
+
+        suggestions = await self._request(query)
+        if suggestions is None: # ошибки не кэшируем
+            return []
+        self.cache.set(key, suggestions)
+        if self.store is not None:
+            try:
+                await self.store.set(key, suggestions, self.cache.ttl)
+            except Exception as e:
+                print(f"Ошибка записи кэша геокодера: {e}")
+        return suggestions
+
+    async def _request(self, query: str) -> Optional[List[Dict[str, Any]]]:
+        params = {"apikey": self.api_key, "geocode": query, "format": "json", "results": 5}
+        self.upstream_calls += 1
+
         try:
-            print(f"URL запроса: {url}")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=5) as response:
-                    
-                    if response.status == 200:
-                        data = await response.json()
-                        return self._parse_geocode_response(data)
-                    else:
-                        error_text = await response.text()
-                        print(f"Ошибка API: {response.status} - {error_text}")
-                        return []
-                        
+            async with self._session.get(self.geocode_url, params=params) as response:
+
+                if response.status == 200:
+                    data = await response.json()
+                    return self._parse_geocode_response(data)
+                else:
+                    error_text = await response.text()
+                    print(f"Ошибка API: {response.status} - {error_text}")
+                    return None
+
         except Exception as e:
             print(f"Ошибка при запросе: {e}")
-            return []
-    
+            return None
+
     def _parse_geocode_response(self, data: Dict) -> List[Dict[str, Any]]:
         """
         Парсит ответ от Геокодера в формат для автокомплита
         """
         suggestions = []
-        
+
         try:
             features = data.get("response", {}).get("GeoObjectCollection", {}).get("featureMember", [])
-            print(f"Получено результатов: {len(features)}")
-            
+
             for feature in features:
                 geo = feature.get("GeoObject", {})
                 name = geo.get("name", "")
                 description = geo.get("description", "")
                 pos = geo.get("Point", {}).get("pos", "").split(" ") # Координаты
-                
+
                 if description:
                     full_address = f"{name}, {description}" # Формируем понятный адрес
                 else:
                     full_address = name
-                
+
                 suggestion = {
                     "address": full_address,
                     "display": name,
@@ -65,15 +137,17 @@ class YandexMapsService:
                     "lat": float(pos[1]) if len(pos) == 2 else None,
                     "lon": float(pos[0]) if len(pos) == 2 else None
                 }
-                
+
                 suggestions.append(suggestion)
-                
+
         except Exception as e:
             print(f"Ошибка парсинга ответа: {e}")
-        
+
         return suggestions
-    
+
     async def geocode_address(self, address: str) -> Dict[str, Any]:
         """Получение координат по полному адресу"""
         results = await self.suggest_address(address)
-        return results[0] if results else {}
\ No newline at end of file
+        return results[0] if results else {}
+
+yandex_maps_service = YandexMapsService(store=create_cache_store(GEOCODE_CACHE_URL, "geocode")) # глобальный экземпляр
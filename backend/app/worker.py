@@ -0,0 +1,29 @@
+"""Воркер повторного анализа фото: python -m app.worker [--once] [--batch-size N]
+
+Масштабируется запуском нескольких процессов (docker compose up --scale reanalysis-worker=N)"""
+import argparse
+from .services.ml_service import ml_service
+from .services.reanalysis_service import ReanalysisWorker
+
+def main():
+    parser = argparse.ArgumentParser(description="Воркер очереди повторного анализа фото")
+    parser.add_argument("--once", action="store_true", help="выйти, когда очередь опустеет")
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+
+    ml_service.load()
+    if not ml_service.available:
+        raise SystemExit("Модель недоступна, воркер не запущен")
+
+    worker = ReanalysisWorker(**({"batch_size": args.batch_size} if args.batch_size else {}))
+    print(f"Воркер {worker.worker_id} запущен, версия модели: {worker.model_version}")
+    try:
+        processed = worker.run(once=args.once)
+        print(f"Очередь пуста, обработано {processed} фото")
+    except KeyboardInterrupt:
+        print("Воркер остановлен") # незавершённые задачи заберут другие воркеры после истечения аренды
+    finally:
+        worker.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Сравнение задержки инференса по бэкендам (pytorch / onnx / openvino / torchscript).
+
+    python benchmark_backends.py --backends pytorch onnx openvino --sizes 640x480 1280x960 1920x1080
+
+Веса - MODEL_PATH, экспорт делается при первом запуске и переиспользуется."""
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+from app.core.config import MODEL_PATH, ML_CONFIDENCE, ML_IMAGE_SIZE
+from app.services.inference_backends import BACKENDS, load_backend_model
+from app.services.inference_worker import predict
+
+def parse_size(value: str):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+def load_images(folder: str, size):
+    import cv2
+    images = [cv2.imread(str(p)) for p in sorted(Path(folder).glob("*.jpg"))]
+    return [cv2.resize(image, size) for image in images if image is not None]
+
+def measure(model, images, repeats: int, batch: int, imgsz: int):
+    predict(model, images[:batch], ML_CONFIDENCE, imgsz) # прогрев
+    timings = []
+    for i in range(repeats):
+        chunk = [images[(i * batch + j) % len(images)] for j in range(batch)]
+        start = time.perf_counter()
+        predict(model, chunk, ML_CONFIDENCE, imgsz)
+        timings.append((time.perf_counter() - start) * 1000 / batch)
+    return np.percentile(timings, 50), np.percentile(timings, 95)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк бэкендов инференса")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1280x960", "1920x1080"], help="размер фото, ШxВ")
+    parser.add_argument("--imgsz", type=int, default=ML_IMAGE_SIZE, help="размер входа модели")
+    parser.add_argument("--images", default=None, help="папка с .jpg (по умолчанию - случайный шум)")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'бэкенд':<12} {'фото':>10} {'p50, мс':>9} {'p95, мс':>9}")
+    for backend in args.backends:
+        try:
+            model = load_backend_model(args.model, backend, args.imgsz)
+        except Exception as e:
+            print(f"{backend:<12} недоступен: {e}")
+            continue
+        for size in args.sizes:
+            width, height = parse_size(size)
+            images = load_images(args.images, (width, height)) if args.images else \
+                [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+            p50, p95 = measure(model, images, args.repeats, args.batch, args.imgsz)
+            print(f"{backend:<12} {size:>10} {p50:>9.1f} {p95:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Микробенчмарк разбора результатов YOLO: поштучный цикл (как было) против векторного parse_result.
+
+    python benchmark_postprocess.py --boxes 10 100 500 1000"""
+import argparse
+import time
+import numpy as np
+from app.schemas.schemas import DefectDetection
+from app.services.ml_service import MLService
+
+NAMES = {0: "D00", 1: "D10", 2: "D20", 3: "D40"}
+MAPPING = {'D00': 'long_crack', 'D10': 'transverse_crack', 'D20': 'alligator_crack', 'D40': 'pothole'}
+
+def loop_parse(detections: dict) -> dict:
+    """Прежняя реализация: DefectDetection на каждую рамку, словарь для счёта типов"""
+    defects, detected_types = [], set()
+    for xyxy, confidence, class_id in zip(detections["xyxy"], detections["conf"], detections["cls"]):
+        x1, y1, x2, y2 = map(int, xyxy)
+        class_name = detections["names"][int(class_id)]
+        problem_type = dict(MAPPING).get(class_name, 'other')
+        defects.append(DefectDetection(type=problem_type, confidence=float(confidence),
+                                       bbox=[x1, y1, x2, y2], class_name=class_name))
+        detected_types.add(problem_type)
+    type_counts = {}
+    for defect in defects:
+        type_counts[defect.type] = type_counts.get(defect.type, 0) + 1
+    return {
+        "defects": [defect.model_dump() for defect in defects],
+        "detected_types": list(detected_types),
+        "dominant_type": max(type_counts, key=type_counts.get) if defects else None,
+        "confidence": defects[0].confidence if defects else None
+    }
+
+def timeit(func, detections, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(detections)
+    return (time.perf_counter() - start) * 1e6 / repeats
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора результатов детекции")
+    parser.add_argument("--boxes", nargs="+", type=int, default=[10, 100, 500, 1000])
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    service = MLService()
+    rng = np.random.default_rng(0)
+    print(f"{'рамок':>6} {'цикл, мкс':>11} {'вектор, мкс':>12} {'ускорение':>10}")
+    for n in args.boxes:
+        xy = rng.uniform(0, 3000, (n, 2))
+        detections = {
+            "xyxy": np.concatenate([xy, xy + rng.uniform(5, 300, (n, 2))], axis=1).astype(np.float32),
+            "conf": np.sort(rng.uniform(0.3, 1, n).astype(np.float32))[::-1],
+            "cls": rng.integers(0, 4, n),
+            "names": NAMES
+        }
+        loop = timeit(loop_parse, detections, args.repeats)
+        vector = timeit(service.parse_result, detections, args.repeats)
+        print(f"{n:>6} {loop:>11.1f} {vector:>12.1f} {loop / vector:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
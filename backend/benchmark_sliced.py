@@ -0,0 +1,83 @@
+"""Нарезанный инференс против обычного: задержка и полнота (recall) по классам
+на размеченных фото ml_module/test_data (images/*.jpg + labels/*.txt в формате YOLO).
+
+    python benchmark_sliced.py --tile-sizes 640 960 --overlap 0.2"""
+import argparse
+import time
+from pathlib import Path
+import numpy as np
+from app.core.config import MODEL_PATH, ML_CONFIDENCE, ML_IMAGE_SIZE, ML_SLICE_MIN_SIDE, ML_SLICE_NMS_IOU
+from app.services.inference_backends import load_backend_model
+from app.services.inference_worker import predict
+from app.services.sliced_inference import SliceConfig, predict_sliced
+
+DEFAULT_DATA = Path(MODEL_PATH).parents[3] / "test_data"
+
+def load_labels(path: Path, width: int, height: int) -> np.ndarray:
+    """YOLO-разметка (cls cx cy w h, доли) -> [[cls, x1, y1, x2, y2]] в пикселях"""
+    if not path.exists():
+        return np.zeros((0, 5))
+    rows = np.loadtxt(path, ndmin=2)
+    cls, cx, cy, w, h = rows.T
+    return np.stack([cls, (cx - w / 2) * width, (cy - h / 2) * height,
+                     (cx + w / 2) * width, (cy + h / 2) * height], axis=1)
+
+def matched(labels: np.ndarray, detections: dict, iou: float = 0.5) -> np.ndarray:
+    """Какие размеченные рамки найдены (тот же класс, IoU >= iou)"""
+    found = np.zeros(len(labels), dtype=bool)
+    for i, (cls, *box) in enumerate(labels):
+        same = detections["xyxy"][detections["cls"] == int(cls)]
+        if len(same) == 0:
+            continue
+        lt = np.maximum(same[:, :2], box[:2])
+        rb = np.minimum(same[:, 2:], box[2:])
+        inter = np.prod(np.clip(rb - lt, 0, None), axis=1)
+        area = (box[2] - box[0]) * (box[3] - box[1])
+        areas = np.prod(same[:, 2:] - same[:, :2], axis=1)
+        found[i] = (inter / (area + areas - inter)).max() >= iou
+    return found
+
+def evaluate(run, images, labels, names):
+    latencies, found, classes = [], [], []
+    for image, image_labels in zip(images, labels):
+        start = time.perf_counter()
+        detections = run([image])[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(matched(image_labels, detections))
+        classes.append(image_labels[:, 0].astype(int))
+    found, classes = np.concatenate(found), np.concatenate(classes)
+    recall = {names[c]: found[classes == c].mean() for c in np.unique(classes)}
+    return np.percentile(latencies, 50), found.mean() if len(found) else 0.0, recall
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк нарезанного инференса")
+    parser.add_argument("--data", default=str(DEFAULT_DATA))
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--tile-sizes", nargs="+", type=int, default=[640])
+    parser.add_argument("--overlap", type=float, default=0.2)
+    parser.add_argument("--limit", type=int, default=50, help="сколько фото взять")
+    args = parser.parse_args()
+
+    import cv2
+    paths = sorted((Path(args.data) / "images").glob("*.jpg"))[:args.limit]
+    if not paths:
+        raise SystemExit(f"Нет фото в {args.data}/images")
+    images = [cv2.imread(str(p)) for p in paths]
+    labels = [load_labels(Path(args.data) / "labels" / f"{p.stem}.txt", im.shape[1], im.shape[0])
+              for p, im in zip(paths, images)]
+
+    model = load_backend_model(args.model)
+    names = predict(model, images[:1], ML_CONFIDENCE, ML_IMAGE_SIZE)[0]["names"] # и прогрев
+    modes = [("целиком", lambda batch: predict(model, batch, ML_CONFIDENCE, ML_IMAGE_SIZE))]
+    for tile in args.tile_sizes:
+        config = SliceConfig(tile, args.overlap, ML_SLICE_NMS_IOU, min(ML_SLICE_MIN_SIDE, tile))
+        modes.append((f"тайлы {tile}", lambda batch, c=config: predict_sliced(model, batch, ML_CONFIDENCE, ML_IMAGE_SIZE, c)))
+
+    print(f"Фото: {len(images)}, размеченных рамок: {sum(len(l) for l in labels)}")
+    for title, run in modes:
+        p50, recall, per_class = evaluate(run, images, labels, names)
+        classes = ", ".join(f"{name} {value:.2f}" for name, value in per_class.items())
+        print(f"{title:<12} p50 {p50:8.1f} мс  recall {recall:.3f}  ({classes})")
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import pytest
+import pytest_asyncio
 import sys
 import os
 
@@ -11,16 +12,21 @@ class MockMagic: # мок для python-magic для избежания ошиб
 
 sys.modules['magic'] = MockMagic() # подменяем модуль magic до импорта
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from fastapi.testclient import TestClient
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # путь к app
 
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db, to_async_url
 from app.main import app
 from app.core.security import get_password_hash
 from app.models.models import User, UserRole
+from app.services.cluster_service import cluster_cache
+from app.core.address_index import address_index
+from app.services.image_variants import image_variant_pool
 
 from dotenv import load_dotenv
 load_dotenv('.env.test')
@@ -28,6 +34,12 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db") # т
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient запускает каждый запрос в своём event loop, поэтому без пула соединений
+async_engine = create_async_engine(to_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 def override_get_db():
     try:
         db = TestingSessionLocal()
@@ -35,7 +47,13 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+image_variant_pool.enabled = False # варианты фото в тестах генерируются явно
 
 @pytest.fixture
 def db():
@@ -46,6 +64,24 @@ def db():
     finally:
         db.close()
         Base.metadata.drop_all(bind=engine)
+        cluster_cache.clear() # тайлы кластеров и индекс адресов ссылаются на уже удалённые данные
+        address_index.clear()
+
+@pytest.fixture
+def query_counter(db): # SQL-запросы к тестовой БД, выполненные внутри теста
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+@pytest_asyncio.fixture
+async def async_db(db):
+    async with TestingAsyncSessionLocal() as session:
+        yield session
 
 @pytest.fixture
 def client(db):
@@ -107,6 +143,20 @@ def test_contractor(db):
     db.refresh(user)
     return user
 
+@pytest.fixture
+def test_inspector(db):
+    user = User(
+        email="inspector@example.com",
+        name="Inspector",
+        hashed_password=get_password_hash("inspector123"),
+        role=UserRole.INSPECTOR,
+        is_active=True
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
 @pytest.fixture
 def auth_headers(client, test_user):
     response = client.post("/auth/login", json={
@@ -132,4 +182,13 @@ def contractor_auth_headers(client, test_contractor):
         "password": "contractor123"
     })
     token = response.json()["access_token"]
-    return {"Authorization": f"Bearer {token}"}
\ No newline at end of file
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def inspector_auth_headers(client, test_inspector):
+    response = client.post("/auth/login", json={
+        "email": "inspector@example.com",
+        "password": "inspector123"
+    })
+    token = response.json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,56 @@
+from app.core.address_index import AddressIndex
+from app.services.yandex_maps import yandex_maps_service
+
+def test_address_index_prefix_search():
+    index = AddressIndex()
+    index.load([("ул. Тверская, 1", None, None), ("ул. Тверская, 3", 55.75, 37.61), ("Арбат, 10", None, None)])
+    index.add("Тверской бульвар, 5", 55.76, 37.60)
+    index.add("ул. Тверская, 1", 55.757, 37.613) # повтор дополняет координаты
+
+    assert [s["address"] for s in index.search("Твер")] == [
+        "ул. Тверская, 1", "ул. Тверская, 3", "Тверской бульвар, 5"
+    ]
+    assert index.search("ул тверская 1")[0]["lat"] == 55.757
+    assert [s["address"] for s in index.search("тверская 3")] == ["ул. Тверская, 3"]
+    assert index.search("Твер", limit=1) and len(index.search("Твер", limit=1)) == 1
+    assert index.search("Ленина") == []
+    assert len(index) == 4
+
+def test_address_index_evicts_geocoder_results():
+    index = AddressIndex(max_geocoded=2)
+    index.load([("ул. Ленина, 1", None, None)])
+    index.add_suggestions([{"address": f"ул. Ленина, {i}", "lat": 55.0, "lon": 37.0} for i in range(2, 5)])
+    index.add_suggestions([{"address": "ул. Ленина, 3"}]) # повтор продлевает жизнь
+    index.add("ул. Ленина, 4", 55.0, 37.0) # адрес проблемы больше не вытесняется
+    index.add_suggestions([{"address": f"ул. Ленина, {i}"} for i in range(5, 8)])
+
+    assert [s["address"] for s in index.search("ленина")] == [
+        "ул. Ленина, 1", "ул. Ленина, 4", "ул. Ленина, 6", "ул. Ленина, 7"
+    ]
+    assert index.search("ленина 3") == [] and len(index) == 4
+
+def test_address_suggest_uses_local_index(client, auth_headers, monkeypatch):
+    for address in ["ул. Садовая, 1", "ул. Садовая, 2", "ул. Садовая, 3"]:
+        client.post("/problems", headers=auth_headers, json={"address": address, "type": "pothole"})
+
+    async def geocoder_must_not_be_called(query):
+        raise AssertionError("запрос ушёл в геокодер")
+    monkeypatch.setattr(yandex_maps_service, "suggest_address", geocoder_must_not_be_called)
+
+    response = client.get("/api/address-suggest", params={"query": "садовая"})
+    assert response.status_code == 200
+    assert [s["address"] for s in response.json()] == ["ул. Садовая, 1", "ул. Садовая, 2", "ул. Садовая, 3"]
+
+def test_address_suggest_falls_back_to_geocoder(client, auth_headers, monkeypatch):
+    client.post("/problems", headers=auth_headers, json={"address": "ул. Садовая, 1", "type": "pothole"})
+    calls = []
+
+    async def geocoder(query):
+        calls.append(query)
+        return [{"address": "Садовая улица, Москва", "display": "Садовая улица", "subtitle": "Москва",
+                 "lat": 55.76, "lon": 37.63}]
+    monkeypatch.setattr(yandex_maps_service, "suggest_address", geocoder)
+
+    response = client.get("/api/address-suggest", params={"query": "садовая"})
+    assert [s["address"] for s in response.json()] == ["ул. Садовая, 1", "Садовая улица, Москва"]
+    assert calls == ["садовая"]
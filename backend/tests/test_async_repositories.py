@@ -0,0 +1,141 @@
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from fastapi import HTTPException
+from app.models.models import Detection, ProblemStatus, ProblemType
+from app.repositories.problem_repo import AsyncProblemRepository
+from app.repositories.user_repo import AsyncUserRepository
+from app.repositories.refresh_token_repo import AsyncTokenRepository
+from app.schemas.schemas import ProblemCreate
+
+@pytest.mark.asyncio
+async def test_async_user_repository_get_by_email(async_db, test_user):
+    repo = AsyncUserRepository(async_db)
+    user = await repo.get_by_email("test@example.com")
+    assert user.id == test_user.id
+    assert await repo.get_by_email("nobody@example.com") is None
+
+@pytest.mark.asyncio
+async def test_async_token_repository_verify_and_revoke(async_db, test_user):
+    repo = AsyncTokenRepository(async_db)
+    await repo.create_for_user(test_user.id, "refresh-token")
+    assert await repo.verify("refresh-token") == test_user.id
+
+    await repo.revoke("refresh-token")
+    assert await repo.verify("refresh-token") is None
+
+@pytest.mark.asyncio
+async def test_async_problem_repository_crud(async_db, test_user):
+    repo = AsyncProblemRepository(async_db)
+    problem = await repo.create(
+        ProblemCreate(address="ул. Асинхронная, 1", type=ProblemType.POTHOLE), test_user.id, False
+    )
+    assert problem.id is not None
+    assert problem.images_count == 0
+
+    page = await repo.get_filtered(search="Асинхронная", page=1, limit=10)
+    assert page["total"] == 1
+    assert page["items"][0].id == problem.id
+
+    updated = await repo.update_status(problem.id, ProblemStatus.IN_PROGRESS)
+    assert updated.status == ProblemStatus.IN_PROGRESS
+
+    with patch('app.repositories.problem_repo.minio_client', MagicMock()):
+        assert await repo.delete(problem.id) is True
+    assert await repo.get_by_id(problem.id) is None
+
+def test_create_problem_with_image(client, auth_headers):
+    with patch('app.services.image_service.minio_client') as mock_minio:
+        mock_minio.upload_file.return_value = 'problems/1/test.jpg'
+        mock_minio.get_presigned_url.return_value = 'http://localhost:9000/test.jpg'
+
+        response = client.post(
+            "/problems/with-image",
+            headers=auth_headers,
+            data={"address": "ул. Фото, 1", "type": "pothole"},
+            files={"photo": ("test.jpg", b'fake_image_data' * 100, "image/jpeg")}
+        )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["address"] == "ул. Фото, 1"
+    assert data["images_count"] == 1
+
+ANALYSIS = {
+    "defects": [
+        {"type": "pothole", "confidence": 0.91, "bbox": [10, 20, 110, 120], "class_name": "D40"},
+        {"type": "pothole", "confidence": 0.75, "bbox": [200, 40, 260, 90], "class_name": "D40"},
+        {"type": "long_crack", "confidence": 0.6, "bbox": [0, 0, 50, 300], "class_name": "D00"},
+    ],
+    "detected_types": ["pothole", "long_crack"],
+    "dominant_type": "pothole",
+    "confidence": 0.91
+}
+
+def analyze_and_create(client, auth_headers, data):
+    with patch('app.services.image_service.minio_client') as mock_minio:
+        mock_minio.blob_file_key.side_effect = lambda h: f"blobs/{h[:2]}/{h}"
+        mock_minio.upload_file.side_effect = lambda **kwargs: kwargs['file_key']
+        mock_minio.get_presigned_url.return_value = 'http://localhost:9000/test.jpg'
+        return client.post(
+            "/problems/analyze-and-create",
+            headers=auth_headers,
+            data=data,
+            files={"photo": ("road.jpg", b'fake_image_data' * 100, "image/jpeg")}
+        )
+
+def test_analyze_and_create_fills_type_and_saves_detections(client, auth_headers, db):
+    with patch('app.services.problem_service.ml_service.analyze_content', AsyncMock(return_value=ANALYSIS)) as analyze:
+        response = analyze_and_create(client, auth_headers, {"address": "ул. Ямная, 3"})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["problem"]["type"] == "pothole" # dominant_type модели
+    assert data["problem"]["images_count"] == 1
+    assert len(data["analysis"]["defects"]) == 3
+    analyze.assert_awaited_once()
+
+    detections = db.query(Detection).filter(Detection.image_id == data["image_id"]).all()
+    assert len(detections) == 3
+    assert {d.problem_id for d in detections} == {data["problem"]["id"]}
+    assert sorted((d.x1, d.y1, d.x2, d.y2) for d in detections)[0] == (0, 0, 50, 300)
+
+def test_analyze_and_create_without_model(client, auth_headers, db):
+    unavailable = AsyncMock(side_effect=HTTPException(status_code=503, detail="ML сервис временно недоступен"))
+    with patch('app.services.problem_service.ml_service.analyze_content', unavailable):
+        response = analyze_and_create(client, auth_headers, {"address": "ул. Ямная, 5"})
+        explicit = analyze_and_create(client, auth_headers, {"address": "ул. Ямная, 7", "type": "manhole"})
+
+    assert response.status_code == 200
+    assert response.json()["problem"]["type"] == "other"
+    assert response.json()["analysis"] is None
+    assert explicit.json()["problem"]["type"] == "manhole" # заданный тип не перезаписывается
+    assert db.query(Detection).count() == 0
+
+@pytest.mark.parametrize("failing_step", [
+    'app.services.problem_service.AsyncProblemRepository.create', # до записи проблемы
+    'app.services.image_service.AsyncImageService.attach_upload', # проблема создана, фото не записано
+    'app.services.image_service.ImageService._image_url_after_commit', # запись фото уже сохранена
+])
+def test_analyze_and_create_rolls_back_on_failure(client, auth_headers, db, failing_step):
+    from app.models.models import ImageBlob, Problem
+    failing = AsyncMock(side_effect=RuntimeError("db down"))
+    with patch('app.services.problem_service.ml_service.analyze_content', AsyncMock(return_value=ANALYSIS)), \
+         patch('app.services.image_service.minio_client') as mock_minio, \
+         patch('app.repositories.problem_repo.minio_client', mock_minio):
+        mock_minio.blob_file_key.side_effect = lambda h: f"blobs/{h[:2]}/{h}"
+        mock_minio.upload_file.side_effect = lambda **kwargs: kwargs['file_key']
+        if failing_step.endswith('_image_url_after_commit'):
+            mock_minio.get_presigned_url.side_effect = RuntimeError("minio down")
+        else:
+            patch(failing_step, failing).start()
+        try:
+            with pytest.raises(RuntimeError):
+                client.post("/problems/analyze-and-create", headers=auth_headers, data={"address": "ул. Ямная, 9"},
+                            files={"photo": ("road.jpg", b'fake_image_data' * 100, "image/jpeg")})
+        finally:
+            patch.stopall()
+
+        file_key = mock_minio.upload_file.call_args.kwargs['file_key']
+        mock_minio.delete_image_files.assert_called_once_with(file_key) # загруженный объект не остаётся сиротой
+    assert db.query(ImageBlob).count() == 0
+    assert db.query(Problem).count() == 0 # и проблемы без фото тоже нет
@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from app.core.cache import SQLiteCacheStore
+from app.services.detection_cache import DetectionCache
+
+RESULT = {"defects": [{"type": "pothole", "confidence": 0.9, "bbox": [1, 2, 3, 4], "class_name": "D40"}],
+          "detected_types": ["pothole"], "dominant_type": "pothole", "confidence": 0.9}
+
+def test_key_depends_on_model_and_confidence():
+    keys = {
+        DetectionCache.make_key("abc", "v1", 0.3),
+        DetectionCache.make_key("abc", "v2", 0.3),
+        DetectionCache.make_key("abc", "v1", 0.5),
+    }
+    assert len(keys) == 3
+
+@pytest.mark.asyncio
+async def test_get_or_compute_caches_and_coalesces():
+    cache = DetectionCache(max_size=10)
+    calls = []
+
+    async def detect():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return RESULT
+
+    results = await asyncio.gather(*[cache.get_or_compute("k", detect) for _ in range(5)])
+    assert all(r == RESULT for r in results)
+    assert await cache.get_or_compute("k", detect) == RESULT
+    assert len(calls) == 1 # одновременные и повторные запросы - один инференс
+    assert cache.get_metrics()["cache_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached():
+    cache = DetectionCache(max_size=10)
+
+    async def failing():
+        raise ValueError("битое изображение")
+
+    with pytest.raises(ValueError):
+        await cache.get_or_compute("k", failing)
+    assert await cache.get("k") is None
+
+@pytest.mark.asyncio
+async def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "detections.db")
+    await DetectionCache(10, SQLiteCacheStore(path)).set("k", RESULT)
+
+    async def must_not_run():
+        raise AssertionError("результат должен прийти из SQLite")
+
+    cache = DetectionCache(10, SQLiteCacheStore(path))
+    assert await cache.get_or_compute("k", must_not_run) == RESULT
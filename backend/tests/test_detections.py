@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import update
+from app.models.models import Detection
+from app.repositories.detection_repo import DetectionRepository
+from app.repositories.image_repo import ImageRepository
+
+@pytest.fixture
+def detections(db, test_problem, test_user):
+    image = ImageRepository(db).create(
+        problem_id=test_problem.id, file_key="problems/1/road.jpg", original_filename="road.jpg",
+        file_size=100, content_type="image/jpeg", uploaded_by=test_user.id
+    )
+    repo = DetectionRepository(db)
+    repo.bulk_create(image.id, test_problem.id, [
+        {"type": "pothole", "confidence": 0.92, "bbox": [1, 2, 30, 40], "class_name": "D40"},
+        {"type": "pothole", "confidence": 0.71, "bbox": [5, 5, 25, 25], "class_name": "D40"},
+        {"type": "pothole", "confidence": 0.4, "bbox": [0, 0, 10, 10], "class_name": "D40"},
+        {"type": "long_crack", "confidence": 0.8, "bbox": [0, 0, 5, 90], "class_name": "D00"},
+    ], model_version="best.pt:1")
+    # одна старая детекция - за пределами "последней недели"
+    old = datetime.now(timezone.utc) - timedelta(days=30)
+    db.execute(update(Detection).where(Detection.confidence == 0.71).values(created_at=old))
+    db.commit()
+    return image
+
+def test_bulk_create_single_statement(db, test_problem, test_user, query_counter):
+    image = ImageRepository(db).create(
+        problem_id=test_problem.id, file_key="problems/1/a.jpg", original_filename="a.jpg",
+        file_size=100, content_type="image/jpeg", uploaded_by=test_user.id
+    )
+    defects = [{"type": "pothole", "confidence": 0.5, "bbox": [0, 0, i, i], "class_name": "D40"} for i in range(1, 21)]
+    query_counter.clear()
+    assert DetectionRepository(db).bulk_create(image.id, test_problem.id, defects) == 20
+    assert len([q for q in query_counter if q.lstrip().upper().startswith("INSERT")]) == 1
+
+def test_query_potholes_last_week(client, auth_headers, detections):
+    since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    response = client.get(
+        "/api/detections",
+        params={"type": "pothole", "min_confidence": 0.7, "since": since},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [d["confidence"] for d in data] == [0.92]
+    assert data[0]["bbox"] == [1, 2, 30, 40]
+    assert data[0]["image_id"] == detections.id
+
+    response = client.get("/api/detections", params={"type": "pothole"}, headers=auth_headers)
+    assert [d["confidence"] for d in response.json()] == [0.92, 0.71, 0.4] # по убыванию уверенности
+
+def test_detection_stats(client, auth_headers, detections):
+    response = client.get("/api/detections/stats", params={"min_confidence": 0.5}, headers=auth_headers)
+    assert response.status_code == 200
+    stats = {s["type"]: s for s in response.json()}
+    assert stats["pothole"]["count"] == 2
+    assert stats["pothole"]["avg_confidence"] == pytest.approx(0.815)
+    assert stats["long_crack"]["problems"] == 1
+
+def test_detections_invalid_period(client, auth_headers):
+    now = datetime.now(timezone.utc)
+    response = client.get(
+        "/api/detections",
+        params={"since": now.isoformat(), "until": (now - timedelta(days=1)).isoformat()},
+        headers=auth_headers
+    )
+    assert response.status_code == 400
@@ -0,0 +1,21 @@
+from app.core.geo import encode_geohash, bbox_cells, prefix_range, haversine_km, parse_bbox
+
+def test_encode_geohash_known_value():
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+def test_bbox_cells_cover_points_inside():
+    cells = bbox_cells(55.70, 37.50, 55.80, 37.70)
+    assert 0 < len(cells) <= 32
+    for lat, lon in [(55.70, 37.50), (55.75, 37.61), (55.80, 37.70)]:
+        assert any(encode_geohash(lat, lon).startswith(cell) for cell in cells)
+
+def test_prefix_range():
+    assert prefix_range("bc") == ("bc", "bd")
+    assert prefix_range("9z") == ("9z", "b") # после '9' в алфавите geohash идёт 'b'
+    assert prefix_range("zz") == ("zz", None)
+
+def test_haversine_moscow_spb():
+    assert 630 < haversine_km(55.7558, 37.6173, 59.9343, 30.3351) < 640
+
+def test_parse_bbox_geojson_order():
+    assert parse_bbox("37.5,55.7,37.7,55.8") == (55.7, 37.5, 55.8, 37.7)
@@ -1,9 +1,10 @@
+import hashlib
 import pytest
 from unittest.mock import patch, MagicMock
-from fastapi import UploadFile
+from fastapi import UploadFile, HTTPException
 from io import BytesIO
 import sys
-from app.services.image_service import ImageService
+from app.services.image_service import ImageService, UploadStream
 
 class MockMagic: # мок для импорта библ. python-magic
     def from_buffer(self, *args, **kwargs):
@@ -160,4 +161,143 @@ class TestImageServiceEdgeCases:
         try:
             image_service.validate_file(mock_file)
         except Exception as e:
-            pytest.fail(f"validate_file вызвал исключение: {e}")
\ No newline at end of file
+            pytest.fail(f"validate_file вызвал исключение: {e}")
+
+class TestUploadStream:
+    """Потоковая загрузка: файл читается частями, лимиты проверяются на лету"""
+
+    @pytest.fixture(autouse=True)
+    def jpeg_signature(self):
+        with patch('app.services.image_service.magic.from_buffer', return_value='image/jpeg'):
+            yield
+
+    def test_stream_reads_in_chunks_and_counts_size(self):
+        stream = UploadStream(BytesIO(b'x' * 10000), max_size=10000)
+        chunks = iter(lambda: stream.read(4096), b'')
+        assert [len(c) for c in chunks] == [4096, 4096, 1808]
+        assert stream.size == 10000
+
+    def test_stream_rejects_oversized_file(self):
+        stream = UploadStream(BytesIO(b'x' * 5000), max_size=4096)
+        with pytest.raises(HTTPException) as exc_info:
+            while stream.read(1024):
+                pass
+        assert "слишком большой" in exc_info.value.detail
+
+    def test_stream_rejects_wrong_signature(self):
+        stream = UploadStream(BytesIO(b'%PDF-1.4' + b'x' * 4000))
+        with patch('app.services.image_service.magic.from_buffer', return_value='application/pdf'):
+            with pytest.raises(HTTPException) as exc_info:
+                stream.read(1024)
+                stream.read(1024)
+        assert "неверный формат" in exc_info.value.detail
+
+    @pytest.mark.asyncio
+    async def test_upload_image_streams_to_storage(self, db, test_problem, test_user):
+        content = b'fake_image_data' * 1000
+        mock_file = MagicMock(spec=UploadFile)
+        mock_file.content_type = 'image/jpeg'
+        mock_file.filename = 'test.jpg'
+        mock_file.file = BytesIO(content)
+        read_sizes = []
+
+        def upload_file(file_content, **kwargs): # как boto3: читает поток частями
+            while chunk := file_content.read(4096):
+                read_sizes.append(len(chunk))
+            return 'problems/1/test.jpg'
+
+        with patch('app.services.image_service.minio_client') as mock_minio:
+            mock_minio.upload_file.side_effect = upload_file
+            result = await ImageService(db).upload_image(test_problem.id, mock_file, test_user.id)
+
+        assert result['size'] == len(content)
+        assert max(read_sizes) == 4096 and sum(read_sizes) == len(content)
+
+    @pytest.mark.asyncio
+    async def test_identical_uploads_share_one_object(self, db, test_problem, test_user):
+        from app.models.models import ImageBlob
+        content = b'same_photo' * 1000
+
+        def upload(name):
+            mock_file = MagicMock(spec=UploadFile)
+            mock_file.content_type = 'image/jpeg'
+            mock_file.filename = name
+            mock_file.file = BytesIO(content)
+            return ImageService(db).upload_image(test_problem.id, mock_file, test_user.id)
+
+        with patch('app.services.image_service.minio_client') as mock_minio:
+            mock_minio.blob_file_key.side_effect = lambda h: f"blobs/{h[:2]}/{h}"
+            mock_minio.upload_file.side_effect = lambda **kwargs: kwargs['file_key']
+            first = await upload('a.jpg')
+            second = await upload('retry.jpg')
+
+            assert mock_minio.upload_file.call_count == 1 # повтор не загружается заново
+            images = ImageService(db).image_repo.get_by_problem(test_problem.id)
+            assert len({img.file_key for img in images}) == 1
+            file_key, content_hash = images[0].file_key, images[0].content_hash
+            assert content_hash == hashlib.sha256(content).hexdigest()
+            assert db.get(ImageBlob, content_hash).ref_count == 2
+
+            # объект удаляется только с последней ссылкой
+            ImageService(db).delete_image(first['id'], test_user.id, is_admin=True)
+            mock_minio.delete_image_files.assert_not_called()
+            ImageService(db).delete_image(second['id'], test_user.id, is_admin=True)
+            mock_minio.delete_image_files.assert_called_once_with(file_key)
+            db.expire_all()
+            assert db.get(ImageBlob, content_hash) is None
+
+    @pytest.mark.asyncio
+    async def test_reupload_during_release_gets_new_object(self, db, test_problem, test_user):
+        from app.core.minio_client import minio_client as real_minio
+        from app.models.models import ImageBlob
+        content = b'released_photo' * 1000
+
+        def upload(name):
+            mock_file = MagicMock(spec=UploadFile)
+            mock_file.content_type = 'image/jpeg'
+            mock_file.filename = name
+            mock_file.file = BytesIO(content)
+            return ImageService(db).upload_image(test_problem.id, mock_file, test_user.id)
+
+        with patch('app.services.image_service.minio_client') as mock_minio:
+            mock_minio.blob_file_key.side_effect = real_minio.blob_file_key
+            mock_minio.upload_file.side_effect = lambda **kwargs: kwargs['file_key']
+            first = await upload('a.jpg')
+            service = ImageService(db)
+            image = service.image_repo.get_by_id(first['id'])
+            old_key = image.file_key
+
+            # удаление последней ссылки: строка blob уже удалена, объект из MinIO - ещё нет
+            assert service.image_repo.release_file(image)
+            second = await upload('again.jpg') # повторная загрузка попадает в этот промежуток
+            mock_minio.delete_image_files(old_key)
+
+            assert mock_minio.upload_file.call_count == 2
+            new_key = service.image_repo.get_by_id(second['id']).file_key
+            assert new_key != old_key # удаляется старое поколение, новый объект цел
+            blob = db.get(ImageBlob, image.content_hash)
+            assert (blob.file_key, blob.ref_count) == (new_key, 1)
+
+    @pytest.mark.asyncio
+    async def test_storage_failure_keeps_image_and_reference(self, db, test_problem, test_user):
+        from fastapi import HTTPException
+        from app.models.models import ImageBlob, ProblemImage
+        mock_file = MagicMock(spec=UploadFile)
+        mock_file.content_type = 'image/jpeg'
+        mock_file.filename = 'a.jpg'
+        mock_file.file = BytesIO(b'undeletable' * 1000)
+
+        with patch('app.services.image_service.minio_client') as mock_minio:
+            mock_minio.blob_file_key.side_effect = lambda h: f"blobs/{h[:2]}/{h}"
+            mock_minio.upload_file.side_effect = lambda **kwargs: kwargs['file_key']
+            uploaded = await ImageService(db).upload_image(test_problem.id, mock_file, test_user.id)
+            mock_minio.delete_image_files.return_value = False # хранилище недоступно
+
+            with pytest.raises(HTTPException) as exc_info:
+                ImageService(db).delete_image(uploaded['id'], test_user.id, is_admin=True)
+            assert exc_info.value.status_code == 500
+            assert ImageService(db).delete_all_problem_images(test_problem.id) == 0
+
+        image = db.get(ProblemImage, uploaded['id']) # запись и ссылка на объект откатились
+        assert image is not None
+        assert db.get(ImageBlob, image.content_hash).ref_count == 1
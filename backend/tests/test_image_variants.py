@@ -0,0 +1,55 @@
+import io
+from unittest.mock import MagicMock, patch
+from PIL import Image
+from app.core.minio_client import MinIOClient
+from app.models.models import ProblemImage
+from app.services.image_service import ImageService
+from app.services.image_variants import generate_variants, render_variants
+from tests.conftest import TestingSessionLocal
+
+def jpeg_bytes(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 80, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+def test_render_variants_sizes():
+    variants = {spec.name: (spec, content, w, h) for spec, content, w, h in render_variants(jpeg_bytes(4000, 3000))}
+    assert variants["medium"][2:] == (1280, 960)
+    assert variants["thumb"][2:] == (320, 240)
+    assert Image.open(io.BytesIO(variants["thumb_webp"][1])).format == "WEBP"
+
+    small = {spec.name: (w, h) for spec, _, w, h in render_variants(jpeg_bytes(200, 100))}
+    assert small["medium"] == (200, 100) # не увеличиваем
+
+def test_derived_file_key():
+    client = MinIOClient()
+    assert client.derived_file_key("problems/7/abc.jpg", "thumb", "webp") == "problems/7/derived/abc/thumb.webp"
+
+def test_generate_variants_and_listing(db, test_problem, test_user):
+    image = ProblemImage(problem_id=test_problem.id, file_key="problems/1/abc.jpg", original_filename="a.jpg",
+                         file_size=1000, content_type="image/jpeg", uploaded_by=test_user.id, content_hash="ab" * 32)
+    db.add(image)
+    db.commit()
+
+    mock_minio = MagicMock()
+    mock_minio.download_file.return_value = jpeg_bytes(2000, 1500)
+    mock_minio.derived_file_key.side_effect = lambda key, name, ext: f"problems/1/derived/abc/{name}.{ext}"
+    mock_minio.upload_file.side_effect = lambda **kwargs: kwargs["file_key"]
+    mock_minio.get_presigned_urls.side_effect = lambda keys, expires_in: {k: f"http://minio/{k}" for k in keys}
+
+    with patch("app.services.image_variants.minio_client", mock_minio), \
+         patch("app.services.image_service.minio_client", mock_minio):
+        assert generate_variants(image.content_hash, test_problem.id, image.file_key, TestingSessionLocal) == 4
+
+        db.expire_all()
+        service = ImageService(db)
+        [listed] = service.get_images_for_problem(test_problem.id, size=200)
+        assert listed["variant"] in ("thumb", "thumb_webp")
+        assert listed["url"].startswith("http://minio/problems/1/derived/abc/thumb")
+        assert len(listed["variants"]) == 4
+
+        [listed] = service.get_images_for_problem(test_problem.id, size=1000)
+        assert listed["variant"].startswith("medium")
+        [listed] = service.get_images_for_problem(test_problem.id, size=4000)
+        assert listed["variant"] == "original" and listed["url"] == "http://minio/problems/1/abc.jpg"
+        assert mock_minio.get_presigned_urls.call_count == 3 # одна пачка подписей на запрос
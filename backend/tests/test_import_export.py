@@ -0,0 +1,101 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+from app.models.models import Problem
+from app.repositories.problem_repo import ProblemRepository
+
+ROWS = [
+    {"address": "ул. Ленина, 1", "type": "pothole", "lat": 55.75, "lon": 37.61},
+    {"address": "ул. Ленина, 3", "type": "long_crack", "status": "in_progress", "description": "Вдоль бордюра"},
+    {"address": "ул. Мира, 10", "type": "manhole", "lat": 55.8, "lon": 37.5},
+]
+
+def ndjson(rows) -> bytes:
+    return "".join(line if isinstance(line, str) else json.dumps(line, ensure_ascii=False) + "\n" for line in rows).encode()
+
+def import_file(client, headers, content: bytes, filename="problems.ndjson", **params):
+    return client.post("/problems/import", headers=headers, params=params,
+                       files={"file": (filename, content, "application/octet-stream")})
+
+def test_import_ndjson(client, contractor_auth_headers, test_contractor, db):
+    with patch("app.services.import_export_service.IMPORT_BATCH_SIZE", 2): # две пачки в одной транзакции
+        response = import_file(client, contractor_auth_headers, ndjson(ROWS))
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["imported"] == 3 and data["failed"] == 0
+    problems = {p.id: p for p in db.query(Problem).all()}
+    assert [problems[i].address for i in data["ids"]] == [row["address"] for row in ROWS]
+    first, second = (problems[i] for i in data["ids"][:2])
+    assert first.geohash and first.reporter_id == test_contractor.id and not first.is_from_inspector
+    assert second.status.value == "in_progress" and second.lat is None
+
+def test_import_rejects_file_with_errors(client, contractor_auth_headers, db):
+    lines = [ROWS[0], "{битый json\n", {"address": " ", "type": "pothole"}, {"address": "ул. Мира, 2", "type": "hole"}, ROWS[2]]
+    response = import_file(client, contractor_auth_headers, ndjson(lines))
+
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["failed"] == 3
+    assert [error["row"] for error in detail["errors"]] == [2, 3, 4]
+    assert detail["errors"][2]["error"].startswith("type:")
+    assert db.query(Problem).count() == 0 # откатилась и уже записанная пачка
+
+def test_import_skip_invalid(client, contractor_auth_headers, db):
+    lines = [ROWS[0], {"address": "ул. Мира, 2", "lat": 100}, ROWS[2]]
+    response = import_file(client, contractor_auth_headers, ndjson(lines), skip_invalid=True)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["imported"], data["failed"]) == (2, 1)
+    assert data["errors"][0]["row"] == 2 and "lat" in data["errors"][0]["error"]
+    assert db.query(Problem).count() == 2
+
+def test_import_csv(client, admin_auth_headers, db):
+    content = 'address,type,lat,lon,description\n"ул. Садовая, 5",alligator_crack,55.7,37.6,\n"ул. Садовая, 7",pothole,,,Глубокая\n'
+    response = import_file(client, admin_auth_headers, content.encode(), filename="partner.csv")
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    rows = db.query(Problem).order_by(Problem.id).all()
+    assert (rows[0].description, rows[0].lat) == (None, 55.7)
+    assert (rows[1].description, rows[1].lat) == ("Глубокая", None)
+
+def test_import_requires_contractor(client, auth_headers):
+    assert import_file(client, auth_headers, ndjson(ROWS)).status_code == 403
+
+def test_import_unknown_format(client, admin_auth_headers):
+    response = import_file(client, admin_auth_headers, ndjson(ROWS), filename="problems.txt")
+    assert response.status_code == 400
+
+def test_export_formats(client, admin_auth_headers, db):
+    import_file(client, admin_auth_headers, ndjson(ROWS))
+
+    response = client.get("/problems/export", headers=admin_auth_headers)
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["address"] for r in records] == [row["address"] for row in ROWS]
+    assert records[1]["status"] == "in_progress"
+
+    response = client.get("/problems/export", headers=admin_auth_headers, params={"format": "geojson", "type": "pothole"})
+    collection = response.json()
+    assert len(collection["features"]) == 1
+    assert collection["features"][0]["geometry"] == {"type": "Point", "coordinates": [37.61, 55.75]}
+
+    response = client.get("/problems/export", headers=admin_auth_headers, params={"format": "geojson", "status": "closed"})
+    assert response.json() == {"type": "FeatureCollection", "features": []}
+
+def test_export_csv_round_trip(client, admin_auth_headers, db):
+    import_file(client, admin_auth_headers, ndjson(ROWS))
+    exported = client.get("/problems/export", headers=admin_auth_headers, params={"format": "csv"}).content
+    assert len(list(csv.DictReader(io.StringIO(exported.decode())))) == 3
+
+    response = import_file(client, admin_auth_headers, exported, filename="problems.csv")
+    assert response.json()["imported"] == 3
+    assert db.query(Problem).filter(Problem.address == "ул. Ленина, 3", Problem.status == "in_progress").count() == 2
+
+def test_export_reads_in_batches(client, admin_auth_headers, db):
+    import_file(client, admin_auth_headers, ndjson(ROWS * 2))
+    partitions = list(ProblemRepository(db).iter_for_export(batch_size=4))
+    assert [len(rows) for rows in partitions] == [4, 2]
@@ -0,0 +1,69 @@
+import os
+import time
+from pathlib import Path
+import numpy as np
+import pytest
+from app.core.config import MODEL_PATH, ML_IMAGE_SIZE
+from app.services.inference_backends import exported_path, export_model, get_backend, is_up_to_date
+
+TEST_IMAGES = Path(os.getenv("ML_TEST_IMAGES", Path(MODEL_PATH).parents[3] / "test_data" / "images"))
+
+def test_exported_paths():
+    assert exported_path("/m/v2/weights/best.pt", "pytorch") == Path("/m/v2/weights/best.pt")
+    assert exported_path("/m/v2/weights/best.pt", "onnx") == Path("/m/v2/weights/best.onnx")
+    assert exported_path("/m/v2/weights/best.pt", "openvino") == Path("/m/v2/weights/best_openvino_model")
+    with pytest.raises(ValueError):
+        get_backend("tensorrt")
+
+def test_export_is_reused_until_weights_change(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    onnx = tmp_path / "best.onnx"
+    assert not is_up_to_date(str(weights), "onnx")
+
+    onnx.write_bytes(b"onnx")
+    assert export_model(str(weights), "onnx") == onnx # без повторного экспорта (и без torch)
+
+    later = time.time() + 10 # новые веса - экспорт устарел
+    os.utime(weights, (later, later))
+    assert not is_up_to_date(str(weights), "onnx")
+
+def iou(a, b) -> float:
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+def assert_equivalent(reference: dict, other: dict, min_conf: float = 0.5):
+    """Уверенные рамки эталона есть в другом бэкенде: тот же класс, IoU >= 0.9, conf +-0.05"""
+    for box, conf, cls in zip(reference["xyxy"], reference["conf"], reference["cls"]):
+        if conf < min_conf:
+            continue
+        matches = [
+            (iou(box, other_box), other_conf)
+            for other_box, other_conf, other_cls in zip(other["xyxy"], other["conf"], other["cls"])
+            if other_cls == cls
+        ]
+        best_iou, best_conf = max(matches, default=(0.0, 0.0))
+        assert best_iou >= 0.9, f"рамка {box.tolist()} класса {cls} не найдена"
+        assert abs(best_conf - conf) <= 0.05
+
+@pytest.mark.skipif(not Path(MODEL_PATH).exists(), reason="нет весов модели")
+@pytest.mark.parametrize("backend,runtime", [("onnx", "onnxruntime"), ("openvino", "openvino"), ("torchscript", "torch")])
+def test_backend_matches_pytorch(backend, runtime):
+    pytest.importorskip(runtime)
+    cv2 = pytest.importorskip("cv2")
+    from app.services.inference_backends import load_backend_model
+    from app.services.inference_worker import predict
+
+    paths = sorted(TEST_IMAGES.glob("*.jpg"))[:8]
+    if not paths:
+        pytest.skip("нет тестовых фото (ML_TEST_IMAGES)")
+    images = [cv2.imread(str(p)) for p in paths]
+
+    reference = predict(load_backend_model(MODEL_PATH, "pytorch"), images, 0.25, ML_IMAGE_SIZE)
+    results = predict(load_backend_model(MODEL_PATH, backend, ML_IMAGE_SIZE), images, 0.25, ML_IMAGE_SIZE)
+    for expected, actual in zip(reference, results):
+        assert_equivalent(expected, actual)
+        assert_equivalent(actual, expected) # и лишних уверенных рамок нет
@@ -0,0 +1,84 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.services.inference_engine import BatchInferenceEngine, InferenceQueueFullError
+
+class FakeModel: # запоминает размеры батчей, вместо результата возвращает сумму пикселей
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, images):
+        self.batch_sizes.append(len(images))
+        return [int(image.sum()) for image in images]
+
+def make_image(value: int) -> np.ndarray:
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    model = FakeModel()
+    engine = BatchInferenceEngine(model.predict, max_batch_size=8, max_wait_ms=50)
+
+    results = await asyncio.gather(*(engine.submit(make_image(i)) for i in range(5)))
+
+    assert model.batch_sizes == [5]
+    assert results == [i * 48 for i in range(5)] # каждый запрос получил свой результат
+    metrics = engine.get_metrics()
+    assert metrics["batches_total"] == 1
+    assert metrics["images_total"] == 5
+    assert metrics["queue_depth"] == 0
+    engine.stop()
+
+@pytest.mark.asyncio
+async def test_batch_is_limited_by_max_size():
+    model = FakeModel()
+    engine = BatchInferenceEngine(model.predict, max_batch_size=3, max_wait_ms=50)
+
+    await asyncio.gather(*(engine.submit(make_image(1)) for _ in range(7)))
+
+    assert model.batch_sizes == [3, 3, 1]
+    assert engine.get_metrics()["max_batch_size_seen"] == 3
+    engine.stop()
+
+@pytest.mark.asyncio
+async def test_predict_error_is_propagated_to_all_requests():
+    def failing_predict(images):
+        raise RuntimeError("model crashed")
+
+    engine = BatchInferenceEngine(failing_predict, max_batch_size=4, max_wait_ms=10)
+    results = await asyncio.gather(
+        engine.submit(make_image(1)), engine.submit(make_image(2)), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert engine.get_metrics()["errors_total"] == 1
+    engine.stop()
+
+@pytest.mark.asyncio
+async def test_full_queue_rejects_new_requests():
+    model = FakeModel()
+    engine = BatchInferenceEngine(model.predict, max_batch_size=1, max_wait_ms=0, max_queue_size=2)
+
+    results = await asyncio.gather(*(engine.submit(make_image(1)) for _ in range(3)), return_exceptions=True)
+
+    assert isinstance(results[2], InferenceQueueFullError)
+    assert engine.get_metrics()["rejected_total"] == 1
+    engine.stop()
+
+@pytest.mark.asyncio
+async def test_predict_runs_off_event_loop():
+    def slow_predict(images):
+        time.sleep(0.2) # блокирующий вызов, как model.predict
+        return [0 for _ in images]
+
+    engine = BatchInferenceEngine(slow_predict, executor=ThreadPoolExecutor(max_workers=1))
+    task = asyncio.ensure_future(engine.submit(make_image(1)))
+
+    started = time.perf_counter()
+    await asyncio.sleep(0.05) # event loop не заблокирован, пока идёт инференс
+    assert time.perf_counter() - started < 0.15
+
+    assert await task == 0
+    engine.stop()
@@ -0,0 +1,44 @@
+import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from app.core.minio_client import MinIOClient
+
+@pytest.fixture
+def client():
+    return MinIOClient() # конструктор не обращается к MinIO
+
+def test_local_signature_matches_boto3(client):
+    signed_at = 1_700_000_000
+    file_key = 'problems/1/фото 1.jpg'
+
+    class FrozenDatetime(datetime.datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.datetime.utcfromtimestamp(signed_at)
+
+    with patch('botocore.auth.datetime', SimpleNamespace(datetime=FrozenDatetime)):
+        expected = client.client.generate_presigned_url(
+            'get_object', Params={'Bucket': client.bucket_name, 'Key': file_key}, ExpiresIn=3600
+        )
+    actual = client._sign_url(file_key, 3600, signed_at)
+
+    expected, actual = urlsplit(expected), urlsplit(actual)
+    assert actual.netloc == expected.netloc and actual.path == expected.path
+    assert parse_qs(actual.query) == parse_qs(expected.query)
+
+def test_presigned_urls_are_cached_per_window(client):
+    keys = ['problems/1/a.jpg', 'problems/1/b.jpg']
+    with patch('app.core.minio_client.time.time', return_value=1_700_000_000):
+        urls = client.get_presigned_urls(keys)
+        assert list(urls) == keys and urls['problems/1/a.jpg'] != urls['problems/1/b.jpg']
+        with patch.object(client, '_sign_url') as sign:
+            assert client.get_presigned_url('problems/1/a.jpg') == urls['problems/1/a.jpg']
+            sign.assert_not_called()
+
+    # в том же окне ссылка та же, после окна - новая с запасом жизни не меньше PRESIGN_MARGIN
+    with patch('app.core.minio_client.time.time', return_value=1_700_000_000 + 100):
+        assert client.get_presigned_url('problems/1/a.jpg') == urls['problems/1/a.jpg']
+    with patch('app.core.minio_client.time.time', return_value=1_700_000_000 + 3300):
+        assert client.get_presigned_url('problems/1/a.jpg') != urls['problems/1/a.jpg']
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from app.schemas.schemas import ImageAnalysisResponse
+from app.services.ml_service import MLService
+
+NAMES = {0: "D00", 1: "D10", 2: "D20", 3: "D40", 4: "D50"} # D50 - класс без своего типа
+
+def reference_parse(detections: dict) -> dict:
+    """Поштучный разбор рамок (как было до векторизации)"""
+    mapping = {'D00': 'long_crack', 'D10': 'transverse_crack', 'D20': 'alligator_crack', 'D40': 'pothole'}
+    defects, type_counts = [], {}
+    for xyxy, confidence, class_id in zip(detections["xyxy"], detections["conf"], detections["cls"]):
+        class_name = detections["names"][int(class_id)]
+        problem_type = mapping.get(class_name, 'other')
+        defects.append({"type": problem_type, "confidence": float(confidence),
+                        "bbox": [int(v) for v in xyxy], "class_name": class_name})
+        type_counts[problem_type] = type_counts.get(problem_type, 0) + 1
+    return {
+        "defects": defects,
+        "detected_types": set(type_counts),
+        "dominant_type": max(type_counts, key=type_counts.get) if defects else None,
+        "confidence": defects[0]["confidence"] if defects else None
+    }
+
+def random_detections(n: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 3000, (n, 2))
+    return {
+        "xyxy": np.concatenate([xy, xy + rng.uniform(5, 300, (n, 2))], axis=1).astype(np.float32),
+        "conf": np.sort(rng.uniform(0.3, 1, n).astype(np.float32))[::-1],
+        "cls": rng.integers(0, 5, n),
+        "names": NAMES
+    }
+
+@pytest.fixture(scope="module")
+def service():
+    return MLService()
+
+@pytest.mark.parametrize("n,seed", [(0, 0), (1, 1), (2, 2), (7, 3), (500, 4)])
+def test_parse_result_matches_reference(service, n, seed):
+    detections = random_detections(n, seed)
+    result, expected = service.parse_result(detections), reference_parse(detections)
+    assert result["defects"] == expected["defects"]
+    assert set(result["detected_types"]) == expected["detected_types"]
+    assert result["dominant_type"] == expected["dominant_type"]
+    assert result["confidence"] == expected["confidence"]
+    ImageAnalysisResponse(**result) # ответ по-прежнему проходит схему API
+
+def test_dominant_type_tie_goes_to_first_seen(service):
+    detections = {
+        "xyxy": np.zeros((4, 4), dtype=np.float32), "conf": np.full(4, 0.5, dtype=np.float32),
+        "cls": np.array([3, 0, 0, 3]), "names": NAMES
+    }
+    assert service.parse_result(detections)["dominant_type"] == "pothole"
@@ -93,4 +93,240 @@ def test_update_nonexistent_problem(client, admin_auth_headers):
 
 def test_delete_nonexistent_problem(client, admin_auth_headers):
     response = client.delete("/problems/99999", headers=admin_auth_headers)
-    assert response.status_code == 410
\ No newline at end of file
+    assert response.status_code == 410
+
+def test_get_problems_cursor_pagination(client, auth_headers):
+    for i in range(5):
+        client.post("/problems", headers=auth_headers, json={
+            "address": f"ул. Курсорная, {i}",
+            "type": "pothole"
+        })
+
+    seen = []
+    params = {"pagination": "cursor", "sort_by": "address", "sort_order": "asc", "limit": 2}
+    while True:
+        response = client.get("/problems", headers=auth_headers, params=params)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["page"] is None
+        seen.extend(p["address"] for p in data["items"])
+        if not data["next_cursor"]:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert seen == [f"ул. Курсорная, {i}" for i in range(5)] # без пропусков и повторов
+
+def test_get_problems_invalid_cursor(client, auth_headers):
+    response = client.get("/problems", headers=auth_headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_get_problems_without_total(client, auth_headers):
+    client.post("/problems", headers=auth_headers, json={
+        "address": "ул. Тестовая, 1",
+        "type": "pothole"
+    })
+    response = client.get("/problems", headers=auth_headers, params={"total_mode": "none"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] is None
+    assert len(data["items"]) == 1
+
+def test_search_problems_ranked_by_relevance(client, auth_headers):
+    client.post("/problems", headers=auth_headers, json={
+        "address": "ул. Садовая, 5",
+        "type": "pothole"
+    })
+    client.post("/problems", headers=auth_headers, json={
+        "address": "ул. Лесная, 3",
+        "description": "Яма рядом с поворотом на Садовую",
+        "type": "pothole"
+    })
+    client.post("/problems", headers=auth_headers, json={
+        "address": "пр. Мира, 10",
+        "type": "pothole"
+    })
+
+    response = client.get("/problems", headers=auth_headers, params={
+        "search": "Садов", "sort_by": "relevance"
+    })
+    assert response.status_code == 200
+    addresses = [p["address"] for p in response.json()["items"]]
+    assert addresses == ["ул. Садовая, 5", "ул. Лесная, 3"] # совпадение в адресе выше
+
+def test_images_count_computed_in_single_query(client, db, test_problem, test_user, query_counter):
+    from app.models.models import ProblemImage
+    problem_id = test_problem.id
+    for i in range(3):
+        db.add(ProblemImage(
+            problem_id=problem_id,
+            file_key=f'problems/{problem_id}/{i}.jpg',
+            original_filename=f'{i}.jpg',
+            file_size=1024,
+            content_type='image/jpeg',
+            uploaded_by=test_user.id
+        ))
+    db.commit()
+
+    query_counter.clear()
+    response = client.get("/problems")
+    assert response.status_code == 200
+    assert response.json()["items"][0]["images_count"] == 3
+    assert len(query_counter) == 2 # COUNT(*) + одна выборка страницы, без запросов к фото
+
+    query_counter.clear()
+    response = client.get(f"/problems/{problem_id}")
+    assert response.json()["images_count"] == 3
+    assert len(query_counter) == 1
+
+def test_problems_bbox_radius_and_nearest(client, auth_headers):
+    points = {
+        "Красная площадь": (55.7539, 37.6208),
+        "Парк Горького": (55.7298, 37.6011),
+        "Санкт-Петербург": (59.9343, 30.3351),
+    }
+    for address, (lat, lon) in points.items():
+        response = client.post("/problems", headers=auth_headers, json={
+            "address": address, "type": "pothole", "lat": lat, "lon": lon
+        })
+        assert response.json()["lat"] == lat
+    client.post("/problems", headers=auth_headers, json={"address": "Без координат", "type": "pothole"})
+
+    response = client.get("/problems", params={"bbox": "37.5,55.7,37.7,55.8"})
+    assert {p["address"] for p in response.json()["items"]} == {"Красная площадь", "Парк Горького"}
+
+    response = client.get("/problems", params={"lat": 55.7539, "lon": 37.6208, "radius_km": 1})
+    assert [p["address"] for p in response.json()["items"]] == ["Красная площадь"]
+
+    response = client.get("/problems/nearest", params={"lat": 55.75, "lon": 37.62, "limit": 2})
+    assert response.status_code == 200
+    nearest = response.json()
+    assert [p["address"] for p in nearest] == ["Красная площадь", "Парк Горького"]
+    assert nearest[0]["distance_km"] < nearest[1]["distance_km"]
+
+def test_problems_invalid_bbox(client):
+    response = client.get("/problems", params={"bbox": "1,2,3"})
+    assert response.status_code == 400
+
+def test_problem_clusters_tile(client, auth_headers, contractor_auth_headers):
+    for address, lat, lon, type in [
+        ("Тверская, 1", 55.7570, 37.6130, "pothole"),
+        ("Тверская, 3", 55.7575, 37.6125, "manhole"),
+        ("Санкт-Петербург", 59.9343, 30.3351, "pothole"),
+    ]:
+        client.post("/problems", headers=auth_headers, json={
+            "address": address, "type": type, "lat": lat, "lon": lon
+        })
+
+    url = "/problems/tiles/4/9/5" # тайл с Москвой
+    response = client.get(url)
+    assert response.status_code == 200
+    clusters = response.json()["clusters"]
+    moscow = [c for c in clusters if c["by_type"] == {"manhole": 1, "pothole": 1}]
+    assert len(moscow) == 1 and moscow[0]["count"] == 2
+    assert sum(c["count"] for c in clusters) == 2 # Петербург в соседнем тайле 9/4
+    etag = response.headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # изменения применяются к закэшированному тайлу и меняют ETag
+    created = client.post("/problems", headers=auth_headers, json={
+        "address": "Тверская, 5", "type": "pothole", "lat": 55.7580, "lon": 37.6120
+    }).json()
+    client.put(f"/problems/{created['id']}/status", headers=contractor_auth_headers,
+               params={"status": "in_progress"})
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    moscow = next(c for c in response.json()["clusters"] if "manhole" in c["by_type"])
+    assert moscow["count"] == 3
+    assert moscow["by_status"] == {"in_progress": 1, "new": 2}
+
+    assert client.get("/problems/tiles/2/4/0").status_code == 400
+
+def test_cluster_tile_built_during_change_not_cached(client, auth_headers, db, monkeypatch):
+    from app.services.cluster_service import ClusterService, cluster_cache, problem_point
+    from app.models.models import Problem
+    created = client.post("/problems", headers=auth_headers, json={
+        "address": "Тверская, 1", "type": "pothole", "lat": 55.7570, "lon": 37.6130
+    }).json()
+    build = ClusterService._build_tile
+
+    def build_then_change(self, z, x, y): # изменение попадает между снимком тайла и put
+        tile = build(self, z, x, y)
+        point = problem_point(db.get(Problem, created["id"]))
+        cluster_cache.record_change(point, point._replace(status="closed"))
+        return tile
+
+    monkeypatch.setattr(ClusterService, "_build_tile", build_then_change)
+    ClusterService(db).get_tile(4, 9, 5)
+    assert cluster_cache.get((4, 9, 5)) is None
+
+    monkeypatch.setattr(ClusterService, "_build_tile", build)
+    tile = ClusterService(db).get_tile(4, 9, 5)
+    assert cluster_cache.get((4, 9, 5)) is tile
+
+    monkeypatch.setattr("app.services.cluster_service.time.monotonic", lambda: tile.expires_at)
+    assert cluster_cache.get((4, 9, 5)) is None # по TTL - изменения из других процессов
+
+def test_bulk_update_status(client, db, auth_headers, contractor_auth_headers, query_counter):
+    ids = [
+        client.post("/problems", headers=auth_headers, json={
+            "address": f"ул. Ремонтная, {i}", "type": "pothole", "lat": 55.75, "lon": 37.61 + i / 1000
+        }).json()["id"]
+        for i in range(5)
+    ]
+    client.put(f"/problems/{ids[3]}/status", headers=contractor_auth_headers, params={"status": "closed"})
+    tile = client.get("/problems/tiles/4/9/5").json() # кэш кластеров должен получить изменения
+
+    query_counter.clear()
+    response = client.put("/problems/status", headers=contractor_auth_headers, json={"items": [
+        {"id": ids[0], "status": "resolved"},
+        {"id": ids[1], "status": "resolved"},
+        {"id": ids[2], "status": "new"},
+        {"id": ids[3], "status": "resolved"}, # закрытую - только обратно в работу
+        {"id": 999999, "status": "resolved"},
+        {"id": ids[4], "status": "resolved"},
+        {"id": ids[4], "status": "closed"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["updated"], data["failed"]) == (2, 4)
+    assert [(r["id"], r["result"], r["status"]) for r in data["results"]] == [
+        (ids[0], "updated", "resolved"), (ids[1], "updated", "resolved"), (ids[2], "unchanged", "new"),
+        (ids[3], "invalid_transition", "closed"), (999999, "not_found", None),
+        (ids[4], "duplicate", "new"), (ids[4], "duplicate", "new"),
+    ]
+    assert data["results"][0]["previous_status"] == "new"
+    # выборка статусов + UPDATE (в SQLite - пачкой по первичному ключу), без запроса на каждую проблему
+    assert len([s for s in query_counter if s.lstrip().upper().startswith(("SELECT", "UPDATE"))]) == 2
+
+    statuses = {p["id"]: p["status"] for p in client.get("/problems", params={"limit": 10}).json()["items"]}
+    assert [statuses[i] for i in ids] == ["resolved", "resolved", "new", "closed", "new"]
+    moscow = client.get("/problems/tiles/4/9/5").json()["clusters"][0]
+    assert moscow["by_status"] == {"closed": 1, "new": 2, "resolved": 2}
+    assert tile["clusters"][0]["by_status"] == {"closed": 1, "new": 4}
+
+def test_bulk_update_status_validation(client, auth_headers, contractor_auth_headers):
+    response = client.put("/problems/status", headers=auth_headers, json={"items": [{"id": 1, "status": "resolved"}]})
+    assert response.status_code == 403
+    assert client.put("/problems/status", headers=contractor_auth_headers, json={"items": []}).status_code == 422
+    response = client.put("/problems/status", headers=contractor_auth_headers, json={"items": [{"id": 1, "status": "done"}]})
+    assert response.status_code == 422
+
+def test_update_status_follows_transitions(client, auth_headers, contractor_auth_headers):
+    problem_id = client.post("/problems", headers=auth_headers, json={
+        "address": "ул. Ремонтная, 10", "type": "pothole"
+    }).json()["id"]
+    url = f"/problems/{problem_id}/status"
+    assert client.put(url, headers=contractor_auth_headers, params={"status": "closed"}).status_code == 200
+
+    response = client.put(url, headers=contractor_auth_headers, params={"status": "resolved"})
+    assert response.status_code == 409 # закрытую - только обратно в работу, как и в массовом обновлении
+    assert client.get(f"/problems/{problem_id}").json()["status"] == "closed"
+    response = client.put(url, headers=contractor_auth_headers, params={"status": "in_progress"})
+    assert response.status_code == 200 # кнопка «Вернуть в работу»
+    assert response.json()["status"] == "in_progress"
+    assert client.put(url, headers=contractor_auth_headers, params={"status": "done"}).status_code == 422
+    assert client.put("/problems/999999/status", headers=contractor_auth_headers,
+                      params={"status": "closed"}).status_code == 404
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+import pytest
+from sqlalchemy import update
+from app.models.models import Detection, ReanalysisJob
+from app.repositories.image_repo import ImageRepository
+from app.repositories.reanalysis_repo import ReanalysisRepository
+from app.services.reanalysis_service import ReanalysisWorker
+from tests.conftest import TestingSessionLocal
+
+ANALYSIS = {
+    "defects": [{"type": "pothole", "confidence": 0.88, "bbox": [1, 1, 20, 20], "class_name": "D40"}],
+    "detected_types": ["pothole"], "dominant_type": "pothole", "confidence": 0.88
+}
+
+@pytest.fixture
+def images(db, test_problem, test_user):
+    repo = ImageRepository(db)
+    return [
+        repo.create(problem_id=test_problem.id, file_key=f"problems/1/{i}.jpg", original_filename=f"{i}.jpg",
+                    file_size=100, content_type="image/jpeg", uploaded_by=test_user.id)
+        for i in range(5)
+    ]
+
+def make_worker(batch_size=2, worker_id="w1"):
+    worker = ReanalysisWorker(session_factory=TestingSessionLocal, batch_size=batch_size, worker_id=worker_id)
+    worker.model_version = "v2"
+    return worker
+
+def test_reanalysis_run_processes_all_images(client, admin_auth_headers, db, images):
+    response = client.post("/admin/reanalysis", json={"model_version": "v2"}, headers=admin_auth_headers)
+    assert response.status_code == 200
+    run = response.json()
+    assert run["total"] == 5 and run["pending"] == 5 and not run["finished"]
+
+    downloads = []
+    def download_file(file_key):
+        downloads.append(file_key)
+        return None if file_key.endswith("4.jpg") else b"jpeg"
+
+    worker = make_worker()
+    with patch("app.services.reanalysis_service.minio_client") as mock_minio, \
+         patch("app.services.reanalysis_service.ml_service.detect_batch",
+               side_effect=lambda contents: [ANALYSIS for _ in contents]) as detect:
+        mock_minio.download_file.side_effect = download_file
+        processed = worker.run(once=True)
+    worker.close()
+
+    assert processed == 4
+    assert max(len(call.args[0]) for call in detect.call_args_list) == 2 # пачками по batch_size
+    assert db.query(Detection).filter(Detection.model_version == "v2").count() == 4
+
+    progress = client.get(f"/admin/reanalysis/{run['id']}", headers=admin_auth_headers).json()
+    # отсутствующее в MinIO фото вернулось в очередь (ещё есть попытки)
+    assert progress["done"] == 4 and progress["pending"] == 1
+
+def test_claim_skips_other_versions_and_reclaims_expired_lease(db, images):
+    repo = ReanalysisRepository(db)
+    run = repo.create_run("v2")
+    repo.create_run("v1") # старые воркеры не должны брать задачи новой версии и наоборот
+
+    first = repo.claim("w1", "v2", limit=3, lease_seconds=600, max_attempts=3)
+    second = repo.claim("w2", "v2", limit=3, lease_seconds=600, max_attempts=3)
+    assert {job.run_id for job in first + second} == {run.id}
+    assert not {job.id for job in first} & {job.id for job in second}
+    assert repo.claim("w3", "v2", limit=3, lease_seconds=600, max_attempts=3) == []
+
+    # воркер w1 "упал": после истечения аренды его задачи забирает другой
+    expired = datetime.now(timezone.utc) - timedelta(seconds=601)
+    db.execute(update(ReanalysisJob).where(ReanalysisJob.locked_by == "w1").values(locked_at=expired))
+    db.commit()
+    reclaimed = repo.claim("w3", "v2", limit=10, lease_seconds=600, max_attempts=3)
+    assert sorted(job.id for job in reclaimed) == sorted(job.id for job in first)
+    assert all(job.attempts == 2 for job in reclaimed)
+
+    # w1 не может завершить задачи, которые уже у w3
+    results = {job.id: (images[0], ANALYSIS) for job in first}
+    assert repo.complete("w1", results, "v2") == 0
+
+    # w3 тоже "упал": третья попытка последняя, после неё задачи не забираются, а помечаются failed
+    db.execute(update(ReanalysisJob).where(ReanalysisJob.locked_by == "w3").values(locked_at=expired))
+    db.commit()
+    assert len(repo.claim("w4", "v2", limit=10, lease_seconds=600, max_attempts=3)) == 3
+    db.execute(update(ReanalysisJob).where(ReanalysisJob.locked_by == "w4").values(locked_at=expired))
+    db.commit()
+    assert repo.claim("w5", "v2", limit=10, lease_seconds=600, max_attempts=3) == []
+    assert repo.get_progress(run.id)["failed"] == 3
+
+def test_failed_jobs_and_retry(client, admin_auth_headers, db, images):
+    repo = ReanalysisRepository(db)
+    run = repo.create_run("v2")
+    for _ in range(3):
+        for job in repo.claim("w1", "v2", limit=10, lease_seconds=600, max_attempts=3):
+            repo.fail(job, "boom", max_attempts=3)
+    assert repo.get_progress(run.id)["failed"] == 5
+
+    response = client.post(f"/admin/reanalysis/{run.id}/retry", headers=admin_auth_headers)
+    assert response.json()["pending"] == 5
@@ -0,0 +1,74 @@
+from unittest.mock import patch
+import numpy as np
+import pytest
+from app.services.sliced_inference import SliceConfig, nms, predict_sliced, tile_grid
+
+def test_tile_grid_covers_image_with_overlap():
+    tiles = tile_grid(4000, 3000, 640, 0.2)
+    assert (tiles[:, 2] - tiles[:, 0] == 640).all() and (tiles[:, 3] - tiles[:, 1] == 640).all()
+    covered = np.zeros((3000, 4000), dtype=bool)
+    for x0, y0, x1, y1 in tiles:
+        covered[y0:y1, x0:x1] = True
+    assert covered.all()
+    xs = np.unique(tiles[:, 0])
+    assert (np.diff(xs) <= 512).all() # шаг 640 * (1 - 0.2): соседние тайлы перекрываются
+
+    assert tile_grid(500, 300, 640, 0.2).tolist() == [[0, 0, 500, 300]] # меньше тайла - один кадр
+
+def brute_force_nms(boxes, scores, classes, iou):
+    def box_iou(a, b):
+        w = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+        h = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+        inter = w * h
+        return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+    keep = []
+    for i in sorted(range(len(boxes)), key=lambda i: -scores[i]):
+        if all(classes[i] != classes[k] or box_iou(boxes[i], boxes[k]) <= iou for k in keep):
+            keep.append(i)
+    return keep
+
+def test_nms_matches_reference():
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(0, 500, (300, 2))
+    boxes = np.concatenate([xy, xy + rng.uniform(10, 120, (300, 2))], axis=1).astype(np.float32)
+    scores = rng.uniform(0.3, 1, 300).astype(np.float32)
+    classes = rng.integers(0, 4, 300)
+    assert nms(boxes, scores, classes, 0.5).tolist() == brute_force_nms(boxes, scores, classes, 0.5)
+
+def fake_detections(xyxy, conf, cls):
+    return {"xyxy": np.array(xyxy, dtype=np.float32).reshape(-1, 4), "conf": np.array(conf, dtype=np.float32),
+            "cls": np.array(cls, dtype=np.int64), "names": {0: "D00", 3: "D40"}}
+
+@pytest.mark.parametrize("max_batch, batches", [(16, [8]), (3, [3, 3, 2])])
+def test_predict_sliced_merges_tiles(max_batch, batches):
+    # в пикселях записаны их координаты (x, y): по кадру видно, из какого места фото он вырезан
+    ys, xs = np.mgrid[0:1000, 0:1500]
+    large = np.stack([xs, ys, np.zeros_like(xs)], axis=2).astype(np.uint16)
+    small = np.zeros((400, 600, 3), np.uint16)
+    crack = np.array([560, 380, 620, 420]) # трещина в координатах фото, попадает в 4 тайла
+    calls = []
+
+    def predict(model, crops, conf, imgsz):
+        calls.append(len(crops))
+        results = []
+        for crop in crops:
+            x0, y0 = int(crop[0, 0, 0]), int(crop[0, 0, 1])
+            height, width = crop.shape[:2]
+            inside = crop is not large and crop is not small and \
+                x0 <= crack[0] and crack[2] <= x0 + width and y0 <= crack[1] and crack[3] <= y0 + height
+            # каждый тайл находит трещину чуть по-разному, кадр целиком (уменьшенный) - не находит
+            jitter = (x0 % 7) - 3
+            box = crack - [x0, y0, x0, y0] + jitter
+            results.append(fake_detections([box] if inside else [], [0.5 + jitter / 100] if inside else [], [0] if inside else []))
+        return results
+
+    config = SliceConfig(tile_size=640, overlap=0.2, iou=0.5, min_side=1280, max_batch=max_batch)
+    with patch("app.services.sliced_inference.predict", side_effect=predict):
+        large_result, small_result = predict_sliced(object(), [large, small], 0.3, 640, config)
+
+    assert 1 + len(tile_grid(1500, 1000, 640, 0.2)) + 1 == 8 # фото, его тайлы и маленькое фото
+    assert calls == batches # не больше max_batch кадров в одном predict
+    assert len(small_result["xyxy"]) == 0
+    # трещину нашли несколько перекрывающихся тайлов - после слияния одна рамка в координатах фото
+    assert len(large_result["xyxy"]) == 1
+    assert np.abs(large_result["xyxy"][0] - crack).max() <= 3
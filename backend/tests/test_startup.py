@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.core.startup import StartupTasks
+from app.services.ml_service import MLService
+
+def test_ready_reports_model_separately(client):
+    response = client.get("/ready")
+    assert response.status_code == 200 # без модели API уже принимает трафик
+    assert response.json()["ml_model"] == "not_loaded"
+
+    assert client.get("/ready", params={"ml": True}).status_code == 503
+    assert client.get("/health").status_code == 200
+
+@pytest.mark.asyncio
+async def test_analyze_before_model_loaded():
+    service = MLService() # конструктор не грузит веса
+    assert service.status == "not_loaded"
+    with pytest.raises(HTTPException) as exc_info:
+        await service.analyze_content(b"jpeg")
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+def test_load_without_weights(monkeypatch):
+    monkeypatch.setattr("app.services.ml_service.MODEL_PATH", "/nonexistent/best.pt")
+    service = MLService()
+    service.load()
+    assert service.status == "unavailable"
+
+@pytest.mark.asyncio
+async def test_startup_tasks_run_in_background():
+    tasks = StartupTasks()
+    def boom():
+        raise RuntimeError("minio down")
+    tasks.start("ok", lambda: None)
+    tasks.start("storage", lambda: False)
+    tasks.start("broken", boom)
+    assert tasks.status("ok") == "running" # start не ждёт завершения
+
+    await tasks.wait(timeout=5)
+    assert tasks.status("ok") == "ready"
+    assert tasks.status("storage") == "failed"
+    assert tasks.snapshot()["broken"]["error"] == "minio down"
+
+def test_thread_pool_warms_model_per_thread(monkeypatch, tmp_path):
+    pytest.importorskip("torch")
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    loaded = []
+    monkeypatch.setattr("app.services.ml_service.MODEL_PATH", str(weights))
+    monkeypatch.setattr("app.services.ml_service.ML_INFERENCE_WORKERS", 2)
+    monkeypatch.setattr("app.services.ml_service.load_backend_model", lambda *args: loaded.append(object()) or loaded[-1])
+    monkeypatch.setattr("app.services.ml_service.predict", lambda *args: [])
+    service = MLService()
+    service.load()
+    assert len(loaded) == 2 # по модели на поток пула, все прогреты до первого запроса
+
+    models = [service.engine.executor.submit(service._thread_model).result() for _ in range(6)]
+    assert len(loaded) == 2 and {id(model) for model in models} <= {id(model) for model in loaded}
+    assert service.model in loaded
+
+def test_detect_batch_runs_in_warmed_pool(monkeypatch, tmp_path):
+    pytest.importorskip("torch")
+    import threading
+    import numpy as np
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"weights")
+    loaded = []
+    monkeypatch.setattr("app.services.ml_service.MODEL_PATH", str(weights))
+    monkeypatch.setattr("app.services.ml_service.ML_INFERENCE_WORKERS", 2)
+    monkeypatch.setattr("app.services.ml_service.load_backend_model", lambda *args: loaded.append(object()) or loaded[-1])
+    monkeypatch.setattr("app.services.ml_service.predict", lambda model, images, *args: [
+        {"cls": [], "conf": [], "xyxy": [], "names": {}} for _ in images
+    ])
+    service = MLService()
+    service.load()
+    monkeypatch.setattr(service, "decode_image", lambda content: np.zeros((4, 4, 3), dtype=np.uint8))
+
+    results = []
+    worker = threading.Thread(target=lambda: results.extend(service.detect_batch([b"a", b"b"]))) # как воркер переанализа
+    worker.start()
+    worker.join()
+    assert [result["defects"] for result in results] == [[], []]
+    assert len(loaded) == 2 # новая непрогретая модель в потоке воркера не создаётся
+
+def test_model_version_includes_runtime(monkeypatch):
+    monkeypatch.setattr("app.services.ml_service.ML_MODEL_VERSION", "v5")
+    monkeypatch.setattr("app.services.ml_service.ML_BACKEND", "onnx")
+    monkeypatch.setattr("app.services.ml_service.ML_SLICED", True)
+    monkeypatch.setattr("app.services.ml_service.ML_TILE_SIZE", 800)
+    assert MLService().model_version == "v5-onnx-sliced800" # ключ кэша детекций не смешивает рантаймы
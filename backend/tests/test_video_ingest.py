@@ -0,0 +1,154 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+import cv2
+import numpy as np
+import pytest
+from app.models.models import Detection, Problem, ProblemImage
+from app.services.video_sampling import (
+    DefectAggregator, Frame, FrameSampler, GpsTrack, dhash, hamming
+)
+
+def noise(seed: int, low: int = 0, high: int = 100, shape=(48, 64, 3)) -> np.ndarray:
+    return np.random.default_rng(seed).integers(low, high, shape, dtype=np.uint8)
+
+class ListSource: # источник кадров без видеофайла
+    def __init__(self, images, fps):
+        self.images, self.fps = images, fps
+
+    def __iter__(self):
+        for index in range(len(self.images)):
+            self._index = index
+            yield index, index / self.fps
+
+    def image(self):
+        return self.images[self._index]
+
+def test_dhash_separates_duplicates_from_new_frames():
+    frame = noise(1)
+    jitter = np.random.default_rng(2).integers(-3, 4, frame.shape) # шум сенсора между кадрами
+    jittered = np.clip(frame.astype(np.int16) + jitter, 0, 255).astype(np.uint8)
+    assert hamming(dhash(frame), dhash(frame)) == 0
+    assert hamming(dhash(frame), dhash(jittered)) <= 6
+    assert hamming(dhash(frame), dhash(noise(3))) > 16
+
+def test_sampler_by_time_skips_duplicates():
+    images = [noise(0)] * 10 + [noise(seed) for seed in range(1, 11)] # машина стоит 1 с, потом едет
+    sampler = FrameSampler(interval=0.5, hash_distance=6)
+    frames = list(sampler.sample(ListSource(images, fps=10)))
+    assert [frame.index for frame in frames] == [0, 10, 15]
+    assert (sampler.frames, sampler.sampled, sampler.duplicates) == (20, 3, 1)
+
+def test_sampler_by_distance_uses_track():
+    track = GpsTrack([(0, 55.0, 37.0), (2, 55.0, 37.0), (4, 55.0009, 37.0)]) # стоит 2 с, потом 100 м за 2 с
+    sampler = FrameSampler(interval=0.5, distance=20, track=track)
+    frames = list(sampler.sample(ListSource([noise(seed) for seed in range(40)], fps=10)))
+    assert [frame.index for frame in frames] == [0, 24, 28, 32, 36]
+    assert frames[1].position == pytest.approx((55.00018, 37.0))
+
+def pothole(confidence: float, bbox=(0, 0, 10, 10)) -> dict:
+    return {"type": "pothole", "confidence": confidence, "bbox": list(bbox), "class_name": "D40"}
+
+def potholes(*defects) -> dict:
+    return {"defects": list(defects)}
+
+def test_aggregator_merges_consecutive_detections():
+    aggregator = DefectAggregator(gap=2, distance=20)
+    closed = []
+    for seconds, confidence in [(0, 0.5), (0.5, 0.9), (1, 0.6), (4, 0.7)]: # после 1 с перерыв 3 с
+        closed += aggregator.add(Frame(int(seconds * 10), seconds, None, None), potholes(pothole(confidence)))
+    closed += aggregator.finish()
+
+    assert [(t.first_seen, t.last_seen, t.frames, t.confidence) for t in closed] == [(0, 1, 3, 0.9), (4, 4, 1, 0.7)]
+    assert closed[0].best.seconds == 0.5
+
+def test_aggregator_splits_same_type_far_apart():
+    aggregator = DefectAggregator(gap=2, distance=20)
+    aggregator.add(Frame(0, 0, None, (55.0, 37.0)), potholes(pothole(0.5)))
+    closed = aggregator.add(Frame(5, 0.5, None, (55.001, 37.0)), potholes(pothole(0.5))) # 111 м за полсекунды
+    assert len(closed) == 1 and len(aggregator.finish()) == 1
+
+def test_aggregator_tracks_same_type_defects_by_box():
+    aggregator = DefectAggregator(gap=2, distance=20)
+    # две ямы в одном кадре; камера едет - рамки смещаются вниз, правая пропадает после 0.5 с
+    aggregator.add(Frame(0, 0, None, None), potholes(pothole(0.6, (10, 50, 60, 80)), pothole(0.7, (300, 40, 340, 70))))
+    aggregator.add(Frame(5, 0.5, None, None), potholes(pothole(0.8, (305, 55, 345, 88)), pothole(0.5, (12, 70, 64, 104))))
+    aggregator.add(Frame(10, 1, None, None), potholes(pothole(0.9, (15, 95, 70, 130))))
+    left, right = aggregator.finish()
+
+    assert (left.frames, left.confidence, left.last_seen, left.defects[0]["bbox"]) == (3, 0.9, 1, [15, 95, 70, 130])
+    assert (right.frames, right.confidence, right.last_seen, right.defects[0]["bbox"]) == (2, 0.8, 0.5, [305, 55, 345, 88])
+
+def write_video(path, fps: int = 10):
+    """6 с: стоянка (одинаковые тёмные кадры), дефект 1-3 с, дорога без дефектов, дефект 5-6 с"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for index in range(60):
+        bright = 10 <= index < 30 or index >= 50
+        writer.write(noise(0 if index < 10 else index, *((150, 255) if bright else (0, 100))))
+    writer.release()
+
+async def fake_detect(images):
+    """Светлый кадр - яма, уверенность растёт с яркостью"""
+    return [potholes(pothole(float(image.mean()) / 255)) if image.mean() > 128 else potholes() for image in images]
+
+def post_video(client, headers, files, data):
+    ml = MagicMock(model_version="test")
+    ml.detect_frames = AsyncMock(side_effect=fake_detect)
+    with patch("app.services.video_service.ml_service", ml), \
+         patch("app.services.image_service.minio_client") as mock_minio:
+        mock_minio.blob_file_key.side_effect = lambda h: f"blobs/{h[:2]}/{h}"
+        mock_minio.upload_file.side_effect = lambda **kwargs: kwargs["file_key"]
+        mock_minio.get_presigned_url.return_value = "http://localhost:9000/frame.jpg"
+        response = client.post("/api/analyze-video", headers=headers, data=data, files=files)
+    return response, ml
+
+def test_analyze_video_creates_problem_per_defect(client, inspector_auth_headers, db, tmp_path):
+    path = tmp_path / "drive.avi"
+    write_video(path)
+    response, ml = post_video(
+        client, inspector_auth_headers,
+        files={"files": ("drive.avi", path.read_bytes(), "video/x-msvideo")},
+        data={"address": "Трасса М-7, 12 км", "lat": "55.75", "lon": "37.6"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    problems = [e for e in events if e["event"] == "problem"]
+    assert [(p["type"], p["first_seen"], p["last_seen"]) for p in problems] == [("pothole", 1.0, 2.5), ("pothole", 5.0, 5.5)]
+    assert events[-1] == {"event": "done", "frames": 60, "sampled": 11, "duplicates": 1, "problems": 2}
+    assert any(e["event"] == "progress" for e in events)
+    assert sum(len(call.args[0]) for call in ml.detect_frames.await_args_list) == 11
+
+    stored = db.query(Problem).order_by(Problem.id).all()
+    assert [(p.type.value, p.is_from_inspector, p.lat) for p in stored] == [("pothole", True, 55.75)] * 2
+    assert "1.0-2.5" in stored[0].description
+    assert db.query(ProblemImage).count() == 2
+    assert {d.problem_id for d in db.query(Detection).all()} == {p.id for p in stored}
+
+def test_analyze_image_sequence(client, inspector_auth_headers, db):
+    frames = [noise(1), noise(2, 150, 255), noise(3, 150, 255)]
+    files = [
+        ("files", (f"frame_{i}.jpg", cv2.imencode(".jpg", image)[1].tobytes(), "image/jpeg"))
+        for i, image in reversed(list(enumerate(frames))) # порядок - по имени файла
+    ]
+    response, _ = post_video(client, inspector_auth_headers, files=files,
+                             data={"address": "ул. Ямная, 1", "frame_interval": "1"})
+
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [(e["first_seen"], e["last_seen"], e["frames"]) for e in events if e["event"] == "problem"] == [(1.0, 2.0, 2)]
+    assert db.query(Problem).count() == 1
+
+def test_analyze_video_requires_inspector(client, auth_headers):
+    response = client.post(
+        "/api/analyze-video", headers=auth_headers, data={"address": "ул. Ямная, 1"},
+        files={"files": ("drive.avi", b"video", "video/x-msvideo")}
+    )
+    assert response.status_code == 403
+
+def test_analyze_video_rejects_bad_track(client, inspector_auth_headers, db):
+    response, _ = post_video(
+        client, inspector_auth_headers,
+        files={"files": ("drive.avi", b"video", "video/x-msvideo")},
+        data={"address": "ул. Ямная, 1", "track": '[{"t": 0, "lat": 95, "lon": 37}]'}
+    )
+    assert response.status_code == 400
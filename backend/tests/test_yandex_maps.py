@@ -0,0 +1,86 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from app.core.cache import SQLiteCacheStore
+from app.services.yandex_maps import YandexMapsService, normalize_query
+
+def geocoder_response(query: str) -> dict:
+    return {"response": {"GeoObjectCollection": {"featureMember": [
+        {"GeoObject": {"name": query, "description": "Москва, Россия", "Point": {"pos": "37.62 55.75"}}}
+    ]}}}
+
+@pytest_asyncio.fixture
+async def geocoder_stub(): # локальный сервер вместо геокодера Яндекса
+    requests = []
+
+    async def handler(request):
+        requests.append(request.query["geocode"])
+        if request.query["geocode"] == "ошибка":
+            return web.Response(status=500, text="upstream error")
+        await asyncio.sleep(0.05)
+        return web.json_response(geocoder_response(request.query["geocode"]))
+
+    app = web.Application()
+    app.router.add_get("/1.x/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}/1.x/", requests
+    finally:
+        await runner.cleanup()
+
+def test_normalize_query():
+    assert normalize_query("  Тверская   Улица, ") == normalize_query("тверская улица")
+    assert normalize_query("Ёлочная") == "елочная"
+
+@pytest.mark.asyncio
+async def test_suggest_address_cache_and_coalescing(geocoder_stub):
+    url, requests = geocoder_stub
+    service = YandexMapsService(api_key="test", geocode_url=url)
+    try:
+        results = await asyncio.gather(*[service.suggest_address("Тверская улица") for _ in range(5)])
+        assert requests == ["Тверская улица"] # одновременные запросы - один вызов геокодера
+        assert all(r == results[0] for r in results)
+        assert results[0][0]["lat"] == 55.75
+
+        await service.suggest_address("  тверская УЛИЦА ")
+        assert len(requests) == 1
+
+        assert await service.suggest_address("ошибка") == []
+        assert await service.suggest_address("ошибка") == []
+        assert len(requests) == 3 # ошибки не кэшируются
+    finally:
+        await service.close()
+
+@pytest.mark.asyncio
+async def test_suggest_address_ttl_expiry(geocoder_stub):
+    url, requests = geocoder_stub
+    service = YandexMapsService(api_key="test", geocode_url=url, cache_ttl=0)
+    try:
+        await service.suggest_address("Арбат")
+        await service.suggest_address("Арбат")
+        assert len(requests) == 2
+    finally:
+        await service.close()
+
+@pytest.mark.asyncio
+async def test_suggest_address_sqlite_store(geocoder_stub, tmp_path):
+    url, requests = geocoder_stub
+    path = str(tmp_path / "geocode.db")
+    service = YandexMapsService(api_key="test", geocode_url=url, store=SQLiteCacheStore(path))
+    try:
+        first = await service.suggest_address("Арбат")
+    finally:
+        await service.close()
+
+    # новый экземпляр (как после рестарта) берёт ответ из персистентного кэша
+    service = YandexMapsService(api_key="test", geocode_url=url, store=SQLiteCacheStore(path))
+    try:
+        assert await service.suggest_address("арбат") == first
+        assert len(requests) == 1
+    finally:
+        await service.close()
@@ -243,20 +243,20 @@ const ProblemForm: React.FC<ProblemFormProps> = ({
   }
   const [addressSuggestions, setAddressSuggestions] = useState<AddressSuggestion[]>([]); // Для Яндекс.Карт
   const [searchLoading, setSearchLoading] = useState(false);
-  let searchTimeout: NodeJS.Timeout;
+  const searchTimeout = useRef<NodeJS.Timeout>(); // переживает перерендеры, иначе debounce не работает
 
   const searchAddress = (query: string) => {
-    if (searchTimeout) clearTimeout(searchTimeout);
+    if (searchTimeout.current) clearTimeout(searchTimeout.current);
     
     if (query.length < 3) {
       setAddressSuggestions([]);
       return;
     }
     
-    searchTimeout = setTimeout(async () => {
+    searchTimeout.current = setTimeout(async () => {
       setSearchLoading(true);
       try {
-        const response = await api.get(`/api/address-suggest?query=${query}`);
+        const response = await api.get('/api/address-suggest', { params: { query } });
         setAddressSuggestions(response.data);
       } catch (error) {
         console.error('Ошибка поиска адреса:', error);
@@ -99,6 +99,8 @@ export interface Problem {
   reporter_id: number;
   is_from_inspector: boolean;
   images_count?: number;
+  lat?: number | null;
+  lon?: number | null;
 }
 
 export interface ProblemsResponse {
@@ -107,12 +109,15 @@ export interface ProblemsResponse {
   page: number;
   limit: number;
   total_pages: number;
+  next_cursor?: string | null;
 }
 
 export interface CreateProblemRequest {
   address: string;
   description?: string | null;
   type: ProblemType;
+  lat?: number;
+  lon?: number;
 }
 
 export interface CreateProblemWithImageRequest {
@@ -195,6 +200,34 @@ export interface ImageAnalysisResponse {
   confidence: number | null;
 }
 
+export interface AnalyzeAndCreateRequest {
+  address: string;
+  description?: string | null;
+  type?: ProblemType; // без типа - по найденным дефектам
+  photo: File;
+  lat?: number | null;
+  lon?: number | null;
+}
+
+export interface ProblemFromPhotoResponse {
+  problem: Problem;
+  image_id: number;
+  analysis: ImageAnalysisResponse | null;
+}
+
+export interface StatusChangeResult {
+  id: number;
+  result: 'updated' | 'unchanged' | 'not_found' | 'invalid_transition' | 'duplicate';
+  previous_status: ProblemStatus | null;
+  status: ProblemStatus | null;
+}
+
+export interface BulkStatusUpdateResponse {
+  updated: number;
+  failed: number;
+  results: StatusChangeResult[];
+}
+
 export const problemsAPI = {
   getProblems: (params?: any): Promise<{ data: ProblemsResponse }> => 
     api.get('/problems', { params }),
@@ -214,12 +247,31 @@ export const problemsAPI = {
     });
   },
 
+  analyzeAndCreate: (problemData: AnalyzeAndCreateRequest): Promise<{ data: ProblemFromPhotoResponse }> => {
+    const formData = new FormData();
+    formData.append('address', problemData.address);
+    if (problemData.description) formData.append('description', problemData.description);
+    if (problemData.type) formData.append('type', problemData.type);
+    if (problemData.lat != null && problemData.lon != null) {
+      formData.append('lat', String(problemData.lat));
+      formData.append('lon', String(problemData.lon));
+    }
+    formData.append('photo', problemData.photo);
+
+    return api.post('/problems/analyze-and-create', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' }
+    });
+  },
+
   updateProblem: (id: number, problemData: CreateProblemRequest): Promise<{ data: Problem }> => 
     api.put(`/problems/${id}`, problemData),
 
   updateProblemStatus: (id: number, status: ProblemStatus): Promise<{ data: Problem }> => 
     api.put(`/problems/${id}/status`, null, { params: { status } }),
 
+  bulkUpdateStatus: (items: { id: number; status: ProblemStatus }[]): Promise<{ data: BulkStatusUpdateResponse }> =>
+    api.put('/problems/status', { items }),
+
   deleteProblem: (id: number): Promise<void> => 
     api.delete(`/problems/${id}`),
 